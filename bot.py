@@ -1,3 +1,6 @@
+from time import perf_counter
+startup_time = perf_counter()
+
 import discord
 from discord.ext.commands import Bot
 from utils.config import bot_token, get_debug_status, SYNC_COMMANDS
@@ -5,11 +8,27 @@ from utils.utils import save_json_file, error_embed
 from discord_slash import SlashCommand
 from discord_slash.utils import manage_commands
 from utils.config import SLASH_COMMANDS_GUILDS
+from database.Player import player_cache
+from database.async_db import run_read
+from utils.mojang_util import mojang
+from utils.stat_util import stats_client
+from utils.plot_utils import chart_renderer
 import traceback
+import logging
+
+
+class PugBot(Bot):
+    async def close(self):
+        await super().close()
+        # The HTTP sessions and chart processes shared between cogs are only closed once they have all been unloaded
+        await mojang.close()
+        await stats_client.close()
+        chart_renderer.close()
+
 
 # Creating the bot object
 intents = discord.Intents.all()
-bot = Bot(command_prefix="-", intents=intents)
+bot = PugBot(command_prefix="-", intents=intents)
 slash = SlashCommand(bot, sync_commands=SYNC_COMMANDS)
 
 
@@ -39,10 +58,20 @@ bot.add_cog(GameCommands(bot))
 bot.add_cog(StrikeCommands(bot))
 bot.add_cog(ReferralCommands(bot))
 
+logging.info(f"[STARTUP] Imported and set up in {perf_counter() - startup_time:.2f}s")
+
 
 @bot.event
 async def on_ready():
+    global startup_time
     print('Logged on as {0}!'.format(bot.user))
+    # Every write to the players table updates the cache, so it only needs loading once
+    if not player_cache.loaded:
+        await run_read(player_cache.load)
+    if startup_time is not None:
+        # on_ready runs again after reconnecting, only the first time is the startup
+        logging.info(f"[STARTUP] Ready after {perf_counter() - startup_time:.2f}s")
+        startup_time = None
     save_json_file("utils/command_names.json", [command for command in slash.commands])
     await bot.change_presence(
         activity=discord.Activity(type=discord.ActivityType.competing, name="PUG Season 2"))
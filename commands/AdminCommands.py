@@ -2,16 +2,17 @@ from discord.ext.commands import Cog, has_role
 from discord import File, Embed, Colour
 from utils.utils import get_json_data, error_embed, success_embed, response_embed, has_permissions, create_list_pages
 from utils.image_util import compress
-from database.Player import Player
+from database.Player import Player, player_cache
 import utils.config
 import os
 import sys
 import platform
 import subprocess
 from json import dump, load
-from shutil import copyfile
-from pytz import timezone
-from datetime import datetime
+from sqlite3 import Error as DatabaseError
+from database.backup import create_backup, BackupFailedError
+from database.async_db import run_write
+from discord.ext import tasks
 
 # Slash commands support
 from discord_slash.cog_ext import cog_slash, manage_commands
@@ -42,6 +43,44 @@ class AdminCommands(Cog, name="Admin Commands"):
         config = Config()
         config.bind = [f"{WEB_SERVER_HOSTNAME}:{WEB_SERVER_PORT}"]
         self.web_task = self.bot.loop.create_task(serve(app, config=config, shutdown_trigger=self.shutdown_event.wait))
+        # on_ready runs again after every reconnect
+        if not self.automatic_backup.is_running():
+            self.automatic_backup.start()
+
+    def cog_unload(self):
+        self.automatic_backup.cancel()
+
+    async def send_backup(self, ctx):
+        """Creates a backup, showing its progress in a message. Returns False if the backup failed"""
+        message = await ctx.send("`Creating backup - 0%`")
+        edit_task = None
+
+        def progress(copied, total):
+            nonlocal edit_task
+            # Only one edit in flight at a time, so progress can't be shown out of order
+            if edit_task and not edit_task.done():
+                return
+            edit_task = self.bot.loop.create_task(
+                message.edit(content=f"`Creating backup - {copied * 100 // total if total else 100}%`"))
+
+        try:
+            backup_filename = await create_backup(progress=progress)
+        except (BackupFailedError, DatabaseError, OSError) as e:
+            await error_embed(ctx, f"Backup failed: `{e}`")
+            return False
+        finally:
+            if edit_task:
+                await edit_task
+        await message.edit(content="`Creating backup - 100%`")
+        await success_embed(ctx, f"Created backup file: `{backup_filename}`")
+        return backup_filename
+
+    @tasks.loop(hours=BACKUP_INTERVAL_HOURS)
+    async def automatic_backup(self):
+        try:
+            await create_backup(automatic=True)
+        except (BackupFailedError, DatabaseError, OSError) as e:
+            info(f"[DATABASE] Automatic backup failed: {e}")
 
     @cog_slash(name="removecommands", description="Removes all slash commands from the bot",
                guild_ids=SLASH_COMMANDS_GUILDS)
@@ -114,6 +153,19 @@ class AdminCommands(Cog, name="Admin Commands"):
             utils.config.debug = True
             await success_embed(ctx, "Toggled debug mode **on**")
 
+    @cog_slash(guild_ids=SLASH_COMMANDS_GUILDS)
+    async def cachestats(self, ctx):
+        """Shows how well the player cache is doing"""
+        if not has_permissions(ctx, ADMIN_ROLE):
+            await ctx.send("You do not have sufficient permissions to perform this command", hidden=True)
+            return False
+        stats = player_cache.stats()
+        await response_embed(ctx, "Player Cache",
+                             f"**Players:** {stats['players']}\n"
+                             f"**Hits:** {stats['hits']}\n"
+                             f"**Misses:** {stats['misses']}\n"
+                             f"**Hit rate:** {stats['hit_rate']:.1%}")
+
     @cog_slash(guild_ids=SLASH_COMMANDS_GUILDS, options=[manage_commands.create_option(name="operation", description="add/dell",
                                       required=True, option_type=3, choices=[
                 manage_commands.create_choice(name="add", value="add"),
@@ -233,18 +285,13 @@ class AdminCommands(Cog, name="Admin Commands"):
             await ctx.send("You do not have sufficient permissions to perform this command", hidden=True)
             return False
         await ctx.defer()
-        tz = timezone('US/Eastern')
-        time = datetime.now(tz).strftime("%Y%m%d-%H%M%S")
-        backup_filename = f"backups/database-{time}.db"
-        copyfile("database/database.db", backup_filename)
-        await success_embed(ctx, f"Created backup file: `{backup_filename}`")
+        if not await self.send_backup(ctx):
+            return False
         players = Player.fetch_players_list()
         guild_member_ids = [member.id for member in ctx.guild.members]
-        deleted_player_names = []
-        for player in players:
-            if player.discord_id not in guild_member_ids:
-                deleted_player_names.append(player.minecraft_username)
-                player.delete()
+        missing_players = [player for player in players if player.discord_id not in guild_member_ids]
+        deleted_player_names = [player.minecraft_username for player in missing_players]
+        await run_write(Player.delete_players, missing_players)
         if deleted_player_names:
             await success_embed(ctx, f"Removed players `{', '.join(deleted_player_names)}` from database.")
         else:
@@ -256,11 +303,7 @@ class AdminCommands(Cog, name="Admin Commands"):
         if not has_permissions(ctx, ADMIN_ROLE):
             await ctx.send("You do not have sufficient permissions to perform this command", hidden=True)
             return False
-        tz = timezone('US/Eastern')
-        time = datetime.now(tz).strftime("%Y%m%d-%H%M%S")
-        backup_filename = f"backups/database-{time}.db"
-        copyfile("database/database.db", backup_filename)
-        await success_embed(ctx, f"Created backup file: `{backup_filename}`")
+        await self.send_backup(ctx)
 
     @cog_slash(guild_ids=SLASH_COMMANDS_GUILDS, options=[])
     async def missingmaps(self, ctx):
@@ -5,8 +5,7 @@ from discord import Colour
 from discord_slash.cog_ext import cog_slash, manage_commands
 from utils.config import SLASH_COMMANDS_GUILDS, MOD_ROLE, TIMEZONE
 from utils.utils import create_list_pages, has_permissions
-from database.Player import Player
-from database.database import get_sorted_elo
+from database.Player import Player, player_cache
 from datetime import datetime, timedelta
 from dateutil.tz import gettz
 
@@ -54,7 +53,7 @@ class BaseCommands(Cog, name="Base Commands"):
                                                       option_type=8, required=False)], guild_ids=SLASH_COMMANDS_GUILDS)
     async def leaderboard(self, ctx, role=None):
         player = Player.exists_discord_id(ctx.author.id)
-        data = get_sorted_elo()
+        data = [(item.minecraft_username, item.elo, item.discord_id) for _, item in player_cache.leaderboard()]
         leaderboard_entries = []
         count = 1
         if role:
@@ -2,72 +2,31 @@ from discord.ext.commands import Cog
 from discord import File, Embed, Colour
 
 from database.Player import Player
-from utils.CTFGame import get_server_games, CTFGame
+from utils.CTFGame import get_server_games, game_cache
 from utils.utils import response_embed, success_embed, create_list_pages, error_embed, request_async_json, has_permissions
 from random import choice, seed
 from json import load, dump
-from re import split
-from requests import get
 from discord.ext import tasks
-from bs4 import BeautifulSoup
+from utils.schedule_util import schedule_service
+from utils.stat_util import stats_client, StatsRequestError, StatsPlayerNotFoundError
+from utils.forum_util import FORUM_TEAMS_URL, ConditionalPage, parse_team_threads, diff_rosters
 from utils.config import FORUM_THREADS_INTERVAL_HOURS, BOT_OUTPUT_CHANNEL, GENERAL_CHAT, TIMEZONE
 from os import path
 import aiohttp
-from asyncio import sleep as async_sleep
+from asyncio import TimeoutError as async_timeout_error, get_running_loop
 import logging
 from utils.plot_utils import *
 
 # ss
 import os
-import gspread
-import pandas as pd
-from dateutil import parser
 from dateutil.tz import gettz
 from datetime import datetime
 
 # Slash commands support
 from discord_slash.cog_ext import cog_slash, manage_commands
-from utils.config import SLASH_COMMANDS_GUILDS, ADMIN_ROLE
+from utils.config import SLASH_COMMANDS_GUILDS, ADMIN_ROLE, MOD_ROLE, SCHEDULE_REFRESH_MINUTES, SCHEDULE_ROLLOVER_ON_SS
 
 
-class Match:
-    def __init__(self, name, datetime, end):
-        self.name = name
-        self.datetime = datetime
-        self.end = end
-
-    def date(self):
-        return f"{self.datetime.date()}"
-
-    def human_times(self):
-        return f"{self.start_time()} - {self.end_time()} EST"
-
-    def human_date(self):
-        if os.name == "nt":
-            return f"{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%#d')}"
-        return f"{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%-d')}"
-
-    def human_datetime(self):
-        if os.name == "nt":
-            return f"{self.name}\n{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%#d')}\n{self.start_time()} - {self.end_time()} EST\n"
-        return f"{self.name}\n{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%-d')}\n{self.start_time()} - {self.end_time()} EST\n"
-
-    def start_time(self):
-        if os.name == "nt":
-            return self.datetime.strftime("%#I:%M%p")
-        return self.datetime.strftime("%-I:%M%p")
-
-    def end_time(self):
-        if os.name == "nt":
-            return self.end.strftime("%#I:%M%p")
-        return self.end.strftime("%-I:%M%p")
-
-    def __str__(self):
-        return f"{self.name}, {self.datetime}, {self.end}"
-    
-    def __lt__(self, other):
-        return self.datetime < other.datetime
-
 class CTFCommands(Cog, name="CTF Commands"):
     """
     This category contains ctf commands that can be used by anyone
@@ -77,15 +36,19 @@ class CTFCommands(Cog, name="CTF Commands"):
         self.bot = bot
         self.bot_channel = None
         self.general_chat = None
+        self.forum_page = ConditionalPage(FORUM_TEAMS_URL)
 
     def cog_unload(self):
         self.threads_update.cancel()
+        self.refresh_schedule.cancel()
 
     @Cog.listener()
     async def on_ready(self):
         self.bot_channel = self.bot.get_channel(BOT_OUTPUT_CHANNEL)
         self.general_chat = self.bot.get_channel(GENERAL_CHAT)
         self.threads_update.start()
+        if schedule_service.is_configured():
+            self.refresh_schedule.start()
 
     @cog_slash(guild_ids=SLASH_COMMANDS_GUILDS, options=[])
     async def brawl(self, ctx):
@@ -207,38 +170,30 @@ class CTFCommands(Cog, name="CTF Commands"):
         Gets most recent stats from match 1 and 2
         """
         await ctx.defer()
-        match_1 = get_server_games("1.ctfmatch.brawl.com")
-        match_2 = get_server_games("2.ctfmatch.brawl.com")
-        match_1.reverse()
-        match_2.reverse()
+        servers = {"__Match 1__": "1.ctfmatch.brawl.com", "__Match 2__": "2.ctfmatch.brawl.com"}
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+                server_games = await get_server_games(session, servers.values())
+                # The 3 most recent games of each server, all fetched at once
+                recent_games = {server_ip: game_ids[::-1][:3] for server_ip, game_ids in server_games.items()}
+                games = await game_cache.get_games(session, [game_id for game_ids in recent_games.values()
+                                                             for game_id in game_ids])
+        except (aiohttp.ClientError, async_timeout_error) as e:
+            logging.info(f"Failed to fetch match stats: {e!r}")
+            await error_embed(ctx, "Could not fetch the match stats from brawl.com, try again later")
+            return
+        games = {game.game_id: game for game in games}
 
         with open("utils/maps.json") as file:
             maps = load(file)
 
         embed = Embed(title="Match Stats", color=Colour.dark_purple())
-        if match_1:
-            embed_1_value = []
-            index = min(3, len(match_1))
-            for i in range(index):
-                game = CTFGame(match_1[i])
-                if game.map_name in maps.keys():
-                    map_str = f":map: **[{game.map_name}](https://www.brawl.com/games/ctf/maps/{maps[game.map_name]})**"
-                else:
-                    map_str = f":map: **{game.map_name}**"
-                if game.mvp:
-                    mvp_str = f":trophy: **[{game.mvp}](https://www.brawl.com/players/{game.mvp})**"
-                else:
-                    mvp_str = f":trophy: **No One :(**"
-                embed_1_value.append(f"{map_str} | {mvp_str}")
-                embed_1_value.append(
-                    f":chart_with_upwards_trend: **[Stats](https://www.brawl.com/games/ctf/lookup/{game.game_id})**")
-                embed_1_value.append("")
-            embed.add_field(name="__Match 1__", value="\n".join(embed_1_value), inline=False)
-        if match_2:
-            embed_2_value = []
-            index = min(3, len(match_2))
-            for i in range(index):
-                game = CTFGame(match_2[i])
+        for field_name, server_ip in servers.items():
+            if not recent_games[server_ip]:
+                continue
+            embed_value = []
+            for game_id in recent_games[server_ip]:
+                game = games[game_id]
                 if game.map_name in maps.keys():
                     map_str = f":map: **[{game.map_name}](https://www.brawl.com/games/ctf/maps/{maps[game.map_name]})**"
                 else:
@@ -247,11 +202,11 @@ class CTFCommands(Cog, name="CTF Commands"):
                     mvp_str = f":trophy: **[{game.mvp}](https://www.brawl.com/players/{game.mvp})**"
                 else:
                     mvp_str = f":trophy: **No One :(**"
-                embed_2_value.append(f"{map_str} | {mvp_str}")
-                embed_2_value.append(
+                embed_value.append(f"{map_str} | {mvp_str}")
+                embed_value.append(
                     f":chart_with_upwards_trend: **[Stats](https://www.brawl.com/games/ctf/lookup/{game.game_id})**")
-                embed_2_value.append("")
-            embed.add_field(name="__Match 2__", value="\n".join(embed_2_value), inline=False)
+                embed_value.append("")
+            embed.add_field(name=field_name, value="\n".join(embed_value), inline=False)
 
         if not embed.fields:
             await response_embed(ctx, "No Games Found", "There are no match games in the past 10 games played.")
@@ -259,35 +214,9 @@ class CTFCommands(Cog, name="CTF Commands"):
             await ctx.send(embed=embed)
 
     async def rosters_comparison(self, old_threads, new_threads): #Compares old and new forum threads (team sizes)
-        changes = ""
-        #TODO: Handle error for when teams change their threads titles
-        old_links = {old_threads[old_key]["link"]: old_key for old_key in old_threads.keys()}
-        new_links = {new_threads[new_key]["link"]: new_key for new_key in new_threads.keys()}
-
-        disjunct_union = set(old_links.keys()) ^ set(new_links.keys())
-
-        for disjunct in disjunct_union:
-            if disjunct in old_links:
-                changes += f"🔴 **{old_links[disjunct]}** has disbanded.\n\n"
-            else:
-                changes += f"🟢 **{new_links[disjunct]}** is now official.\n\n"
-
-        for o_key in old_threads.keys():
-            for n_key in new_threads.keys():
-                if o_key != n_key:
-                    continue
-                if new_threads[n_key]['members'] != old_threads[o_key]['members']:
-                    new_size = int(new_threads[n_key]['members'].split("/")[0])
-                    old_size = int(old_threads[o_key]['members'].split("/")[0])
-                    if new_size > old_size:
-                        changes += (
-                            f"🟢 **{o_key}:** {old_threads[o_key]['members']} -> {new_threads[n_key]['members']} (**+{new_size - old_size}**)\n\n")
-                    else:
-                        changes += (
-                            f"🔴 **{n_key}:** {old_threads[o_key]['members']} -> {new_threads[n_key]['members']} (**{new_size - old_size}**)\n\n")
-
+        changes = diff_rosters(old_threads, new_threads)
         if changes:
-            embed = Embed(title="Roster Changes", description=changes, color=Colour.dark_purple())
+            embed = Embed(title="Roster Changes", description="\n\n".join(changes), color=Colour.dark_purple())
             message = await self.general_chat.send(embed=embed)
             return message
         else:
@@ -295,44 +224,30 @@ class CTFCommands(Cog, name="CTF Commands"):
 
     @tasks.loop(hours=FORUM_THREADS_INTERVAL_HOURS)
     async def threads_update(self):
-        url = get('https://www.brawl.com/forums/299/')
-        page = BeautifulSoup(url.content, features="html.parser")
-
-        teams_threads = {}
-
-        for thread in page.find_all("ol", class_="discussionListItems"):
-            for thread in thread.find_all("li"):
-                team_titles = thread.find("div", class_="titleText")
-                info = team_titles.find('a', class_="PreviewTooltip")
-                author = team_titles.find('a', class_="username")
-                img_loc = thread.find('img')
-                if "cravatar" in img_loc.get('src'):
-                    author_avatar = f"https:{img_loc.get('src')}"
-                else:
-                    author_avatar = f"https://www.brawl.com/{img_loc.get('src')}"
-                thread_link = f"https://www.brawl.com/{info.get('href')}"
-                team_title = split("((\[|\()\d{1,3}/\d{1,3}(\]|\))?)", info.text, 1)
-
-                team_size = split("(\d{1,3}/\d{1,3})", info.text, 1)
-                try:  # uhh haha not all teams have member size in title
-                    team_size = team_size[1]
-                except:
-                    team_size = "NaN"
-
-                teams_threads[team_title[0].rstrip()] = {
-                    "link": thread_link,
-                    "members": team_size,
-                    "author": author.text,
-                    "image": author_avatar
-                }
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+                page = await self.forum_page.fetch(session)
+        except (aiohttp.ClientError, async_timeout_error) as e:
+            logging.info(f"Failed to fetch the team threads: {e!r}")
+            return
+        if page is None:
+            logging.info("Team threads haven't changed")
+            return
+        body, validators = page
+        teams_threads = await get_running_loop().run_in_executor(None, parse_team_threads, body)
 
         if path.exists('utils/team_threads.json'):
             with open('utils/team_threads.json') as file:
                 old_threads = load(file)
+            if old_threads == teams_threads:
+                self.forum_page.commit(validators)
+                return
             await self.rosters_comparison(old_threads, teams_threads)
 
         with open('utils/team_threads.json', 'w') as file:
             dump(teams_threads, file, indent=4)
+        # Only now is the change handled, if anything above failed the next poll goes through it again
+        self.forum_page.commit(validators)
 
     @cog_slash(name="threads", description="Shows team threads from the forums",
                guild_ids=SLASH_COMMANDS_GUILDS,
@@ -378,92 +293,20 @@ class CTFCommands(Cog, name="CTF Commands"):
 
     @cog_slash(name="ss", description="Shows upcoming matches", guild_ids=SLASH_COMMANDS_GUILDS)
     async def ss(self, ctx):
+        if not schedule_service.is_configured():
+            return await error_embed(ctx, "The match schedule spreadsheet isn't set up")
         await ctx.defer()
-        gc = gspread.service_account(filename='utils/service_account.json')
-        worksheet1 = gc.open_by_key("1CrQOxzaXC6iSjwZwQvu6DNIYsCDg-uQ4x5UiaWLHzxg").worksheet("Upcoming Matches")
-        worksheet2 = gc.open_by_key("1CrQOxzaXC6iSjwZwQvu6DNIYsCDg-uQ4x5UiaWLHzxg").worksheet("Upcoming Matches (Server 2)")
-        matchservers = {"1": worksheet1, "2": worksheet2} 
-        matches = []
+        try:
+            snapshot = await schedule_service.get_snapshot()
+            if snapshot.outdated and SCHEDULE_ROLLOVER_ON_SS:
+                snapshot = await schedule_service.roll_forward()
+        except Exception:
+            logging.exception("Failed to load the match schedule")
+            return await error_embed(ctx, "Could not load the match schedule, try again later")
+        datetime_now = datetime.now(gettz(TIMEZONE))
+        matches = [match for match in snapshot.matches if match.end > datetime_now]
         string_list = []
-        tbd_list = []
-        for match, values in matchservers.items():
-            df = pd.DataFrame.from_records(values.get()) 
-            df = df.iloc[9:, 2:].reset_index(drop=True) 
-            df.columns = range(df.shape[1]) #reset column index
-
-            row = df.loc[0]
-            end_index = row[row == "TBD"].index #find the end index (either TBD or latest date). incase 
-                                                #mods decide to just add days to the ss instead of replacing dates
-            if end_index.empty: #no tbd section, u never know 
-                end_date = [x for x in reversed(list(row.array)) if len(x.split("/")) == 3] #it works
-                end_index = row[row == end_date[0]].index +1 #maybe TBD is renamed? if deleted this breaks
-            else:
-                tbd_column = df.iloc[2:, end_index[0]] 
-                [tbd_list.append(f"**{x}** *(Match {match})*") for x in tbd_column if (x != None) and (x != "")]
-
-            tz = gettz(TIMEZONE)
-            datetime_now = datetime.now(tz)
-            start_index = None
-            no_pad = "-"
-            if os.name == "nt":
-                no_pad = "#"
-            start_index = row[row == (datetime_now.strftime(f"%{no_pad}m/%{no_pad}d/%Y"))].index
-
-            
-            if start_index.empty: #todays date not found. We need to add new days
-                number_of_days = len([x for x in row.array if len(x.split("/")) == 3]) 
-                excel_col_name = lambda n: '' if n <= 0 else excel_col_name((n - 1) // 26) + chr((n - 1) % 26 + ord('A')) #google solution TY devon
-                new_datetimes = pd.date_range(start=datetime_now, periods=number_of_days, freq="D")
-                new_dates = [d.strftime(f"%{no_pad}m/%{no_pad}d/%{no_pad}Y") for d in new_datetimes] #"mm/dd/yy" no padding
-                new_days = [d.strftime("%A") for d in new_datetimes] #%A is date full name E.g "Sunday"
-                last_letter = excel_col_name(number_of_days+3) #+3 to account for starting at D
-                cell_list = values.range(f"D10:{last_letter}59")
-                for cell in cell_list:
-                    if cell.row == 10: 
-                        cell.value = new_dates[cell.col -4] #this'll break if they ever remove the
-                    elif cell.row == 11: 
-                        cell.value = new_days[cell.col -4] #hidden columns A and B
-                    else:
-                        cell.value = ""
-                values.update_cells(cell_list)
-                values.format(f"D12:{last_letter}59", {'backgroundColor': {"red": 1.0, "green": 1.0, "blue": 1.0} })
-                continue
-
-            days = df.iloc[0:2, start_index[0]:end_index[0]] 
-            df2 = df.iloc[2:, start_index[0]:end_index[0]] 
-
-            days.iloc[0, :] = days.iloc[0, :] + " " + days.iloc[1, :] #combine days and dates into one row
-            days = days.iloc[0] #change dataframe into just that one row with days/dates
-
-            melted_df = pd.melt(df2) #"melt" all columns into one single column (one after another)
-            melted_df = melted_df.replace(to_replace=days.index, value=days) #replace numerical index of days to actual date strings
-
-            time_column = pd.concat([df.iloc[2:, 0]]*len(df2.columns)).reset_index(drop=True) #repeat the times
-
-            melted_df.iloc[:, 0] = melted_df.iloc[:, 0] + " " + time_column #then combine days+date with time, so our dataframe has columns of [Day, date, time], and [matchname]
-            melted_df = melted_df.replace(["", None], "#~#~#").replace("^", None).ffill() # 'detect' all events. THIS INCLUDES TIMES WHERE THERES NO MATCHES!
-            grouped_df = melted_df.groupby([(melted_df.iloc[:, 1] != melted_df.iloc[:, 1].shift()).cumsum()]) # group by consecutive values
-            #grouped_df = grouped_df #add .filter(lambda x: x.iloc[0, 1] != "#~#~#") on the end of this line to get 1 dataframe of all valid matches!
-
-            for group_index, group_df in grouped_df: #got it down to one iteration of just detected events
-                #GROUP_INDEX/GROUP_DF REPRESENTS ALL THE GROUPS DETECTED IN THE SS! EVEN EMPTY EVENTS! (where nothing is happening)
-                if group_df.iloc[0, 1] == "#~#~#": continue #SO WE REJECT THE EMPTY EVENTS
-
-                match_df = group_df.iloc[[0, -1]]
-                start_time = match_df.iloc[0][0].split(" - ")[0]
-                index = match_df.index[1]+1
-                if index == len(melted_df.index): #case for the last day, last time on SS
-                    index = match_df.index[1]
-                end_time = melted_df.iloc[index][0].split(" - ")[0]
-                name = match_df.iloc[1][1]
-
-                start = parser.parse(start_time, tzinfos={"EST": tz})
-                end = parser.parse(end_time, tzinfos={"EST": tz})
-
-                matches.append(Match(f"**{name}** *(Match {match})*", start, end))
-        matches.sort()
-
-        matches = list(filter(lambda x: datetime_now.time() < x.end.time() or datetime_now.date() != x.end.date(), matches))
+        tbd_list = list(snapshot.tbd_list)
         for match in matches:
             if match.datetime < datetime_now < match.end:
                 string_list.append(f"> {match.name} ***(Ongoing)***\n> {match.human_date()}\n> {match.human_times()}\n")
@@ -476,6 +319,29 @@ class CTFCommands(Cog, name="CTF Commands"):
             [string_list.append(x) for x in tbd_list]
         return await create_list_pages(self.bot, ctx, f"Matches Found", string_list, "No matches found :(", "\n", 5)  # lambda
 
+    @cog_slash(name="ssrefresh", description="Reloads the match schedule from the spreadsheet",
+               guild_ids=SLASH_COMMANDS_GUILDS)
+    async def ssrefresh(self, ctx):
+        if not has_permissions(ctx, MOD_ROLE):
+            await ctx.send("You do not have sufficient permissions to perform this command", hidden=True)
+            return False
+        if not schedule_service.is_configured():
+            return await error_embed(ctx, "The match schedule spreadsheet isn't set up")
+        await ctx.defer()
+        try:
+            snapshot = await schedule_service.refresh()
+        except Exception as e:
+            logging.exception("Failed to refresh the match schedule")
+            return await error_embed(ctx, f"Could not reload the match schedule: `{type(e).__name__}: {e}`")
+        await success_embed(ctx, f"Reloaded the match schedule ({len(snapshot.matches)} matches)")
+
+    @tasks.loop(minutes=SCHEDULE_REFRESH_MINUTES)
+    async def refresh_schedule(self):
+        try:
+            await schedule_service.refresh()
+        except Exception:
+            logging.exception("Failed to refresh the match schedule")
+
     @cog_slash(guild_ids=SLASH_COMMANDS_GUILDS, options=[
         manage_commands.create_option(name="ign", description="The ign of the player you would like to search for",
                                       required=False, option_type=3),
@@ -488,9 +354,6 @@ class CTFCommands(Cog, name="CTF Commands"):
         """Gets player stats using 915's stats website"""
         if not ctx.responded:
             await ctx.defer()
-        get_player_id_url = "https://by48xt0cuf.execute-api.us-east-1.amazonaws.com/default/request-player?name={}"
-        stats_from_id_url = "https://by48xt0cuf.execute-api.us-east-1.amazonaws.com/default/request-player?id={}"
-        new_player_request_url = "https://qe824lieck.execute-api.us-east-1.amazonaws.com/default/new-player?id={}"
         if ign:
             username = ign
         else:
@@ -502,52 +365,30 @@ class CTFCommands(Cog, name="CTF Commands"):
         if not username:
             await error_embed(ctx, "Please input a player or `/register` to get your own stats")
             return
-        response = await request_async_json(get_player_id_url.format(username), 'text/plain')
-        if response:
-            json = response[1]
-            logging.info(json)
-            if str(json).startswith("No player found"):
-                await error_embed(ctx, f"Could not find player with name `{username}`")
-                return
-            if json["uuid"]:
-                player_id = json["id"]
-            else:
-                await error_embed(ctx, f"The following player does not have a UUID in the API `{username}`")
-                return
-        else:
+        try:
+            player_id = await stats_client.get_player_id(username)
+        except StatsPlayerNotFoundError as e:
+            await error_embed(ctx, e.message)
+            return
+        except StatsRequestError as e:
+            logging.info(e.message)
             await error_embed(ctx, f"Failed to get player ID for name `{username}`")
             return
         discord_message = await ctx.send(content="Grabbing your data")
-        stats_response = await request_async_json(stats_from_id_url.format(player_id), 'text/plain')
-        json_response = stats_response[1]
-        if json_response["data"]:
-            data = json_response["data"]
-        else:
-            logging.info(f"Player data for `{username}` is not loaded yet")
-            await discord_message.edit(content="Your data is not loaded yet, hold tight")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(new_player_request_url.format(player_id)) as r:
-                    if r.status == 200:
-                        text = await r.text()
-                        if text == "Success":
-                            logging.info("Successfully loaded new data")
-                            await discord_message.edit(content="Your data is being loaded.")
-                            await async_sleep(10)
-                            stats_response = await request_async_json(stats_from_id_url.format(player_id), 'text/plain')
-                            json_response = stats_response[1]
-                            data = json_response["data"]
-                            if not data:
-                                await discord_message.edit(content=f"Account `{username}` doesn't appear to have any"
-                                                                   f" data, sorry. Try again later.")
-                                return
-                            else:
-                                await discord_message.edit(content="Data loaded")
-                        else:
-                            await error_embed(ctx, text)
-                            return
-                    else:
-                        await discord_message.edit(content="Request to load new player data failed")
-                        return
+
+        async def progress(message):
+            await discord_message.edit(content=message)
+
+        try:
+            data = await stats_client.get_stats(player_id, progress)
+        except StatsRequestError as e:
+            logging.info(e.message)
+            await discord_message.edit(content="Request to load new player data failed")
+            return
+        if not data:
+            await discord_message.edit(content=f"Account `{username}` doesn't appear to have any data, sorry."
+                                               f" Try again later.")
+            return
         class_stats_list = []
         link = "https://www.nineonefive.xyz/stats/"
         for class_name in data[mode].keys():
@@ -591,7 +432,7 @@ class CTFCommands(Cog, name="CTF Commands"):
         new_labels, new_sizes = list(unzipped_list[0]), list(unzipped_list[1])
 
 
-        data_stream = pie_chart(new_labels, new_sizes, explode=[0.1 if label else 0 for label in labels],
+        data_stream = await pie_chart(new_labels, new_sizes, explode=[0.1 if label else 0 for label in labels],
                                 title="Playtime by class")
         data_stream.seek(0)
         chart_file = File(data_stream, filename="pie_chart.png")
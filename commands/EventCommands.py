@@ -1,7 +1,6 @@
-from discord import Embed, Colour, User, Role
+from discord import Embed, Colour, User, Role, Object
 import re
 from discord.channel import TextChannel
-from discord.ext import tasks
 from discord.ext.commands import Cog
 from discord.utils import get
 from discord_slash.cog_ext import cog_slash, cog_subcommand
@@ -13,18 +12,40 @@ from utils.config import *
 from utils.event_util import get_event_time, check_if_cancel, announce_event, reaction_changes, save_signups, \
     priority_rng_signups, get_embed_time_string, generate_signups_embed
 from utils.utils import response_embed, error_embed, success_embed, has_permissions
+from utils.scheduler import DeadlineQueue
+from utils.role_util import apply_role_changes, format_failed_role_changes, log_failed_role_changes
 from database.Event import Event, EventDoesNotExistError
 from database.Signup import Signup
-from database.Player import Player, PlayerDoesNotExistError
-from database.database import get_active_signed_users
+from database.Player import Player
+from database.async_db import run_read, run_write
 from database.referrals import *
-from asyncio import TimeoutError
+from database.strikes import partition_striked
+from asyncio import TimeoutError, Lock, sleep
+from collections import Counter
 from random import shuffle, seed
 import logging
 from datetime import datetime, timedelta
 from pytz import timezone
 from time import time
 
+SIGNUP_EMOJIS = ["✅", "🔇", "🛗"]
+
+
+def apply_reaction_change(reactions, change):
+    """Applies a ("add" / "remove" / "clear" / "clear_emoji", emoji, user ID) change to an event's tracked reactions"""
+    kind, emoji, user_id = change
+    if kind == "clear":
+        for user_ids in reactions.values():
+            user_ids.clear()
+    elif emoji not in reactions:
+        return
+    elif kind == "add":
+        reactions[emoji][user_id] = None
+    elif kind == "remove":
+        reactions[emoji].pop(user_id, None)
+    else:
+        reactions[emoji].clear()
+
 
 class EventCommands(Cog, name="Event Commands"):
     """
@@ -34,20 +55,66 @@ class EventCommands(Cog, name="Event Commands"):
     def __init__(self, bot):
         self.bot = bot
         self.events = Event.fetch_active_events_dict()
-        self.signups = dict()
+        self.signups = Signup.fetch_signups_dict(self.events.keys())
+        # User ID -> number of active events they're signed up to play in, kept up to date by set_signups
+        self.signed_users = Counter(signup.user_id for signups in self.signups.values()
+                                    for signup in signups if signup.can_play)
         self.bot_channel = None
         self.rng_last_used = 0
         self.rng_cooldown = 300
-        for event_id in self.events.keys():
-            self.signups[event_id] = Signup.fetch_signups_list(event_id)
+        self.event_scheduler = DeadlineQueue(lambda: datetime.now(timezone(TIMEZONE)))
+        self.scheduler_task = None
+        for event in self.events.values():
+            self.schedule_event(event)
+        # Event ID -> emoji -> user IDs who reacted (a dict used as an ordered set), kept up to date by the raw
+        # reaction listeners for events with signups open
+        self.reactions = {}
+        self.signup_messages = {}
+        # Event ID -> reaction changes received while the event's reactions are being fetched by reconcile_reactions
+        self.reconciling = {}
+        self.pending_signups = {}
+        self.signup_locks = {}
 
     def cog_unload(self):
-        self.check_signups.cancel()
+        if self.scheduler_task:
+            self.scheduler_task.cancel()
+        for task in self.pending_signups.values():
+            task.cancel()
 
     @Cog.listener()
     async def on_ready(self):
         self.bot_channel = self.bot.get_channel(BOT_OUTPUT_CHANNEL)
-        self.check_signups.start()
+        if not self.scheduler_task:
+            self.scheduler_task = self.bot.loop.create_task(self.event_scheduler.run(self.update_event))
+        # Reactions made while the bot was offline or disconnected don't send events, so catch up on them
+        for event in list(self.events.values()):
+            if event.is_active and event.is_signups_active:
+                try:
+                    await self.reconcile_reactions(event)
+                except Exception:
+                    # e.g. the announcement was deleted or the bot can't see its channel
+                    logging.exception(f"{event.title}: Failed to reconcile reactions")
+
+    def set_signups(self, event_id, signups):
+        """Replaces an active event's signups, or forgets them when signups is None (the event is over)"""
+        self.signed_users -= Counter(signup.user_id for signup in self.signups.get(event_id) or [] if signup.can_play)
+        if signups is None:
+            self.signups.pop(event_id, None)
+        else:
+            self.signups[event_id] = signups
+            self.signed_users += Counter(signup.user_id for signup in signups if signup.can_play)
+
+    def get_unsigned_members(self, role):
+        """Returns the members with the role who aren't signed up for any active event"""
+        unsigned_ids = {member.id for member in role.members} - self.signed_users.keys()
+        return [member for member in role.members if member.id in unsigned_ids]
+
+    def schedule_event(self, event):
+        """(Re)schedules the event's next state change, call it whenever the event's times or status change"""
+        if event.is_active:
+            self.event_scheduler.schedule(event.event_id, event.get_next_transition())
+        else:
+            self.event_scheduler.cancel(event.event_id)
 
     @cog_slash(name="event", description="Creates an event.",
                options=[mc.create_option(name="title",
@@ -145,195 +212,273 @@ class EventCommands(Cog, name="Event Commands"):
         event_message_ids = await announce_event(title, description, announcement_channel, signup_channel,
                                                  mention_role, event_time_package, event_time_package[1][1])
 
-        new_event = Event.add_event(event_message_ids[0], title, description, event_time_package[0][0].isoformat(),
+        new_event = await run_write(Event.add_event, event_message_ids[0], title, description, event_time_package[0][0].isoformat(),
                                     datetime.now(timezone(TIMEZONE)).isoformat(), ctx.author.id, ctx.guild.id,
                                     announcement_channel.id, signup_channel.id, event_message_ids[1], signup_role.id,
                                     event_time_package[1][0].isoformat())
         self.events[event_message_ids[0]] = new_event
         self.signups[event_message_ids[0]] = []
+        self.reactions[event_message_ids[0]] = {emoji: {} for emoji in SIGNUP_EMOJIS}
+        self.schedule_event(new_event)
 
-    @tasks.loop(seconds=SIGNUPS_TRACKER_INTERVAL_SECONDS)
-    async def check_signups(self):
-        for event in list(self.events.values()):
-            event.update()
-            # print(f"Event: \n{event.title} Active: {event.is_active}\nTime: {event.time_est}\nDeadline: {event.signup_deadline}")
-            if datetime.now(timezone(TIMEZONE)) >= datetime.fromisoformat(event.time_est) + timedelta(hours=1.5) and event.is_active:
-                event.set_is_active(False)
-                await success_embed(self.bot.get_channel(event.signup_channel),
-                                    f"Set event {event.event_id} / {event.title} to **inactive**")
-                message = await self.bot.get_channel(event.announcement_channel).fetch_message(event.event_id)
-                embed = message.embeds[0]
+    async def update_event(self, event_id):
+        """Closes signups / sets the event to inactive once their time comes. Called by the event scheduler"""
+        event = self.events.get(event_id)
+        if not event:
+            return
+        # If this raises, the event scheduler calls it again later. So the event is only marked as changed once the
+        # messages that go with the change have been sent
+        if datetime.now(timezone(TIMEZONE)) >= event.get_deactivation_time() and event.is_active:
+            message = await self.bot.get_channel(event.announcement_channel).fetch_message(event.event_id)
+            embed = message.embeds[0]
+            if "**This event is no longer active.**" not in embed.description:
                 embed.description = embed.description.rsplit("\n", 4)[0] #Getting rid of the last three lines of the description "React if you can.."
 
                 signups = self.signups.setdefault(event.event_id)
                 if not signups:
-                    signups = Signup.fetch_signups_list(event.event_id)
+                    signups = await run_read(Signup.fetch_signups_list, event.event_id)
                 num_signups = len(list(filter(lambda sign: sign.can_play, signups)))
 
                 embed.description += f"\n\n**This event is no longer active.**\n_({num_signups} signups)_\n"
                 embed.color = Colour.default()
                 await message.edit(embed=embed)
-                await message.clear_reactions()
-                spectator_role = get(message.guild.roles, name=SPECTATOR_ROLE_NAME)
-                for member in spectator_role.members:
-                    await member.remove_roles(spectator_role, reason=f"Removing spectator role after {event.title}")
-                    logging.info(f"{event.title}: Removed spectator role from {member}")
-                
-                signed_role = get(message.guild.roles, id=event.signup_role)
-                signed_user_ids = get_active_signed_users()
-                logging.info(f"Currently signed users (all active events): {signed_user_ids}")
-                for member in signed_role.members:
-                    if member.id not in signed_user_ids:
-                        await member.remove_roles(signed_role, reason=f"Removing signed role after {event.title}")
-                        logging.info(f"{event.title}: Removed {signed_role.name} role from {member}")
+            await message.clear_reactions()
+            await run_write(event.set_is_active, False)
+            await success_embed(self.bot.get_channel(event.signup_channel),
+                                f"Set event {event.event_id} / {event.title} to **inactive**")
+            spectator_role = get(message.guild.roles, name=SPECTATOR_ROLE_NAME)
+            signed_role = get(message.guild.roles, id=event.signup_role)
+            self.set_signups(event.event_id, None)
+            logging.info(f"Currently signed users (all active events): {set(self.signed_users)}")
+            # Members signed for other events keep the signed role
+            failed = await apply_role_changes([(member, spectator_role, False) for member in spectator_role.members] +
+                                              [(member, signed_role, False)
+                                               for member in self.get_unsigned_members(signed_role)],
+                                              reason=f"Removing roles after {event.title}")
+            log_failed_role_changes(failed, f"{event.title}: Removing roles")
+            self.events.pop(event.event_id, None)
+            self.forget_reactions(event.event_id)
+            return
+        elif event.is_signups_active and datetime.now(timezone(TIMEZONE)) >= datetime.fromisoformat(event.signup_deadline):
+            # Marked closed before anything is awaited, so reaction changes stop saving signups from here on
+            event.is_signups_active = False
+            pending = self.pending_signups.pop(event.event_id, None)
+            if pending:
+                pending.cancel()
+            self.forget_reactions(event.event_id)
+            # Waits for an update_signups that's already running, so the signups closed are its result
+            async with self.signup_locks.setdefault(event.event_id, Lock()):
+                try:
+                    signups = self.signups.setdefault(event.event_id)
+                    if not signups:
+                        signups = await run_read(Signup.fetch_signups_list, event.event_id)
+                    signups = list(filter(lambda sign: sign.can_play, signups))
+
+                    # Close signups and process referrals together
+                    played_referrals = await run_write(close_signups_and_update_referrals, event.event_id,
+                                                       [signup.user_id for signup in signups])
+                    for referral in played_referrals:
+                        logging.info(f"User id {referral[2]} has signed for their first event, logged to referrals "
+                                     f"table")
+                    if signups:
+                        try:
+                            await self.bot.get_channel(event.signup_channel).send(
+                                embed=generate_signups_embed(self.bot, signups, event))
+                        except HTTPException:
+                            pass
+                        await self.bot.get_channel(event.announcement_channel).send(
+                            f"_Signups for **{event.title}** are now closed_")
                     else:
-                        logging.info(f"{event.title}: {member} is signed for other events - skipping role removal")
-                del self.events[event.event_id]
-                continue
-            elif not event.is_signups_active:
-                continue
-            elif datetime.now(timezone(TIMEZONE)) >= datetime.fromisoformat(event.signup_deadline):
-                event.set_is_signup_active(False)
-                signups = self.signups.setdefault(event.event_id)
-                if not signups:
-                    signups = Signup.fetch_signups_list(event.event_id)
-                signups = list(filter(lambda sign: sign.can_play, signups))
-                if signups:
-
-                    # Process referrals
-                    signed_ids = [signup.user_id for signup in signups]
-                    new_referrals = get_filtered_referrals("has_user_played", False)
-                    for referral in new_referrals:
-                        if referral[2] in signed_ids:
-                            update_referral(referral[0], "has_user_played", True)
-                            logging.info(f"User id {referral[2]} has signed for their first event, logged to referrals table")
-
-                    try:
-                        await self.bot.get_channel(event.signup_channel).send(embed=generate_signups_embed(self.bot,
-                                                                                                           signups, event))
-                    except HTTPException:
-                        pass
-                    await self.bot.get_channel(event.announcement_channel).send(f"_Signups for **{event.title}** are now closed_")
-                else:
-                    await error_embed(self.bot.get_channel(event.signup_channel), "No signups on signup deadline :(\n"
-                                                                                  f"{event.title}")
-                continue
+                        await error_embed(self.bot.get_channel(event.signup_channel),
+                                          f"No signups on signup deadline :(\n{event.title}")
+                except Exception:
+                    # Reopened so the event scheduler's retry closes the signups again
+                    event.is_signups_active = True
+                    raise
+        self.schedule_event(event)
+
+    async def reconcile_reactions(self, event):
+        """
+        Rebuilds an event's reactions from its announcement message. This is the only time the reactions are fetched,
+        and it's only needed when the bot may have missed reaction events (on startup or when signups reopen)
+        """
+        # Reactions that come in while the users are being paged through are applied on top afterwards
+        self.reconciling[event.event_id] = []
+        try:
+            channel = self.bot.get_channel(event.announcement_channel)
+            if not channel:
+                raise ValueError(f"Announcement channel {event.announcement_channel} not found")
+            message = await channel.fetch_message(event.event_id)
+            reactions = {emoji: {} for emoji in SIGNUP_EMOJIS}
+            for reaction in message.reactions:
+                if reaction.emoji in reactions:
+                    reactions[reaction.emoji] = dict.fromkeys([user.id async for user in reaction.users()
+                                                               if user.id != self.bot.user.id])
+            for change in self.reconciling[event.event_id]:
+                apply_reaction_change(reactions, change)
+            # Signups may have closed while the reactions were being fetched, and then they're no longer tracked
+            if self.are_signups_open(event.event_id):
+                self.reactions[event.event_id] = reactions
+        finally:
+            self.reconciling.pop(event.event_id, None)
+        self.queue_signups_update(event.event_id)
+
+    def is_tracked_signup(self, payload):
+        """Whether a reaction event is for an event with open signups whose reactions are being tracked"""
+        event = self.events.get(payload.message_id)
+        if not event or not event.is_signups_active or payload.user_id == self.bot.user.id \
+                or str(payload.emoji) not in SIGNUP_EMOJIS:
+            return False
+        return payload.message_id in self.reactions or payload.message_id in self.reconciling
 
-            can_play_users = []
-            is_muted_users = []
-            can_sub_users = []
-            announcement_channel = self.bot.get_channel(event.announcement_channel)
-            announcement_message = await announcement_channel.fetch_message(event.event_id)
-            signup_channel = self.bot.get_channel(event.signup_channel)
-            signup_message = await signup_channel.fetch_message(event.signup_message)
-            reactions = announcement_message.reactions
-            signups = self.signups[event.event_id]
-
-            for reaction in reactions:
-                if reaction.emoji == "✅":
-                    can_play_users = [user.id for user in await reaction.users().flatten() if
-                                      user.id != self.bot.user.id]
-                elif reaction.emoji == "🔇":
-                    is_muted_users = [user.id for user in await reaction.users().flatten() if
-                                      user.id != self.bot.user.id]
-                elif reaction.emoji == "🛗":
-                    can_sub_users = [user.id for user in await reaction.users().flatten() if
-                                     user.id != self.bot.user.id]
-
-            [signups, change] = reaction_changes(signups, can_play_users, is_muted_users, can_sub_users, event.event_id)
-            if change:
-                # Determine which signups are striked
-                striked_signups = list(filter(lambda signup: signup.is_striked(), signups))
-                logging.info(f"Striked signups: {len(striked_signups)}")
-
-                # Create new filtered signups list
-                signups = list(filter(lambda signup: not signup.is_striked(), signups))
-                logging.info(f"Regular signups: {len(signups)}")
-
-                # Remove reactions from striked users & send them DMs
-                striked_user_ids = [signup.user_id for signup in striked_signups]
-                for reaction in reactions:  # Iterate through all reactions
-                    if reaction.emoji in ["✅", "🔇", "🛗"]:  # Check to see if the emoji is event related
-                        users = await reaction.users().flatten()  # See docs https://discordpy.readthedocs.io/en/stable/api.html?highlight=remove_reaction#discord.Reaction.users
-                        for user in users:  # Loop through all users who reacted
-                            if user.id in striked_user_ids:  # Check to see if the users are striked
-                                # Remove the reaction and log it 
-                                logging.info(f"{event.title}: Removing reaction {reaction.emoji} {user.name}")
-                                await reaction.remove(user)
-
-
-                logging.info(f"{event.title}: Reaction change detected")
-                save_signups(self.signups[event.event_id], signups)
-                logging.info(f"{event.title}: Signups saved")
-                self.signups[event.event_id] = signups
-                can_play = [user for user in signups if user.can_play]
-                can_sub = [user for user in signups if user.can_sub]
-                guild = self.bot.get_guild(event.guild_id)
-                signup_role = guild.get_role(event.signup_role)
-                prospect_role = get(guild.roles, name=PROSPECT_ROLE)
-                for member in signup_role.members:
-                    if member.id not in can_play_users:
-                        await member.remove_roles(signup_role)
-                        logging.info(f"{event.title}: Removed role {signup_role.name} from {member}")
-                reaction_member_ids = [member.id for member in signup_role.members]
-                for user_id in can_play_users:
-                    if user_id not in reaction_member_ids and user_id not in striked_user_ids:
-                        member = guild.get_member(user_id)
-                        if member is None:
-                            continue
-                        if signup_role not in member.roles: # next line 
-                            await member.add_roles(signup_role) #takes a request even though user already has role
-                        logging.info(f"{event.title}: Allocated role {signup_role.name} to {member}")
-                if event.is_active:
-                    embed = signup_message.embeds[0]
-                    if can_play:
-                        can_play = list(filter(lambda x: guild.get_member(x.user_id), can_play))
-                        value = [f"{index + 1}: <@{user.user_id}> {'🔇' if user.is_muted else ''} {'🚀' if prospect_role in guild.get_member(user.user_id).roles else ''}"
-                                for index, user in enumerate(can_play)]
-                        embed.set_field_at(index=0, name=f"✅ Players: {len(can_play)}", value="\n".join(value),
+    def are_signups_open(self, event_id):
+        event = self.events.get(event_id)
+        return bool(event and event.is_active and event.is_signups_active)
+
+    def track_reaction_change(self, event_id, change):
+        if not self.are_signups_open(event_id):
+            # The signups are closing or closed, anything after that doesn't count
+            return
+        if event_id in self.reconciling:
+            self.reconciling[event_id].append(change)
+            return
+        apply_reaction_change(self.reactions[event_id], change)
+        self.queue_signups_update(event_id)
+
+    def queue_signups_update(self, event_id):
+        # Bursts of reactions are handled with a single update
+        if event_id not in self.pending_signups and self.are_signups_open(event_id) and event_id in self.reactions:
+            self.pending_signups[event_id] = self.bot.loop.create_task(self.update_signups_later(event_id))
+
+    async def update_signups_later(self, event_id):
+        await sleep(SIGNUPS_DEBOUNCE_SECONDS)
+        del self.pending_signups[event_id]
+        async with self.signup_locks.setdefault(event_id, Lock()):
+            # Checked again now that the lock is held, the signups may have been closed in the meantime
+            event = self.events.get(event_id)
+            if self.are_signups_open(event_id) and event_id in self.reactions:
+                try:
+                    await self.update_signups(event)
+                except Exception:
+                    logging.exception(f"{event.title}: Failed to update signups")
+
+    async def update_signups(self, event):
+        """Saves the event's signups from its tracked reactions and updates the signed role and signups message"""
+        reactions = self.reactions[event.event_id]
+        can_play_users = list(reactions["✅"])
+        is_muted_users = list(reactions["🔇"])
+        can_sub_users = list(reactions["🛗"])
+        signups = self.signups[event.event_id]
+
+        [signups, change] = reaction_changes(signups, can_play_users, is_muted_users, can_sub_users, event.event_id)
+        if change:
+            # Split off the signups that are striked
+            striked_signups, signups = partition_striked(signups)
+            logging.info(f"Striked signups: {len(striked_signups)}")
+            logging.info(f"Regular signups: {len(signups)}")
+
+            # Remove reactions from striked users & send them DMs
+            striked_user_ids = [signup.user_id for signup in striked_signups]
+            announcement_message = self.bot.get_channel(event.announcement_channel).get_partial_message(event.event_id)
+            for emoji, user_ids in reactions.items():
+                for user_id in striked_user_ids:
+                    if user_id in user_ids:
+                        logging.info(f"{event.title}: Removing reaction {emoji} {user_id}")
+                        await announcement_message.remove_reaction(emoji, Object(id=user_id))
+
+
+            logging.info(f"{event.title}: Reaction change detected")
+            await run_write(save_signups, self.signups[event.event_id], signups)
+            logging.info(f"{event.title}: Signups saved")
+            self.set_signups(event.event_id, signups)
+            can_play = [user for user in signups if user.can_play]
+            can_sub = [user for user in signups if user.can_sub]
+            guild = self.bot.get_guild(event.guild_id)
+            signup_role = guild.get_role(event.signup_role)
+            prospect_role = get(guild.roles, name=PROSPECT_ROLE)
+            role_changes = [(member, signup_role, False) for member in signup_role.members
+                            if member.id not in can_play_users]
+            for user_id in can_play_users:
+                member = guild.get_member(user_id)
+                if member and user_id not in striked_user_ids:
+                    role_changes.append((member, signup_role, True))
+            failed = await apply_role_changes(role_changes, reason=f"Signups changed for {event.title}")
+            log_failed_role_changes(failed, f"{event.title}: Updating the signup role")
+            if event.is_active:
+                signup_message = self.signup_messages.get(event.event_id)
+                if not signup_message:
+                    signup_message = await self.bot.get_channel(event.signup_channel).fetch_message(event.signup_message)
+                    self.signup_messages[event.event_id] = signup_message
+                embed = signup_message.embeds[0]
+                if can_play:
+                    can_play = list(filter(lambda x: guild.get_member(x.user_id), can_play))
+                    value = [f"{index + 1}: <@{user.user_id}> {'🔇' if user.is_muted else ''} {'🚀' if prospect_role in guild.get_member(user.user_id).roles else ''}"
+                            for index, user in enumerate(can_play)]
+                    embed.set_field_at(index=0, name=f"✅ Players: {len(can_play)}", value="\n".join(value),
+                                    inline=False)
+                    logging.info(f"{event.title}: Generated new can_play field")
+                else:
+                    embed.set_field_at(index=0, name=f"✅ Players: 0", value="No one :(", inline=False)
+                if can_sub:
+                    value = [f"{index + 1}: <@{user.user_id}> {'🔇' if user.is_muted else ''}"
+                            for index, user in enumerate(can_sub)]
+                    embed.set_field_at(index=1, name=f"🛗 Subs: {len(can_sub)}", value="\n".join(value), inline=False)
+                    logging.info(f"{event.title}: Generated new can_sub field")
+                else:
+                    embed.set_field_at(index=1, name=f"🛗 Subs: 0", value="No one :(", inline=False)
+                try:
+                    await signup_message.edit(embed=embed)
+                except HTTPException:
+                    embed.set_field_at(index=0, name=f"✅ Players: {len(can_play)}", value=f"[View signups here]({WEB_URL}/event/{event.event_id})",
                                         inline=False)
-                        logging.info(f"{event.title}: Generated new can_play field")
-                    else:
-                        embed.set_field_at(index=0, name=f"✅ Players: 0", value="No one :(", inline=False)
-                    if can_sub:
-                        value = [f"{index + 1}: <@{user.user_id}> {'🔇' if user.is_muted else ''}"
-                                for index, user in enumerate(can_sub)]
-                        embed.set_field_at(index=1, name=f"🛗 Subs: {len(can_sub)}", value="\n".join(value), inline=False)
-                        logging.info(f"{event.title}: Generated new can_sub field")
-                    else:
-                        embed.set_field_at(index=1, name=f"🛗 Subs: 0", value="No one :(", inline=False)
-                    try:
-                        await signup_message.edit(embed=embed)
-                    except HTTPException:
-                        embed.set_field_at(index=0, name=f"✅ Players: {len(can_play)}", value=f"[View signups here]({WEB_URL}/event/{event.event_id})",
-                                            inline=False)
-                        embed.set_field_at(index=1, name=f"🛗 Subs: {len(can_sub)}", value=f"[View subs here]({WEB_URL}/event/{event.event_id})",
-                                            inline=False)
-                        await signup_message.edit(embed=embed)
-
-                    logging.info(f"{event.title}: Finished editing signup message")
+                    embed.set_field_at(index=1, name=f"🛗 Subs: {len(can_sub)}", value=f"[View subs here]({WEB_URL}/event/{event.event_id})",
+                                        inline=False)
+                    await signup_message.edit(embed=embed)
 
-            if not event.is_active:
-                del self.events[event.event_id]
-                del self.signups[event.event_id]
+                logging.info(f"{event.title}: Finished editing signup message")
+
+    def forget_reactions(self, event_id):
+        self.reactions.pop(event_id, None)
+        self.signup_messages.pop(event_id, None)
 
-    @Cog.listener()  # Set map reaction check
+    @Cog.listener()
     async def on_raw_reaction_add(self, payload):
+        if self.is_tracked_signup(payload):
+            self.track_reaction_change(payload.message_id, ("add", str(payload.emoji), payload.user_id))
+            return
+        if str(payload.emoji) != "🗺️":
+            return
         try:
             # Initial objects
-            event = Event.from_event_id(payload.message_id)
+            event = await run_read(Event.from_event_id, payload.message_id)
             server = self.bot.get_guild(payload.guild_id)
             channel = await self.bot.fetch_channel(payload.channel_id)
             msg = await channel.fetch_message(payload.message_id)
             mod_role = get(server.roles, name=MOD_ROLE)
 
             # Remove map emoji if it's a non-mod member or bot
-            if str(payload.emoji) == "🗺️" and not mod_role.position <= payload.member.top_role.position and not payload.member.bot:
+            if not mod_role.position <= payload.member.top_role.position and not payload.member.bot:
                 await msg.remove_reaction(payload.emoji, payload.member)
 
         except EventDoesNotExistError:
             return
 
+    @Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if self.is_tracked_signup(payload):
+            self.track_reaction_change(payload.message_id, ("remove", str(payload.emoji), payload.user_id))
+
+    @Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        if payload.message_id in self.reactions or payload.message_id in self.reconciling:
+            self.track_reaction_change(payload.message_id, ("clear", None, None))
+
+    @Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        if str(payload.emoji) in SIGNUP_EMOJIS and \
+                (payload.message_id in self.reactions or payload.message_id in self.reconciling):
+            self.track_reaction_change(payload.message_id, ("clear_emoji", str(payload.emoji), None))
+
     @cog_slash(name="removeroles", options=[mc.create_option(name="roles_list",
                                                              description="Tag roles to remove from all members",
                                                              option_type=3, required=False)],
@@ -349,6 +494,7 @@ class EventCommands(Cog, name="Event Commands"):
         total_to_remove = 0
         total_removed = 0
         stats = ""
+        failed = []
         if roles_list is None:
             roles_list = [ctx.guild.get_role(get(ctx.guild.roles, name=role).id) for role in TEAMS_ROLES]
             for role in roles_list:
@@ -374,19 +520,20 @@ class EventCommands(Cog, name="Event Commands"):
 
             removing_msg = await ctx.send(embed=removing_embed)
 
-            for role in roles:
-                for member in role.members:
-                    await member.remove_roles(role)
-                    total_removed += 1
-                    if total_removed % 5 == 0:
-                        removing_embed.description = f"Progress: ({total_removed}/{total_to_remove})"
-                        await removing_msg.edit(embed=removing_embed)
+            async def progress(done, total):
+                removing_embed.description = f"Progress: ({done}/{total})"
+                await removing_msg.edit(embed=removing_embed)
 
-            removing_embed.description = f"Progress: ({total_removed}/{total_to_remove})"
-            await removing_msg.edit(embed=removing_embed)
+            failed = await apply_role_changes([(member, role, False) for role in roles for member in role.members],
+                                              progress)
+            log_failed_role_changes(failed, "removeroles")
+            for member, role, add in failed:
+                counter[role.mention] -= 1
 
         for roles in list(counter.keys()):
             stats += "{} {} roles were removed\n".format(counter[roles], roles)
+        if failed:
+            stats += f"\n**Failed to remove ({len(failed)}):**\n" + "\n".join(format_failed_role_changes(failed))
         if forbidden_roles: #if there are forbidden roles
             await ctx.send(f"You cannot remove these roles: {', '.join(forbidden_roles)}", hidden=True)
             if not stats: #and not a single valid role
@@ -409,9 +556,9 @@ class EventCommands(Cog, name="Event Commands"):
         except ValueError:
             await error_embed(ctx, "Please enter an integer")
             return
-        signups = Signup.fetch_signups_list(event_id)
+        signups = await run_read(Signup.fetch_signups_list, event_id)
         try:
-            event = Event.from_event_id(event_id)
+            event = await run_read(Event.from_event_id, event_id)
         except EventDoesNotExistError:
             await error_embed(ctx, "This event does not exist")
             return False
@@ -451,7 +598,7 @@ class EventCommands(Cog, name="Event Commands"):
         seed()
         try:
             event_id = int(event_id)
-            event = Event.from_event_id(event_id)
+            event = await run_read(Event.from_event_id, event_id)
         except ValueError:
             await error_embed(ctx, "Please enter an integer for the event ID. This is the message ID of the event "
                                    "announcement.")
@@ -465,17 +612,19 @@ class EventCommands(Cog, name="Event Commands"):
         signups = self.signups.setdefault(event_id)
         results_embed = Embed(title="RNG Signups - Results", colour=Colour.green())
         if not signups:
-            signups = Signup.fetch_signups_list(event_id)
+            signups = await run_read(Signup.fetch_signups_list, event_id)
         member_ids = [member.id for member in ctx.guild.members]
         signups = list(filter(lambda signup: signup.user_id in member_ids, signups)) #Filtered list so bot doesn't crash if people leave server after signing up
         subs = list(filter(lambda signup: not signup.can_play and signup.can_sub, signups)) #Players that have reacted can sub but not can play
         signups = list(filter(lambda signup: signup.can_play, signups))
         shuffle(signups)
+        players = Player.from_discord_ids(signup.user_id for signup in signups + subs)
+        priority_changes = []
         if do_priority:
             self.rng_last_used = time()
-            # key is player.priority if player exists else its 0
-            signups = sorted(signups, key=lambda signup: Player.from_discord_id(signup.user_id)
-                             .priority if Player.exists_discord_id(signup.user_id) else -1, reverse=True)
+            # key is player.priority if player exists else its -1
+            signups = sorted(signups, key=lambda signup: players[signup.user_id].priority
+                             if signup.user_id in players else -1, reverse=True)
             results_embed.description = "Here are the results - these take into account priority, for which you must" \
                                         " be registered. In order to register, use the `/register` command"
         else:
@@ -491,29 +640,27 @@ class EventCommands(Cog, name="Event Commands"):
             results_embed.add_field(name=f"Playing ({len(selected_players)})", value='\n'.join(
                 [self.bot.get_user(signup.user_id).mention + (' 🔇' if signup.is_muted else '') +
                  (' 🛗' if signup.can_sub else '') +
-                 ("" if Player.exists_discord_id(signup.user_id) else " (Unregistered)") for signup in
+                 ("" if signup.user_id in players else " (Unregistered)") for signup in
                  selected_players]))
             if do_priority:
-                for signup in selected_players:
-                    player = Player.exists_discord_id(signup.user_id)
-                    if player:
-                        player.change_priority(-1)
+                priority_changes += [(players[signup.user_id], -1) for signup in selected_players
+                                     if signup.user_id in players]
         if benched_players:
             results_embed.add_field(name=f"Not Playing ({len(benched_players)})", value='\n'.join(
                 [self.bot.get_user(signup.user_id).mention + (' 🔇' if signup.is_muted else '') +
                  (' 🛗' if signup.can_sub else '') +
-                 ("" if Player.exists_discord_id(signup.user_id) else " (Unregistered)") for signup in
+                 ("" if signup.user_id in players else " (Unregistered)") for signup in
                  benched_players]))
             if do_priority:
-                for signup in benched_players:
-                    player = Player.exists_discord_id(signup.user_id)
-                    if player:
-                        player.change_priority(1)
+                priority_changes += [(players[signup.user_id], 1) for signup in benched_players
+                                     if signup.user_id in players]
+        if priority_changes:
+            await run_write(Player.change_priorities, priority_changes)
         if subs:
             results_embed.add_field(name=f"Subs ({len(subs)})", value='\n'.join(
                 [self.bot.get_user(signup.user_id).mention + (' 🔇' if signup.is_muted else '') +
                  (' 🛗' if signup.can_sub else '') +
-                 ("" if Player.exists_discord_id(signup.user_id) else " (Unregistered)") for signup in
+                 ("" if signup.user_id in players else " (Unregistered)") for signup in
                  subs]))
         signed_role = ctx.guild.get_role(event.signup_role)
         if not results_channel:
@@ -528,7 +675,7 @@ class EventCommands(Cog, name="Event Commands"):
             tag_str = ""
             for signup in selected_players:
                 user = self.bot.get_user(signup.user_id)
-                player = Player.exists_discord_id(signup.user_id)
+                player = players.get(signup.user_id)
                 tag_str += f"@{user} ({player.minecraft_username if player else 'Unregistered'})\n"
             await self.bot_channel.send(f"{ctx.author.mention} here is a list of tags to make the setroles process easy."
                                         f"\n```{tag_str}```")
@@ -607,22 +754,29 @@ class EventCommands(Cog, name="Event Commands"):
                             break
                     if set_roles:
                         roles_embed = Embed(title="Setting Roles", colour=Colour.green())
-                        roles_assigned = 0
                         roles_msg = await ctx.send(embed=roles_embed)
+                        players = Player.from_discord_ids(member.id for role in roles_dict
+                                                          for member in roles_dict[role])
+
+                        async def progress(done, total):
+                            roles_embed.description = f"Progress: {done}/{total}"
+                            await roles_msg.edit(embed=roles_embed)
+
+                        failed = await apply_role_changes([(member, role, True) for role in roles_dict
+                                                           for member in roles_dict[role]], progress,
+                                                          reason=f"role added by {ctx.author.name} with setroles command")
+                        log_failed_role_changes(failed, "setroles")
+                        if failed:
+                            roles_embed.add_field(name=f"Failed ({len(failed)})", inline=False,
+                                                  value="\n".join(format_failed_role_changes(failed)))
                         for role in roles_dict:
                             users_string = f"{role.mention}\n"
                             for member in roles_dict[role]:
                                 users_string += f"{member.mention}"
-                                users_string += "\n" if Player.exists_discord_id(member.id) else " ❌\n" #Add X if unregistered user
-                                await member.add_roles(role, reason=f"role added by {ctx.author.name} with setroles"
-                                                                    f" command")
-                                roles_assigned += 1
-                                if roles_assigned % 5 == 0:
-                                    roles_embed.description = f"Progress: {roles_assigned}/{total_roles_count}"
-                                    await roles_msg.edit(embed=roles_embed)
+                                users_string += "\n" if member.id in players else " ❌\n" #Add X if unregistered user
                             if role.name in TEAMS_ROLES: #Average ELO Display
-                                elo_list = [Player.from_discord_id(member.id).elo for member in roles_dict[role] if
-                                            Player.exists_discord_id(member.id)]
+                                elo_list = [players[member.id].elo for member in roles_dict[role] if
+                                            member.id in players]
                                 if len(elo_list) > 0:
                                     elo_avg = sum(elo_list) / len(elo_list)
                                     users_string += f"**Average ELO: {int(round(elo_avg))}**"
@@ -739,12 +893,12 @@ class EventCommands(Cog, name="Event Commands"):
             await error_embed(ctx, "Please enter an integer for the event ID. This is the message ID of the event "
                                    "announcement.")
             return
-        event = Event.from_event_id(event_id)
-        if not event.get_is_active():
-            return error_embed(ctx, "This event is not active")
+        event = await run_read(Event.from_event_id, event_id)
+        if not event.is_active:
+            return await error_embed(ctx, "This event is not active")
         postpone_amount = timedelta(minutes=minutes, hours=hours, days=days)
-        event_time = datetime.fromisoformat(event.get_event_time_est())
-        signup_deadline = datetime.fromisoformat(event.get_signup_deadline())
+        event_time = datetime.fromisoformat(event.time_est)
+        signup_deadline = datetime.fromisoformat(event.signup_deadline)
         new_event_time = event_time + postpone_amount
         new_signup_deadline = signup_deadline + postpone_amount
         now = datetime.now(timezone(TIMEZONE))
@@ -757,11 +911,18 @@ class EventCommands(Cog, name="Event Commands"):
             new_signup_deadline = new_event_time
         announcement_channel = self.bot.get_channel(event.announcement_channel)
         announcement_message = await announcement_channel.fetch_message(event.event_id)
-        event.set_event_time_est(datetime.isoformat(new_event_time))
-        event.set_signup_deadline(datetime.isoformat(new_signup_deadline))
-        event.set_is_active(True)
-        event.set_is_signup_active(True)
-        event.update()
+        await run_write(event.reschedule, datetime.isoformat(new_event_time), datetime.isoformat(new_signup_deadline))
+        self.events[event.event_id] = event
+        if event.event_id not in self.signups:
+            self.set_signups(event.event_id, await run_read(Signup.fetch_signups_list, event.event_id))
+        self.schedule_event(event)
+        if event.event_id not in self.reactions:
+            # Signups were closed, so reactions since then haven't been tracked
+            try:
+                await self.reconcile_reactions(event)
+            except (HTTPException, ValueError):
+                # The event has already been postponed, so carry on and tell everyone about it
+                logging.exception(f"{event.title}: Failed to reconcile reactions after postponing")
         embed = announcement_message.embeds[0]
         new_time_string = get_embed_time_string(new_event_time)
         embed.description = f"**Time:**\n{new_time_string} (<t:{int(new_event_time.timestamp())}:R>)\n\n**Signup Deadline:**" \
@@ -781,15 +942,15 @@ class EventCommands(Cog, name="Event Commands"):
         if ctx.author.id != BOT_OWNER_ID:
             await ctx.send("You must be the bot owner to use this", hidden=True)
             return False
-        events = Event.fetch_events_list()
+        events = await run_read(Event.fetch_events_list)
         info_embed = Embed(title="Deleted Events", description="Here is a list of **deleted events** and their details",
                            colour=Colour.dark_purple())
         for event in events:
-            if not event.get_is_active():
+            if not event.is_active:
                 info_embed.description += f"\n**{event.title}** `{event.time_est}`\n> `{event.event_id}`"
-                event.delete()
+                await run_write(event.delete)
         info_embed.description += "\n\n**Currently active events (/currentevents):**"
-        for event in Event.fetch_active_events_list():
+        for event in await run_read(Event.fetch_active_events_list):
             info_embed.description += f"\n**{event.title}** `{event.time_est}`\n> `{event.event_id}`"
         await ctx.send(embed=info_embed)
 
@@ -802,7 +963,7 @@ class EventCommands(Cog, name="Event Commands"):
         info_embed = Embed(title="Current Events", description="Here is a list of **events** and their details",
                            colour=Colour.dark_purple())
         info_desc = ""
-        for event in Event.fetch_events_list():
+        for event in await run_read(Event.fetch_events_list):
             if event.is_active:
                 announcement_url = f"https://discord.com/channels/{event.guild_id}/{event.announcement_channel}/" \
                                    f"{event.event_id}"
@@ -848,23 +1009,23 @@ class EventCommands(Cog, name="Event Commands"):
         if user:
             input_members.append(server.get_member(user.id))
         total_input = len(input_members)
+        players = Player.from_discord_ids(member.id for member in input_members)
         for member in input_members:
-            try:
-                player = Player.from_discord_id(member.id)
-            except PlayerDoesNotExistError:
+            player = players.get(member.id)
+            if not player:
                 unregistered_members += f"{member.mention}\n"
                 total_input -= 1
             else:
-                prev_elo = player.get_elo()
+                prev_elo = player.elo
                 if mode == "set":
-                    if player.set_elo(amount):
-                        changes_str += f"{member.mention} `{prev_elo}` → `{player.get_elo()}`\n"
+                    if await run_write(player.set_elo, amount):
+                        changes_str += f"{member.mention} `{prev_elo}` → `{player.elo}`\n"
                     else:
                         await error_embed(ctx, "Could not set ELO to that value")
                         return
                 elif mode == "change":
-                    player.change_elo(amount)
-                    changes_str += f"{member.mention} `{prev_elo} → {player.get_elo()}`\n"
+                    await run_write(player.change_elo, amount)
+                    changes_str += f"{member.mention} `{prev_elo} → {player.elo}`\n"
         summary = Embed(title="Summary of ELO changes", color=Colour.dark_purple())
         if changes_str:
             if role:
@@ -898,15 +1059,13 @@ class EventCommands(Cog, name="Event Commands"):
             await error_embed(ctx, "Please enter an integer")
             return
         try:
-            event = Event.from_event_id(event_id)
+            event = await run_read(Event.from_event_id, event_id)
         except EventDoesNotExistError:
             await error_embed(ctx, "This event does not exist")
             return False
         if event.is_active:
             announcement_channel = self.bot.get_channel(event.announcement_channel)
-            event.set_is_active(False)
-            event.set_is_signup_active(False)
-            event.update()
+            await run_write(event.deactivate)
             await success_embed(self.bot.get_channel(event.signup_channel),
                                 f"Set event {event.event_id} / {event.title} to **inactive**")
             message = await announcement_channel.fetch_message(event.event_id)
@@ -915,7 +1074,7 @@ class EventCommands(Cog, name="Event Commands"):
                 0]  # Getting rid of the last three lines of the description "React if you can.."
             signups = self.signups.setdefault(event.event_id)
             if not signups:
-                signups = Signup.fetch_signups_list(event.event_id)
+                signups = await run_read(Signup.fetch_signups_list, event.event_id)
             num_signups = len(list(filter(lambda sign: sign.can_play, signups)))
             embed.description += f"\n\n**This event was cancelled.**\n_({num_signups} signups)_\n"
             embed.color = Colour.default()
@@ -928,14 +1087,15 @@ class EventCommands(Cog, name="Event Commands"):
             await announcement_channel.send(f"{signup_role.mention} **{event.title}** has been **cancelled**")
             await success_embed(ctx, "Event has been successfully set to inactive.")
             
-            signed_user_ids = get_active_signed_users()
-            logging.info(f"Currently signed users (all active events): {signed_user_ids}")
-            for member in signup_role.members:
-                if member.id not in signed_user_ids:
-                    await member.remove_roles(signup_role, reason=f"Removing signed role after {event.title}")
-                    logging.info(f"{event.title}: Removed {signup_role.name} role from {member}")
-                else:
-                    logging.info(f"{event.title}: {member} is signed for other events - skipping role removal")
-            del self.events[event.event_id]
+            self.set_signups(event.event_id, None)
+            logging.info(f"Currently signed users (all active events): {set(self.signed_users)}")
+            # Members signed for other events keep the signed role
+            failed = await apply_role_changes([(member, signup_role, False)
+                                               for member in self.get_unsigned_members(signup_role)],
+                                              reason=f"Removing signed role after {event.title}")
+            log_failed_role_changes(failed, f"{event.title}: Removing the signed role")
+            self.events.pop(event.event_id, None)
+            self.forget_reactions(event.event_id)
+            self.schedule_event(event)
         else:
             await error_embed(ctx, "This event is not active")
@@ -2,11 +2,11 @@ from discord.ext.commands import Cog
 from discord.ext import tasks
 from discord import File, Embed, Colour
 from utils.stat_util import *
+from database.Player import Player
 from utils.plot_utils import *
 from utils.utils import *
 from utils.config import ADMIN_ROLE, BOT_OWNER_ID
 import logging
-from mojang import MojangAPI
 from asyncio import TimeoutError
 from os import listdir
 from random import choice, shuffle, random, seed
@@ -63,7 +63,7 @@ class GameCommands(Cog, name="CTF Commands"):
             new_labels, new_sizes = list(unzipped_list[0]), list(unzipped_list[1])
 
             # TODO: sort these lists to make the pie chart look better
-            data_stream = pie_chart(new_labels, new_sizes, explode=[0.1 if label else 0 for label in labels],
+            data_stream = await pie_chart(new_labels, new_sizes, explode=[0.1 if label else 0 for label in labels],
                                     title="Playtime by class")
             data_stream.seek(0)
             chart_file = File(data_stream, filename="pie_chart.png")
@@ -216,6 +216,7 @@ class GameCommands(Cog, name="CTF Commands"):
                 random_player = Player.fetch_random_player()
                 random_ign = random_player.minecraft_username
                 uuid = random_player.minecraft_id
+                from mojang import MojangAPI  # Only loaded once a game of stats is played
                 names_dict = MojangAPI.get_name_history(uuid)
                 all_names = [item["name"].lower() for item in names_dict]
                 pie_file = await self.comp_playtime_pie(random_ign)
@@ -2,14 +2,16 @@ from discord import Embed, Colour, User
 from discord.ext.commands import Cog, has_role
 from discord.ext import tasks
 from database.Player import Player, PlayerDoesNotExistError, UsernameAlreadyExistsError, UsernameDoesNotExistError, \
-    DiscordAlreadyExistsError
+    DiscordAlreadyExistsError, player_cache
 from database.database import check_user_requests, add_register_request, get_register_request, \
-    remove_register_request, get_all_register_requests, get_sorted_elo
+    remove_register_request, get_all_register_requests, fetch_stale_minecraft_ids
+from database.async_db import run_read, run_write
 from utils.utils import error_embed, success_embed, response_embed, create_list_pages, has_permissions
 from utils.config import MOD_ROLE, BOT_OUTPUT_CHANNEL, IGN_TRACKER_INTERVAL_HOURS, REGISTER_REQUESTS_CHANNEL,\
-    ELO_FLOOR, ADMIN_ROLE, PUBLIC_BOT_CHANNEL, UPDATE_NICKNAMES, SEND_JOIN_MESSAGE
-from mojang import MojangAPI
-from asyncio import sleep as async_sleep
+    ELO_FLOOR, ADMIN_ROLE, PUBLIC_BOT_CHANNEL, UPDATE_NICKNAMES, SEND_JOIN_MESSAGE, MOJANG_BATCH_SIZE
+from utils.mojang_util import mojang, MojangUnavailableError
+from asyncio import gather
+from time import time
 from discord.errors import Forbidden
 from discord.utils import get
 import re
@@ -63,7 +65,7 @@ class RegistrationCommands(Cog, name="User Registration"):
                 info.append(player_string)
         elif data_type == "register_requests":
             title = "IGN Registration Requests"
-            requests = sorted(get_all_register_requests(), key=lambda item: item[2])
+            requests = sorted(await run_read(get_all_register_requests), key=lambda item: item[2])
             for request in requests:
                 info.append(f"**{request[2]}** ({self.bot.get_user(request[1]).mention if self.bot.get_user(request[1]) else '<@' + str(request[1]) + '> 🚫'})")
         await create_list_pages(bot=self.bot, ctx=ctx, title=title, info=info,
@@ -90,11 +92,15 @@ class RegistrationCommands(Cog, name="User Registration"):
             await ctx.send(embed=embed)
             return
 
-        uuid = MojangAPI.get_uuid(minecraft_username)
+        try:
+            uuid = await mojang.get_uuid(minecraft_username)
+        except MojangUnavailableError:
+            await error_embed(ctx, "Could not reach Mojang to check that username, try again later")
+            return
         if uuid:
-            condition = Player.player_check(uuid, ctx.author.id)
+            condition = await run_read(Player.player_check, uuid, ctx.author.id)
             if not condition:
-                if check_user_requests(ctx.author.id):
+                if await run_read(check_user_requests, ctx.author.id):
                     await error_embed(ctx, "You have already submitted a register request")
                 else:
                     request_channel = self.bot.get_channel(REGISTER_REQUESTS_CHANNEL)
@@ -105,7 +111,7 @@ class RegistrationCommands(Cog, name="User Registration"):
                     message = await request_channel.send(embed=embed)
                     await message.add_reaction("✅")
                     await message.add_reaction("❌")
-                    if add_register_request(uuid, ctx.author.id, minecraft_username, message.id):
+                    if await run_write(add_register_request, uuid, ctx.author.id, minecraft_username, message.id):
                         await ctx.send(embed=Embed(title="Registration Pending",
                                                    description=f"Requested to register **{minecraft_username}**"
                                                                f" to {ctx.author.mention}",
@@ -145,7 +151,7 @@ class RegistrationCommands(Cog, name="User Registration"):
 
     @Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        request = get_register_request(payload.message_id)
+        request = await run_read(get_register_request, payload.message_id)
         if payload.channel_id == REGISTER_REQUESTS_CHANNEL and bool(request) and payload.user_id != self.bot.user.id:
             channel = await self.bot.fetch_channel(REGISTER_REQUESTS_CHANNEL)
             message = await channel.fetch_message(payload.message_id)
@@ -154,8 +160,13 @@ class RegistrationCommands(Cog, name="User Registration"):
             player_member = server.get_member(request[1])
             required_role = get(server.roles, name=MOD_ROLE)
             if str(payload.emoji) == "✅" and required_role.position <= mod_member.top_role.position:
-                Player.add_player(request[0], request[1])
-                remove_register_request(payload.message_id)
+                try:
+                    await Player.add_player(request[0], request[1])
+                except MojangUnavailableError:
+                    await channel.send(f"Could not reach Mojang to accept {player_member.mention}'s request, "
+                                       f"try again later.")
+                    return
+                await run_write(remove_register_request, payload.message_id)
                 await message.clear_reactions()
                 await message.edit(content=f"✅ {mod_member.name} accepted {player_member.mention}'s request for IGN"
                                            f" **{request[2]}**", embed=None)
@@ -165,7 +176,7 @@ class RegistrationCommands(Cog, name="User Registration"):
                     # This means the bot can't DM the user
                     await channel.send("This user has PMs off, failed to send DM.")
             elif str(payload.emoji) == "❌" and required_role.position <= mod_member.top_role.position:
-                remove_register_request(payload.message_id)
+                await run_write(remove_register_request, payload.message_id)
                 await message.clear_reactions()
                 await message.edit(content=f"❌ {mod_member.name} denied {player_member.mention}'s request for IGN"
                                            f" **{request[2]}**", embed=None)
@@ -208,7 +219,7 @@ class RegistrationCommands(Cog, name="User Registration"):
 
         response = await self.bot.wait_for('message', check=check)
         if response.content.lower() == "y" or response.content.lower() == "yes":
-            player.delete()
+            await run_write(player.delete)
             await success_embed(ctx, f"User {user.mention} has been unregistered.")
         else:
             await response_embed(ctx, "Stopped Deletion", f"User {user.mention} will not be deleted from the database.")
@@ -263,21 +274,23 @@ class RegistrationCommands(Cog, name="User Registration"):
             if variable_name:
                 if value:
                     if variable_name == "username":
-                        old_username = player.update_minecraft_username()
                         try:
-                            player.change_minecraft_username(value)
+                            old_username = await player.update_minecraft_username()
+                            await player.change_minecraft_username(value)
                             await success_embed(ctx, f"Changed {discord_tag.mention}'s username: **{old_username}** -> **{value}**")
                         except UsernameAlreadyExistsError:
                             await error_embed(ctx, f"Username **{value}** is already in the database")
                         except UsernameDoesNotExistError:
                             await error_embed(ctx, f"Username **{value}** is not a valid username")
+                        except MojangUnavailableError:
+                            await error_embed(ctx, "Could not reach Mojang, try again later")
                     elif variable_name == "discord":
                         value = value[3:-1]
                         if value.isdigit():
                             user = self.bot.get_user(int(value))
                             if user:
                                 try:
-                                    player.change_discord_id(user.id)
+                                    await run_write(player.change_discord_id, user.id)
                                     await success_embed(ctx,
                                                         f"Changed discord user: {discord_tag.mention} -> {user.mention}")
                                 except DiscordAlreadyExistsError:
@@ -290,7 +303,7 @@ class RegistrationCommands(Cog, name="User Registration"):
                         old_elo = player.get_elo()
                         if value.isdigit():
                             value = int(value)
-                            if player.set_elo(value):
+                            if await run_write(player.set_elo, value):
                                 await success_embed(ctx, f"Set {discord_tag.mention}'s elo: **{old_elo}** -> **{value}**")
                             else:
                                 await error_embed(ctx, f"Elo given (**{value}**) is below Elo floor (**{ELO_FLOOR}**)")
@@ -300,7 +313,7 @@ class RegistrationCommands(Cog, name="User Registration"):
                         old_priority = player.get_priority()
                         if value.isdigit():
                             value = int(value)
-                            if player.set_priority(value):
+                            if await run_write(player.set_priority, value):
                                 await success_embed(ctx, f"Set {discord_tag.mention}'s priority: **{old_priority}** -> **{value}**")
                             else:
                                 await error_embed(ctx, f"Priority given (**{value}**) is negative")
@@ -334,14 +347,7 @@ class RegistrationCommands(Cog, name="User Registration"):
             return
 
         #Position in leaderboard
-        data = get_sorted_elo()
-        count = 1
-        for item in data:
-            if player:
-                if player.minecraft_username == item[0]:
-                    leader_pos = count
-                    break
-            count += 1
+        leader_pos = player_cache.rank(player)
 
         stats = f"**ELO:** {getattr(player, 'elo')}\n**Rank**: #{leader_pos}\n**Discord:** <@{getattr(player, 'discord_id')}>"
         #for key in player.__dict__.keys():
@@ -354,13 +360,33 @@ class RegistrationCommands(Cog, name="User Registration"):
     @tasks.loop(hours=IGN_TRACKER_INTERVAL_HOURS)
     async def update_usernames(self):
         server = self.bot_channel.guild
-        changes_list = []
-        for player in Player.fetch_players_list():
-            old_username = player.minecraft_username
-            latest_username = player.update_minecraft_username()
-            if latest_username != old_username and latest_username is not None:
-                changes_list.append([player, old_username])
-            await async_sleep(1)
+        checked_at = time()
+        # Anything checked in the first half of the interval is stale, leaving room for the loop drifting
+        stale_ids = await run_read(fetch_stale_minecraft_ids, checked_at - IGN_TRACKER_INTERVAL_HOURS * 1800)
+        usernames = {}
+        try:
+            for index in range(0, len(stale_ids), MOJANG_BATCH_SIZE):
+                batch = stale_ids[index:index + MOJANG_BATCH_SIZE]
+                results = await gather(*(mojang.get_username(minecraft_id) for minecraft_id in batch),
+                                       return_exceptions=True)
+                failed = 0
+                for minecraft_id, result in zip(batch, results):
+                    if isinstance(result, BaseException):
+                        failed += 1
+                        if not isinstance(result, MojangUnavailableError):
+                            # Raising would stop the loop for good, the ID is just tried again next pass
+                            logging.error(f"[MOJANG] Looking up the username of {minecraft_id} failed",
+                                          exc_info=result)
+                    else:
+                        usernames[minecraft_id] = result
+                if failed == len(batch):
+                    # Nothing in this batch could be looked up, the rest are left for the next pass
+                    logging.info(f"[MOJANG] Mojang API unavailable, {len(stale_ids) - index} usernames left unchecked")
+                    break
+        finally:
+            # The usernames looked up before anything went wrong are saved either way
+            changes_list = await run_write(Player.save_minecraft_usernames, usernames, checked_at)
+        logging.info(f"[MOJANG] Checked {len(usernames)}/{len(stale_ids)} stale usernames, {len(changes_list)} changed")
         if len(changes_list) > 0:
             embed = Embed(title="IGNs Updated", color=Colour.dark_purple())
             for change in changes_list:
@@ -400,14 +426,14 @@ class RegistrationCommands(Cog, name="User Registration"):
         registered = []
         unregistered = []
         without_nick = []
+        players = Player.fetch_players_dict()
         for member in server.members:
             if not member.bot:
                 if member.nick is None:
                     without_nick.append(member.mention)
                 else:
-                    try:
-                        player = Player.from_discord_id(member.id)
-                    except PlayerDoesNotExistError:
+                    player = players.get(member.id)
+                    if not player:
                         unregistered.append(member.mention)
                     else:
                         team_list = re.findall(r"^\[(\w{1,4})\]", member.nick)
@@ -10,7 +10,8 @@ from database.strikes import *
 from datetime import timedelta, datetime
 from pytz import timezone
 from discord.errors import Forbidden
-from discord.ext import tasks
+from utils.scheduler import DeadlineQueue
+from database.async_db import run_read, run_write
 
 # TODO: Make commands / command names more intuitive
 # TODO: Make view strikes embed use fields
@@ -25,6 +26,12 @@ def calculate_new_strike_duration(user_id):
         return default_strike_days + default_strike_days * (total_strikes**2)
 
 
+def get_strike_deadline(expiry_date, is_active):
+    # Active strikes are next due when they expire, inactive ones when they get deleted 30 days after that
+    expiry_date = datetime.fromisoformat(expiry_date)
+    return expiry_date if is_active else expiry_date + timedelta(days=30)
+
+
 def get_strike_info_string(strike, user):
     return (
         f"ID: `{strike[0]}`\n"
@@ -37,15 +44,31 @@ def get_strike_info_string(strike, user):
 
 class StrikeCommands(Cog, name="Strike Commands"):
     def __init__(self, bot):
-        self.bot = bot   
+        self.bot = bot
+        self.strike_scheduler = DeadlineQueue(lambda: datetime.now(timezone(TIMEZONE)))
+        self.scheduler_task = None
+        strike_listeners.append(self.reschedule_strike)
 
     @Cog.listener()
     async def on_ready(self):
         self.bot_channel = self.bot.get_channel(BOT_OUTPUT_CHANNEL)
-        self.update_strikes.start()
+        if not self.scheduler_task:
+            await run_read(load_active_strikes)
+            for strike_id, expiry_date, is_active in await run_read(get_strike_deadlines):
+                self.strike_scheduler.schedule(strike_id, get_strike_deadline(expiry_date, is_active))
+            self.scheduler_task = self.bot.loop.create_task(self.strike_scheduler.run(self.update_strike))
 
     def cog_unload(self):
-        self.update_usernames.cancel()
+        strike_listeners.remove(self.reschedule_strike)
+        if self.scheduler_task:
+            self.scheduler_task.cancel()
+
+    def reschedule_strike(self, strike_id):
+        strike = get_strike(strike_id)
+        if strike:
+            self.strike_scheduler.schedule(strike_id, get_strike_deadline(strike[4], strike[6]))
+        else:
+            self.strike_scheduler.cancel(strike_id)
 
     @cog_slash(name="strike",
                description="Strike a player",
@@ -69,11 +92,12 @@ class StrikeCommands(Cog, name="Strike Commands"):
         if not has_permissions(ctx, MOD_ROLE):
             await ctx.send("You do not have sufficient permissions to perform this command", hidden=True)
             return False
-        duration_days = calculate_new_strike_duration(user.id)
+        duration_days = await run_read(calculate_new_strike_duration, user.id)
         time_now = datetime.now(timezone(TIMEZONE))
         expiry_date = time_now + timedelta(days=duration_days)
-        total_strikes = len(get_all_user_strikes(user.id))
-        add_strike(
+        total_strikes = len(await run_read(get_all_user_strikes, user.id))
+        await run_write(
+            add_strike,
             user_id=user.id,
             striked_by=ctx.author.id,
             striked_at=time_now.isoformat(),
@@ -106,8 +130,8 @@ class StrikeCommands(Cog, name="Strike Commands"):
     async def strike_view(self, ctx, user=False):
         if not user:
             user = ctx.author
-        active_strikes = get_active_user_strikes(user.id)
-        inactive_strikes = get_inactive_user_strikes(user.id)
+        active_strikes = await run_read(get_active_user_strikes, user.id)
+        inactive_strikes = await run_read(get_inactive_user_strikes, user.id)
         content = ""
         if not active_strikes and not inactive_strikes:
             content = f"{user.mention} has no strikes."
@@ -149,7 +173,7 @@ class StrikeCommands(Cog, name="Strike Commands"):
         if not has_permissions(ctx, MOD_ROLE):
             await ctx.send("You do not have sufficient permissions to perform this command", hidden=True)
             return False
-        strike = get_strike(strike_id)
+        strike = await run_read(get_strike, strike_id)
         if not strike:
             await error_embed(ctx, "Could not find a strike associated with this ID. Try again.")
             return
@@ -173,57 +197,59 @@ class StrikeCommands(Cog, name="Strike Commands"):
             await response_embed(ctx, "Cancelled", "Strike deletion was cancelled")
             return
 
-        remove_strike(strike_id)
+        await run_write(remove_strike, strike_id)
         await success_embed(ctx, "Removed strike")
 
-    @tasks.loop(minutes=1)
-    async def update_strikes(self):
+    async def update_strike(self, strike_id):
+        strike = await run_read(get_strike, strike_id)
+        if not strike:
+            return
         time_now = datetime.now(timezone(TIMEZONE))
-        all_strikes = get_all_strikes()
-        for strike in all_strikes:
-            strike_expiry_date = datetime.fromisoformat(strike[4])
-            strike_date = datetime.fromisoformat(strike[3])
-            # If the strike is active and due to expire
-            if strike[6] and strike_expiry_date <= time_now:
-                change_active_status(strike[0], False)
-                user = self.bot.get_user(strike[1])
+        strike_expiry_date = datetime.fromisoformat(strike[4])
+        # If the strike is active and due to expire
+        if strike[6] and strike_expiry_date <= time_now:
+            await run_write(change_active_status, strike[0], False)
+            user = self.bot.get_user(strike[1])
+            await response_embed(
+                self.bot_channel,
+                "Strike Expired",
+                get_strike_info_string(strike, user)
+            )
+            try:
+                if not user:
+                    return
                 await response_embed(
-                    self.bot_channel,
-                    "Strike Expired",
-                    get_strike_info_string(strike, user)
+                    user,
+                    "Strike no longer active",
+                    get_strike_info_string(strike, user) +
+                    "_if you have other strikes active, you may not be able to sign up for events_"
                 )
-                try:
-                    if not user:
-                        continue
-                    await response_embed(
-                        user,
-                        "Strike no longer active",
-                        get_strike_info_string(strike, user) +
-                        "_if you have other strikes active, you may not be able to sign up for events_"
-                    )
-                except Forbidden:
-                    logging.info(
-                        f"Could not send DM to {user.mention if user else strike[1]} about their strike")
-            # Strikes get deleted 30 days after expiry date
-            elif strike_expiry_date + timedelta(days=30) <= time_now:
-                remove_strike(strike[0])
-                user = self.bot.get_user(strike[1])
+            except Forbidden:
+                logging.info(
+                    f"Could not send DM to {user.mention if user else strike[1]} about their strike")
+        # Strikes get deleted 30 days after expiry date
+        elif strike_expiry_date + timedelta(days=30) <= time_now:
+            await run_write(remove_strike, strike[0])
+            user = self.bot.get_user(strike[1])
+            await response_embed(
+                self.bot_channel,
+                "Strike Deleted",
+                get_strike_info_string(strike, user) +
+                f"_this strike will no longer count towards the length of {user.mention if user else strike[1]}'s "
+                f"new strikes_"
+            )
+            try:
+                if not user:
+                    return
                 await response_embed(
-                    self.bot_channel,
-                    "Strike Deleted",
+                    user,
+                    "Strike deleted from your record",
                     get_strike_info_string(strike, user) +
-                    f"_this strike will no longer count towards the length of {user.mention if user else strike[1]}'s "
-                    f"new strikes_"
+                    "_this strike will no longer count towards the length of new strikes_"
                 )
-                try:
-                    if not user:
-                        continue
-                    await response_embed(
-                        user,
-                        "Strike deleted from your record",
-                        get_strike_info_string(strike, user) +
-                        "_this strike will no longer count towards the length of new strikes_"
-                    )
-                except Forbidden:
-                    logging.info(
-                        f"Could not send DM to {user.mention if user else strike[1]} about their strike")
+            except Forbidden:
+                logging.info(
+                    f"Could not send DM to {user.mention if user else strike[1]} about their strike")
+        else:
+            # Not due yet, e.g. the strike was changed while it was being processed
+            await run_read(self.reschedule_strike, strike_id)
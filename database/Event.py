@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta
 from pytz import timezone
 from utils.config import TIMEZONE
-from database.database import check_events_event_id, fetch_events_event_id, add_event, fetch_events_list_event_id, \
+from database.database import check_events_event_id, fetch_events_event_id, add_event, fetch_all_events, \
     delete_event, update_events_title, update_events_description, update_events_time_est, \
-    update_events_signup_deadline, update_events_is_active, fetch_active_events_list_event_id, \
-    update_events_is_signup_active, fetch_signup_active_events_list_event_id
+    update_events_signup_deadline, update_events_is_active, fetch_all_active_events, \
+    update_events_is_signup_active, fetch_all_signup_active_events, fetch_events_event_ids
 
 
 class EventDoesNotExistError(Exception):
@@ -112,6 +112,20 @@ class Event:
         update_events_signup_deadline(signup_deadline, self.event_id)
         return True
 
+    def reschedule(self, time_est, signup_deadline):
+        """Moves the event to a new time and reopens it and its signups"""
+        self.set_event_time_est(time_est)
+        self.set_signup_deadline(signup_deadline)
+        self.set_is_active(True)
+        self.set_is_signup_active(True)
+        self.update()
+
+    def deactivate(self):
+        """Sets the event and its signups to inactive"""
+        self.set_is_active(False)
+        self.set_is_signup_active(False)
+        self.update()
+
     def postpone(self, amount):
         event_time = datetime.fromisoformat(self.time_est)
         signup_deadline = datetime.fromisoformat(self.signup_deadline)
@@ -119,6 +133,16 @@ class Event:
         self.set_event_time_est((event_time + change_amount).isoformat())
         self.set_signup_deadline((signup_deadline + change_amount).isoformat())
 
+    def get_deactivation_time(self):
+        # Events are set to inactive 1.5 hours after they start
+        return datetime.fromisoformat(self.time_est) + timedelta(hours=1.5)
+
+    def get_next_transition(self):
+        """Returns when the event next needs to change state (signups closing or the event ending)"""
+        if self.is_signups_active:
+            return min(datetime.fromisoformat(self.signup_deadline), self.get_deactivation_time())
+        return self.get_deactivation_time()
+
     def get_is_active(self):
         self.update()
         return self.is_active
@@ -155,53 +179,34 @@ class Event:
         else:
             raise EventDoesNotExistError()
 
+    @classmethod
+    def from_event_ids(cls, event_ids):
+        """Returns a dict of event ID -> Event for the given IDs. IDs that don't exist are left out"""
+        return {data[0]: cls(data) for data in fetch_events_event_ids(set(event_ids))}
+
     @classmethod
     def fetch_events_list(cls):
-        result = fetch_events_list_event_id()
-        event_list = []
-        for id_tuple in result:
-            event_list.append(cls.from_event_id(id_tuple[0]))
-        return event_list
+        return [cls(data) for data in fetch_all_events()]
 
     @classmethod
     def fetch_events_dict(cls):
-        result = fetch_events_list_event_id()
-        event_dict = dict()
-        for id_tuple in result:
-            event_dict[id_tuple[0]] = cls.from_event_id(id_tuple[0])
-        return event_dict
+        return {data[0]: cls(data) for data in fetch_all_events()}
 
     @classmethod
     def fetch_active_events_list(cls):
-        result = fetch_active_events_list_event_id()
-        event_list = []
-        for id_tuple in result:
-            event_list.append(cls.from_event_id(id_tuple[0]))
-        return event_list
+        return [cls(data) for data in fetch_all_active_events()]
 
     @classmethod
     def fetch_active_events_dict(cls):
-        result = fetch_active_events_list_event_id()
-        event_dict = dict()
-        for id_tuple in result:
-            event_dict[id_tuple[0]] = cls.from_event_id(id_tuple[0])
-        return event_dict
+        return {data[0]: cls(data) for data in fetch_all_active_events()}
 
     @classmethod
     def fetch_signup_active_events_list(cls):
-        result = fetch_signup_active_events_list_event_id()
-        event_list = []
-        for id_tuple in result:
-            event_list.append(cls.from_event_id(id_tuple[0]))
-        return event_list
+        return [cls(data) for data in fetch_all_signup_active_events()]
 
     @classmethod
     def fetch_signup_active_events_dict(cls):
-        result = fetch_signup_active_events_list_event_id()
-        event_dict = dict()
-        for id_tuple in result:
-            event_dict[id_tuple[0]] = cls.from_event_id(id_tuple[0])
-        return event_dict
+        return {data[0]: cls(data) for data in fetch_all_signup_active_events()}
 
     @staticmethod
     def event_check(event_id):
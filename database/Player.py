@@ -1,13 +1,15 @@
-from mojang import MojangAPI
 from random import choice, seed
+from bisect import bisect_left, insort
+from threading import RLock
 
 from utils.config import ELO_FLOOR
-from database.database import fetch_players_minecraft_id, fetch_players_minecraft_username, fetch_players_discord_id, \
-    fetch_players_list_discord_id, update_players_priority, update_players_elo, update_players_minecraft_username, \
-    update_players_minecraft_id, update_players_discord_id, check_players_minecraft_id, check_players_discord_id, \
-    add_player, delete_player, player_check
-from database.strikes import get_active_user_strikes
-
+from utils.mojang_util import mojang
+from database.database import fetch_players_minecraft_id, fetch_players_discord_id, \
+    fetch_all_players, update_players_priority, update_players_elo, \
+    update_players_minecraft_username, update_players_minecraft_id, update_players_discord_id, \
+    check_players_minecraft_id, check_players_discord_id, add_player, delete_player, player_check, save_mojang_names
+from database.strikes import is_striked
+from database.async_db import run_write
 
 
 class PlayerDoesNotExistError(Exception):
@@ -42,10 +44,164 @@ class DiscordAlreadyExistsError(Exception):
         super().__init__(self.message)
 
 
+def rank_key(player):
+    # Highest ELO first, ties broken by minecraft ID so every player has a distinct place
+    return -player.elo, player.minecraft_id
+
+
+class PlayerCache:
+    """
+    Identity map of every registered player, shared by the whole process (bot commands and the webserver).
+
+    The first lookup loads every player in one query. After that each player has exactly one Player object, found by
+    discord ID, minecraft ID or minecraft username with a dict lookup, and the Player write methods update the maps
+    as they write to the database. Every write to the players table goes through Player, so a lookup that misses
+    means there's no such player and the database isn't asked.
+
+    It also keeps every player's (-elo, minecraft_id) in a sorted list, so a player's leaderboard position, a page of
+    the leaderboard or the players around someone are found with a binary search instead of sorting the table.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.loaded = False
+        self.by_discord_id = {}
+        self.by_minecraft_id = {}
+        self.by_minecraft_username = {}
+        self.ranking = []
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """(Re)loads every player from the database. Players that are already cached are updated in place"""
+        # Held from the query to the swap, so a write-through that lands in between isn't replaced by the older rows
+        with self.lock:
+            rows = fetch_all_players()
+            old_players = self.by_minecraft_id
+            self.by_discord_id, self.by_minecraft_id, self.by_minecraft_username = {}, {}, {}
+            self.ranking = []
+            for data in rows:
+                player = old_players.get(data[0])
+                if player:
+                    player.set_data(data)
+                else:
+                    player = Player(data)
+                self.add(player)
+            self.loaded = True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def add(self, player):
+        with self.lock:
+            if player.minecraft_id in self.by_minecraft_id:
+                self.remove(self.by_minecraft_id[player.minecraft_id])
+            self.by_discord_id[player.discord_id] = player
+            self.by_minecraft_id[player.minecraft_id] = player
+            self.by_minecraft_username[player.minecraft_username] = player
+            insort(self.ranking, rank_key(player))
+        return player
+
+    def remove(self, player):
+        with self.lock:
+            if self.by_minecraft_id.get(player.minecraft_id) is player:
+                del self.ranking[bisect_left(self.ranking, rank_key(player))]
+            for index, key in ((self.by_discord_id, player.discord_id),
+                               (self.by_minecraft_id, player.minecraft_id),
+                               (self.by_minecraft_username, player.minecraft_username)):
+                if index.get(key) is player:
+                    del index[key]
+
+    def set_elo(self, player, elo):
+        """Changes a player's ELO, moving them to their new place in the ranking"""
+        with self.lock:
+            cached = self.by_minecraft_id.get(player.minecraft_id) is player
+            if cached:
+                self.remove(player)
+            player.elo = elo
+            if cached:
+                self.add(player)
+
+    def rank(self, player):
+        """Returns the player's leaderboard position, starting from 1"""
+        self.ensure_loaded()
+        with self.lock:
+            return bisect_left(self.ranking, rank_key(player)) + 1
+
+    def leaderboard(self, start=0, stop=None):
+        """Returns (position, player) for the players between two (0-based) indexes of the leaderboard"""
+        self.ensure_loaded()
+        with self.lock:
+            start = max(start, 0)
+            return [(position, self.by_minecraft_id[key[1]])
+                    for position, key in enumerate(self.ranking[start:stop], start=start + 1)]
+
+    def leaderboard_page(self, page, page_size=20):
+        """Returns (position, player) for page number `page` (starting from 0) of the leaderboard"""
+        return self.leaderboard(page * page_size, (page + 1) * page_size)
+
+    def around(self, player, count=2):
+        """Returns (position, player) for the player and up to `count` players either side of them"""
+        index = self.rank(player) - 1
+        return self.leaderboard(index - count, index + count + 1)
+
+    def get(self, index_name, key):
+        """Looks a player up in one of the maps"""
+        self.ensure_loaded()
+        with self.lock:
+            # Looked up by name, since load() replaces the maps
+            player = getattr(self, index_name).get(key)
+            if player:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return player
+
+    def from_discord_id(self, discord_id):
+        return self.get("by_discord_id", discord_id)
+
+    def from_minecraft_id(self, minecraft_id):
+        return self.get("by_minecraft_id", minecraft_id)
+
+    def from_minecraft_username(self, minecraft_username):
+        return self.get("by_minecraft_username", minecraft_username)
+
+    def from_discord_ids(self, discord_ids):
+        self.ensure_loaded()
+        players = {}
+        with self.lock:
+            for discord_id in discord_ids:
+                player = self.by_discord_id.get(discord_id)
+                if player:
+                    players[discord_id] = player
+            self.hits += len(players)
+            self.misses += len(discord_ids) - len(players)
+        return players
+
+    def all(self):
+        self.ensure_loaded()
+        return list(self.by_minecraft_id.values())
+
+    def stats(self):
+        with self.lock:
+            hits, misses, players = self.hits, self.misses, len(self.by_minecraft_id)
+        lookups = hits + misses
+        return {
+            "players": players,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0,
+        }
+
+
 class Player:
     def __init__(self, data):
         if not data or not isinstance(data, tuple):
             raise ValueError
+        self.set_data(data)
+
+    def set_data(self, data):
         self.minecraft_id = data[0]
         self.discord_id = data[1]
         self.minecraft_username = data[2]
@@ -53,16 +209,22 @@ class Player:
         self.elo = data[4]
 
     def delete(self):
+        player_cache.remove(self)
         return delete_player(self.minecraft_id)
 
+    @staticmethod
+    def delete_players(players):
+        for player in players:
+            player.delete()
+
     def update(self):
         data = fetch_players_minecraft_id(self.minecraft_id)
-        self.minecraft_username = data[2]
-        self.priority = data[3]
-        self.elo = data[4]
+        with player_cache.lock:
+            player_cache.remove(self)
+            self.set_data(data)
+            player_cache.add(self)
 
     def get_priority(self):
-        self.update()
         return self.priority
 
     def set_priority(self, priority):
@@ -73,103 +235,141 @@ class Player:
         return True
 
     def change_priority(self, amount):
-        self.update()
         self.set_priority(self.priority + amount if self.priority + amount >= 0 else 0)
 
+    @staticmethod
+    def change_priorities(changes):
+        """Changes the priority of every (player, amount) pair, so a batch of changes is a single run_write call"""
+        for player, amount in changes:
+            player.change_priority(amount)
+
     def get_elo(self):
-        self.update()
         return self.elo
 
     def set_elo(self, elo):
         if elo < ELO_FLOOR:
             return False
-        self.elo = elo
         update_players_elo(elo, self.minecraft_id)
+        player_cache.set_elo(self, elo)
         return True
 
     def change_elo(self, amount):
-        self.update()
         self.set_elo(self.elo + amount if self.elo + amount >= ELO_FLOOR else ELO_FLOOR)
 
-    def update_minecraft_username(self):
-        self.minecraft_username = MojangAPI.get_username(self.minecraft_id)
-        update_players_minecraft_username(self.minecraft_username, self.minecraft_id)
+    async def update_minecraft_username(self):
+        return await run_write(self.set_minecraft_username, await mojang.get_username(self.minecraft_id))
+
+    def set_minecraft_username(self, minecraft_username):
+        update_players_minecraft_username(minecraft_username, self.minecraft_id)
+        player_cache.remove(self)
+        self.minecraft_username = minecraft_username
+        player_cache.add(self)
         return self.minecraft_username
 
-    def change_minecraft_username(self, minecraft_username):
-        minecraft_id = MojangAPI.get_uuid(minecraft_username)
+    @classmethod
+    def save_minecraft_usernames(cls, usernames, checked_at):
+        """
+        Saves the usernames Mojang returned for {minecraft_id: minecraft_username} in one transaction.
+        Returns [(player, old_username)] for every player whose username changed
+        """
+        save_mojang_names(usernames.items(), checked_at)
+        changes = []
+        with player_cache.lock:
+            for minecraft_id, minecraft_username in usernames.items():
+                player = player_cache.from_minecraft_id(minecraft_id)
+                if player and minecraft_username and player.minecraft_username != minecraft_username:
+                    changes.append((player, player.minecraft_username))
+                    player_cache.remove(player)
+                    player.minecraft_username = minecraft_username
+                    player_cache.add(player)
+        return changes
+
+    async def change_minecraft_username(self, minecraft_username):
+        minecraft_id = await mojang.get_uuid(minecraft_username)
         if minecraft_id:
-            if fetch_players_minecraft_id(minecraft_id):
-                raise UsernameAlreadyExistsError(f"Username {minecraft_username} already exists in the database")
-            update_players_minecraft_id(minecraft_id, minecraft_username, self.minecraft_id)
-            self.minecraft_id = minecraft_id
-            self.minecraft_username = minecraft_username
-            return True
+            return await run_write(self.set_minecraft_id, minecraft_id, minecraft_username)
         else:
             raise UsernameDoesNotExistError(f"Username {minecraft_username} is not a valid Minecraft username")
 
+    def set_minecraft_id(self, minecraft_id, minecraft_username):
+        if fetch_players_minecraft_id(minecraft_id):
+            raise UsernameAlreadyExistsError(f"Username {minecraft_username} already exists in the database")
+        update_players_minecraft_id(minecraft_id, minecraft_username, self.minecraft_id)
+        player_cache.remove(self)
+        self.minecraft_id = minecraft_id
+        self.minecraft_username = minecraft_username
+        player_cache.add(self)
+        return True
+
     def change_discord_id(self, discord_id):
         if fetch_players_discord_id(discord_id):
             raise DiscordAlreadyExistsError(f"Discord {discord_id} already exists in the database")
         update_players_discord_id(discord_id, self.minecraft_id)
+        player_cache.remove(self)
         self.discord_id = discord_id
+        player_cache.add(self)
         return True
 
     def is_striked(self):
-        return bool(get_active_user_strikes(self.discord_id))
+        return is_striked(self.discord_id)
 
     @classmethod
-    def add_player(cls, minecraft_id, discord_id, priority=0, elo=1000):
-        minecraft_username = MojangAPI.get_username(minecraft_id)
+    async def add_player(cls, minecraft_id, discord_id, priority=0, elo=1000):
+        minecraft_username = await mojang.get_username(minecraft_id)
         if minecraft_username:
-            if check_players_minecraft_id(minecraft_id):
-                raise UsernameAlreadyExistsError()
-            elif check_players_discord_id(discord_id):
-                raise DiscordAlreadyExistsError()
-            add_player(minecraft_id, discord_id, minecraft_username, priority, elo)
-            return cls((minecraft_id, discord_id, minecraft_username, priority, elo))
+            return await run_write(cls.save_player, minecraft_id, discord_id, minecraft_username, priority, elo)
         else:
             raise UsernameDoesNotExistError()
 
+    @classmethod
+    def save_player(cls, minecraft_id, discord_id, minecraft_username, priority=0, elo=1000):
+        if check_players_minecraft_id(minecraft_id):
+            raise UsernameAlreadyExistsError()
+        elif check_players_discord_id(discord_id):
+            raise DiscordAlreadyExistsError()
+        add_player(minecraft_id, discord_id, minecraft_username, priority, elo)
+        return player_cache.add(cls((minecraft_id, discord_id, minecraft_username, priority, elo)))
+
     @classmethod
     def from_minecraft_id(cls, minecraft_id):
-        data = fetch_players_minecraft_id(minecraft_id)
-        if data:
-            return cls(data)
+        player = player_cache.from_minecraft_id(minecraft_id)
+        if player:
+            return player
         else:
             raise PlayerDoesNotExistError()
 
     @classmethod
     def from_minecraft_username(cls, minecraft_username):
-        data = fetch_players_minecraft_username(minecraft_username)
-        if data:
-            return cls(data)
+        player = player_cache.from_minecraft_username(minecraft_username)
+        if player:
+            return player
         else:
             raise PlayerDoesNotExistError()
 
     @classmethod
     def from_discord_id(cls, discord_id):
-        data = fetch_players_discord_id(discord_id)
-        if data:
-            return cls(data)
+        player = player_cache.from_discord_id(discord_id)
+        if player:
+            return player
         else:
             raise PlayerDoesNotExistError()
 
     @classmethod
     def exists_discord_id(cls, discord_id):
-        data = fetch_players_discord_id(discord_id)
-        if data:
-            return cls(data)
-        else:
-            return False
+        return player_cache.from_discord_id(discord_id) or False
+
+    @classmethod
+    def from_discord_ids(cls, discord_ids):
+        """Returns a dict of discord ID -> Player for the given IDs. Unregistered IDs are left out"""
+        return player_cache.from_discord_ids(set(discord_ids))
 
     @classmethod
     def fetch_players_list(cls):
-        result = fetch_players_list_discord_id()
-        player_list = []
-        for id_tuple in result:
-            player_list.append(cls.from_discord_id(id_tuple[0]))
-        return player_list
+        return player_cache.all()
+
+    @classmethod
+    def fetch_players_dict(cls):
+        return {player.discord_id: player for player in player_cache.all()}
 
     @staticmethod
     def player_check(minecraft_id, discord_id):
@@ -180,3 +380,5 @@ class Player:
         seed()
         return choice(Player.fetch_players_list())
 
+
+player_cache = PlayerCache()
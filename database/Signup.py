@@ -1,6 +1,7 @@
 from database.database import add_signup, check_signups_user_event, fetch_signups_user_event, \
-    fetch_signups_list_event_id, delete_signup, update_signups_can_play, update_signups_is_muted, update_signups_can_sub
-from database.strikes import get_active_user_strikes
+    fetch_signups_event_id, fetch_signups_event_ids, delete_signup, update_signups_can_play, update_signups_is_muted, \
+    update_signups_can_sub, apply_signup_changes
+from database.strikes import is_striked
 
 class SignupAlreadyExistsError(Exception):
     """Exception raised when signup is already in the database"""
@@ -37,6 +38,9 @@ class Signup:
     def delete(self):
         return delete_signup(self.user_id, self.event_id)
 
+    def to_row(self):
+        return self.user_id, self.event_id, int(self.can_play), int(self.is_muted), int(self.can_sub)
+
     def update(self):
         data = fetch_signups_user_event(self.user_id, self.event_id)
         self.can_play = bool(data[2])
@@ -44,12 +48,7 @@ class Signup:
         self.can_sub = bool(data[4])
 
     def update_db(self):
-        if check_signups_user_event(int(self.user_id), self.event_id):
-            update_signups_can_play(int(self.can_play), self.user_id, self.event_id)
-            update_signups_is_muted(int(self.is_muted), self.user_id, self.event_id)
-            update_signups_can_sub(int(self.can_sub), self.user_id, self.event_id)
-        else:
-            add_signup(self.user_id, self.event_id, int(self.can_play), int(self.is_muted), int(self.can_sub))
+        apply_signup_changes([self.to_row()], [])
 
     def set_can_play(self, can_play):
         self.can_play = can_play
@@ -70,7 +69,7 @@ class Signup:
         return not self.can_play and not self.can_sub
 
     def is_striked(self):
-        return bool(get_active_user_strikes(self.user_id))
+        return is_striked(self.user_id)
 
     @classmethod
     def create_signup(cls, user_id, event_id, can_play=False, is_muted=False, can_sub=False):
@@ -93,11 +92,15 @@ class Signup:
 
     @classmethod
     def fetch_signups_list(cls, event_id):
-        result = fetch_signups_list_event_id(event_id)
-        signup_list = []
-        for id_tuple in result:
-            signup_list.append(cls.from_user_event(id_tuple[0], id_tuple[1]))
-        return signup_list
+        return [cls(data) for data in fetch_signups_event_id(event_id)]
+
+    @classmethod
+    def fetch_signups_dict(cls, event_ids):
+        """Returns a dict of event ID -> list of signups for every one of the given events"""
+        signups_dict = {event_id: [] for event_id in event_ids}
+        for data in fetch_signups_event_ids(signups_dict.keys()):
+            signups_dict[data[1]].append(cls(data))
+        return signups_dict
 
     @staticmethod
     def signup_check(user_id, event_id):
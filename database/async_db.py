@@ -0,0 +1,39 @@
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from database.database import connect, set_thread_connection
+from utils.config import DATABASE_READ_CONNECTIONS
+
+"""
+Awaitable access to the database for code running on the event loop.
+
+Any of the existing database functions / Player, Event, Signup methods can be awaited by passing them through
+run_read or run_write, e.g. `player = await run_read(Player.from_discord_id, user_id)`.
+
+Writes are serialised on a single thread that owns its own read-write connection. Reads are spread over a small pool
+of threads, each with a read-only connection, so a slow commit never holds up the event loop or other readers.
+"""
+
+
+def _init_writer():
+    set_thread_connection(connect())
+
+
+def _init_reader():
+    set_thread_connection(connect(read_only=True))
+
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database-writer", initializer=_init_writer)
+_readers = ThreadPoolExecutor(max_workers=DATABASE_READ_CONNECTIONS, thread_name_prefix="database-reader",
+                              initializer=_init_reader)
+
+
+async def run_read(func, *args, **kwargs):
+    """Runs a function that only reads from the database on one of the read-only connections"""
+    return await get_running_loop().run_in_executor(_readers, partial(func, *args, **kwargs))
+
+
+async def run_write(func, *args, **kwargs):
+    """Runs a function that writes to the database on the writer thread"""
+    return await get_running_loop().run_in_executor(_writer, partial(func, *args, **kwargs))
@@ -0,0 +1,80 @@
+import os
+import sqlite3 as sql
+from asyncio import get_running_loop
+from datetime import datetime
+from glob import glob
+from logging import info
+from pytz import timezone
+
+from database.database import connect
+from utils.config import BACKUP_DIRECTORY, BACKUP_RETENTION_COUNT, BACKUP_PAGES_PER_STEP, TIMEZONE
+
+"""
+Online backups of the live database.
+
+sqlite's backup API copies the database a few pages at a time from its own read-only connection, so the bot keeps
+reading and writing while a backup runs, and the copy is always a consistent snapshot rather than a file copied
+halfway through a write. Every copy is checked with "pragma integrity_check" before it's kept.
+"""
+
+
+class BackupFailedError(Exception):
+    """Exception raised when a backup could not be created or failed its integrity check"""
+
+    def __init__(self, message="Backup failed its integrity check"):
+        self.message = message
+        super().__init__(self.message)
+
+
+def get_backup_filename(automatic=False):
+    time = datetime.now(timezone(TIMEZONE)).strftime("%Y%m%d-%H%M%S")
+    return f"{BACKUP_DIRECTORY}/database-{'auto-' if automatic else ''}{time}.db"
+
+
+def backup_database(filename, progress=None):
+    """
+    Copies the database to filename and verifies the copy. progress(copied_pages, total_pages) is called after every
+    step. The copy is deleted if anything goes wrong.
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    source = connect(read_only=True)
+    destination = sql.connect(filename)
+    try:
+        source.backup(destination, pages=BACKUP_PAGES_PER_STEP,
+                      progress=(lambda status, remaining, total: progress(total - remaining, total)) if progress else None)
+        result = destination.execute("pragma integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupFailedError(f"Backup failed its integrity check: {result}")
+    except Exception:
+        destination.close()
+        os.remove(filename)
+        raise
+    finally:
+        source.close()
+    destination.close()
+    info(f"[DATABASE] Created backup {filename}")
+    return filename
+
+
+def prune_backups(keep=BACKUP_RETENTION_COUNT):
+    """Deletes all but the newest `keep` automatic backups and returns the deleted filenames"""
+    # The timestamp in the name sorts in date order
+    backups = sorted(glob(f"{BACKUP_DIRECTORY}/database-auto-*.db"))
+    deleted = backups[:-keep] if keep else backups
+    for filename in deleted:
+        os.remove(filename)
+        info(f"[DATABASE] Deleted old backup {filename}")
+    return deleted
+
+
+async def create_backup(automatic=False, progress=None):
+    """
+    Runs a backup on a worker thread. progress(copied_pages, total_pages) is called on the event loop, so it's safe
+    for it to create tasks that edit messages etc.
+    """
+    loop = get_running_loop()
+    thread_progress = (lambda copied, total: loop.call_soon_threadsafe(progress, copied, total)) if progress else None
+    filename = await loop.run_in_executor(None, backup_database, get_backup_filename(automatic), thread_progress)
+    if automatic:
+        await loop.run_in_executor(None, prune_backups)
+    return filename
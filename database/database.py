@@ -1,51 +1,75 @@
 import sqlite3 as sql
+import threading
+from contextlib import closing
+from utils.config import DATABASE_PATH
+from database.migrations import migrate
 
-conn = sql.connect("database/database.db")
-
-conn.execute(
-    '''create table if not exists players (
-    minecraft_id text,
-    discord_id integer,
-    minecraft_username text, 
-    priority integer,
-    elo integer)''')
-
-conn.execute(
-    '''create table if not exists register_requests (
-    minecraft_id text,
-    discord_id integer,
-    minecraft_username text,
-    approval_embed_id integer)''')
-
-conn.execute(
-    '''create table if not exists events (
-    event_id integer,
-    title text,
-    description text,
-    time_est blob,
-    created_est blob,
-    creator integer,
-    guild_id integer,
-    announcement_channel integer,
-    signup_channel integer,
-    signup_message integer,
-    signup_role integer,
-    signup_deadline integer,
-    is_active bool,
-    is_signup_active bool)'''
-)
-
-conn.execute(
-    '''create table if not exists signups (
-    user_id integer,
-    event_id integer,
-    can_play bool,
-    is_muted bool,
-    can_sub bool)'''
-)
-
-conn.commit()
-c = conn.cursor()
+"""
+Every thread gets its own connection - sqlite connections can't be shared between threads. Only the writer thread in
+database/async_db.py is given a read-write connection. Any other thread, including the event loop, lazily opens a
+read-only one, so a write that doesn't go through run_write fails instead of becoming a second writer.
+"""
+
+_local = threading.local()
+
+
+def connect(read_only=False):
+    if read_only:
+        return sql.connect(f"file:{DATABASE_PATH}?mode=ro", uri=True)
+    connection = sql.connect(DATABASE_PATH)
+    # WAL lets readers carry on while a write is being committed, synchronous=normal only fsyncs on checkpoints
+    connection.execute("pragma journal_mode=wal")
+    connection.execute("pragma synchronous=normal")
+    return connection
+
+
+def set_thread_connection(connection):
+    _local.connection = connection
+    _local.cursor = connection.cursor()
+
+
+def get_connection():
+    if not hasattr(_local, "connection"):
+        set_thread_connection(connect(read_only=True))
+    return _local.connection
+
+
+def get_cursor():
+    get_connection()
+    return _local.cursor
+
+
+class ThreadLocalProxy:
+    """Forwards attribute access to the connection or cursor belonging to the calling thread"""
+
+    def __init__(self, getter):
+        self._getter = getter
+
+    def __getattr__(self, name):
+        return getattr(self._getter(), name)
+
+
+conn = ThreadLocalProxy(get_connection)
+c = ThreadLocalProxy(get_cursor)
+
+with closing(connect()) as migration_connection:
+    migrate(migration_connection)
+
+# Keeps "WHERE x IN (...)" queries under sqlite's limit on the number of bound parameters
+MAX_QUERY_PARAMETERS = 500
+
+
+def fetch_where_in(query, values):
+    """
+    Runs a query containing a single "IN ({})" placeholder for every value, in chunks, and returns all the rows
+    """
+    values = list(values)
+    rows = []
+    for index in range(0, len(values), MAX_QUERY_PARAMETERS):
+        chunk = values[index:index + MAX_QUERY_PARAMETERS]
+        c.execute(query.format(", ".join("?" * len(chunk))), chunk)
+        rows += c.fetchall()
+    return rows
 
 """
 Functions that interact with the Players database
@@ -101,6 +125,20 @@ def fetch_players_list_discord_id():
     return c.fetchall()
 
 
+def fetch_all_players():
+    c.execute("SELECT * FROM players")
+    return c.fetchall()
+
+
+def fetch_players_discord_ids(discord_ids):
+    return fetch_where_in("SELECT * FROM players WHERE discord_id IN ({})", discord_ids)
+
+
+def count_players():
+    c.execute("SELECT COUNT(*) FROM players")
+    return c.fetchone()[0]
+
+
 def update_players_minecraft_id(new_minecraft_id, minecraft_username, old_minecraft_id):
     c.execute("UPDATE players SET minecraft_id = ?, minecraft_username = ? WHERE minecraft_id = ?",
               (new_minecraft_id, minecraft_username, old_minecraft_id))
@@ -117,6 +155,34 @@ def update_players_minecraft_username(minecraft_username, minecraft_id):
     conn.commit()
 
 
+def fetch_stale_minecraft_ids(checked_before):
+    """Returns the minecraft IDs of players whose username hasn't been checked since checked_before, oldest first"""
+    c.execute("SELECT players.minecraft_id FROM players LEFT JOIN mojang_names USING (minecraft_id) "
+              "WHERE checked_at IS NULL OR checked_at < ? ORDER BY checked_at", (checked_before,))
+    return [row[0] for row in c.fetchall()]
+
+
+def save_mojang_names(usernames, checked_at):
+    """
+    Records the usernames Mojang returned and renames the players whose username changed, in a single transaction.
+
+    :param usernames: (minecraft_id, minecraft_username) pairs, minecraft_username is None if Mojang didn't know the ID
+    :param checked_at: unix time the usernames were looked up
+    """
+    connection = get_connection()
+    with connection:
+        connection.executemany(
+            "INSERT INTO mojang_names VALUES (?, ?, ?) ON CONFLICT (minecraft_id) DO UPDATE SET "
+            "minecraft_username = excluded.minecraft_username, checked_at = excluded.checked_at",
+            [(minecraft_id, minecraft_username, checked_at) for minecraft_id, minecraft_username in usernames]
+        )
+        connection.executemany(
+            "UPDATE players SET minecraft_username = ? WHERE minecraft_id = ? AND minecraft_username IS NOT ?",
+            [(minecraft_username, minecraft_id, minecraft_username) for minecraft_id, minecraft_username in usernames
+             if minecraft_username]
+        )
+
+
 def update_players_elo(elo, minecraft_id):
     c.execute("UPDATE players SET elo = ? WHERE minecraft_id = ?", (elo, minecraft_id))
     conn.commit()
@@ -227,6 +293,25 @@ def fetch_signup_active_events_list_event_id():
     return c.fetchall()
 
 
+def fetch_all_events():
+    c.execute("SELECT * FROM events")
+    return c.fetchall()
+
+
+def fetch_all_active_events():
+    c.execute("SELECT * FROM events WHERE is_active = 1")
+    return c.fetchall()
+
+
+def fetch_all_signup_active_events():
+    c.execute("SELECT * FROM events WHERE is_signup_active = 1")
+    return c.fetchall()
+
+
+def fetch_events_event_ids(event_ids):
+    return fetch_where_in("SELECT * FROM events WHERE event_id IN ({})", event_ids)
+
+
 def update_events_title(title, event_id):
     c.execute("UPDATE events SET title = ? WHERE event_id = ?", (title, event_id))
     conn.commit()
@@ -270,19 +355,6 @@ def add_signup(user_id, event_id, can_play=0, is_muted=0, can_sub=0):
     return True
 
 
-def get_active_signed_users():
-    # This is so that we only remove the signed role from players who aren't 
-    # currently signed for any event
-    active_event_ids = fetch_active_events_list_event_id()
-    active_signups_list = []
-    for event_id in active_event_ids:
-        c.execute("SELECT user_id FROM signups WHERE event_id = ? AND can_play = 1", event_id)
-        result = c.fetchall()
-        active_signups = [item[0] for item in result]
-        active_signups_list += active_signups
-    return active_signups_list
-
-
 def delete_signup(user_id, event_id):
     if check_signups_user_event(user_id, event_id):
         c.execute("DELETE FROM signups WHERE user_id = ? AND event_id = ?", (user_id, event_id))
@@ -307,6 +379,40 @@ def fetch_signups_list_event_id(event_id):
     return c.fetchall()
 
 
+def fetch_signups_event_id(event_id):
+    c.execute("SELECT * FROM signups WHERE event_id = ?", (event_id,))
+    return c.fetchall()
+
+
+def fetch_signups_event_ids(event_ids):
+    return fetch_where_in("SELECT * FROM signups WHERE event_id IN ({})", event_ids)
+
+
+def apply_signup_changes(upserts, deletes):
+    """
+    Writes a batch of signup changes in a single transaction.
+
+    :param upserts: (user_id, event_id, can_play, is_muted, can_sub) rows to insert or overwrite
+    :param deletes: (user_id, event_id) pairs to delete
+    """
+    deleted_user_ids = {}
+    for user_id, event_id in deletes:
+        deleted_user_ids.setdefault(event_id, []).append(user_id)
+    connection = get_connection()
+    with connection:
+        connection.executemany(
+            "INSERT INTO signups VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id, event_id) DO UPDATE SET "
+            "can_play = excluded.can_play, is_muted = excluded.is_muted, can_sub = excluded.can_sub",
+            upserts
+        )
+        for event_id, user_ids in deleted_user_ids.items():
+            for index in range(0, len(user_ids), MAX_QUERY_PARAMETERS):
+                chunk = user_ids[index:index + MAX_QUERY_PARAMETERS]
+                placeholders = ", ".join("?" * len(chunk))
+                connection.execute(f"DELETE FROM signups WHERE event_id = ? AND user_id IN ({placeholders})",
+                                   [event_id] + chunk)
+
+
 def update_signups_can_play(can_play, user_id, event_id):
     c.execute("UPDATE signups SET can_play = ? WHERE user_id = ? AND event_id = ?", (can_play, user_id, event_id))
     conn.commit()
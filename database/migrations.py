@@ -0,0 +1,213 @@
+from datetime import datetime
+from logging import info, warning
+
+"""
+Versioned schema migrations, run in order when the bot starts.
+
+Each migration is (version, description, statements). The statements of a migration run inside one transaction along
+with the schema_version row that records it, so a migration either applies completely or not at all.
+To change the schema, append a new migration to the end of the list - never edit one that has already shipped.
+"""
+
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''create table if not exists players (
+        minecraft_id text,
+        discord_id integer,
+        minecraft_username text,
+        priority integer,
+        elo integer)''',
+
+        '''create table if not exists register_requests (
+        minecraft_id text,
+        discord_id integer,
+        minecraft_username text,
+        approval_embed_id integer)''',
+
+        '''create table if not exists events (
+        event_id integer,
+        title text,
+        description text,
+        time_est blob,
+        created_est blob,
+        creator integer,
+        guild_id integer,
+        announcement_channel integer,
+        signup_channel integer,
+        signup_message integer,
+        signup_role integer,
+        signup_deadline integer,
+        is_active bool,
+        is_signup_active bool)''',
+
+        '''create table if not exists signups (
+        user_id integer,
+        event_id integer,
+        can_play bool,
+        is_muted bool,
+        can_sub bool)''',
+
+        '''create table if not exists strikes (
+            strike_id integer primary key autoincrement,
+            user_id integer,
+            striked_by integer,
+            striked_at blob,
+            expiry_date blob,
+            strike_reason text,
+            is_active bool
+        )''',
+
+        '''create table if not exists referrals (
+            referral_id integer primary key autoincrement,
+            code text,
+            user_joined_id integer,
+            inviter_id integer,
+            joined_at blob,
+            has_user_played bool,
+            reward_given bool
+        )''',
+
+        '''create table if not exists user_leaves (
+            user_id integer,
+            guild_id integer,
+            date blob
+        )''',
+    ]),
+
+    # SQLite can't add a primary key to an existing table, so these tables are rebuilt and the rows copied across.
+    # Duplicate players keep the first row, duplicate signups keep the most recent one. Rows that can't be copied
+    # (duplicates, or a missing key) are kept in <table>_migration_rejects instead of being lost.
+    (2, "primary keys, unique constraints and indexes", [
+        '''create table players_new (
+        minecraft_id text primary key not null,
+        discord_id integer unique not null,
+        minecraft_username text,
+        priority integer,
+        elo integer)''',
+        # The old rowids are carried over so the rows that were left out can be found
+        '''insert or ignore into players_new (rowid, minecraft_id, discord_id, minecraft_username, priority, elo)
+        select rowid, * from players order by rowid''',
+        '''create table players_migration_rejects as
+        select * from players where rowid not in (select rowid from players_new)''',
+        "drop table players",
+        "alter table players_new rename to players",
+        "create index players_minecraft_username on players (minecraft_username)",
+        "create index players_elo on players (elo)",
+
+        '''create table register_requests_new (
+        minecraft_id text,
+        discord_id integer,
+        minecraft_username text,
+        approval_embed_id integer primary key)''',
+        "insert or replace into register_requests_new select * from register_requests order by rowid",
+        '''create table register_requests_migration_rejects as
+        select * from register_requests r where approval_embed_id is not null
+        and rowid != (select max(rowid) from register_requests where approval_embed_id = r.approval_embed_id)''',
+        "drop table register_requests",
+        "alter table register_requests_new rename to register_requests",
+        "create index register_requests_discord_id on register_requests (discord_id)",
+
+        '''create table events_new (
+        event_id integer primary key,
+        title text,
+        description text,
+        time_est blob,
+        created_est blob,
+        creator integer,
+        guild_id integer,
+        announcement_channel integer,
+        signup_channel integer,
+        signup_message integer,
+        signup_role integer,
+        signup_deadline integer,
+        is_active bool,
+        is_signup_active bool)''',
+        "insert or ignore into events_new select * from events order by rowid",
+        '''create table events_migration_rejects as
+        select * from events e where event_id is not null
+        and rowid != (select min(rowid) from events where event_id = e.event_id)''',
+        "drop table events",
+        "alter table events_new rename to events",
+        "create index events_is_active on events (is_active)",
+
+        '''create table signups_new (
+        user_id integer not null,
+        event_id integer not null,
+        can_play bool,
+        is_muted bool,
+        can_sub bool,
+        primary key (user_id, event_id))''',
+        # "or replace" aborts on a null key instead of skipping the row, so those are filtered out first
+        '''insert or replace into signups_new (rowid, user_id, event_id, can_play, is_muted, can_sub)
+        select rowid, * from signups where user_id is not null and event_id is not null order by rowid''',
+        '''create table signups_migration_rejects as
+        select * from signups where rowid not in (select rowid from signups_new)''',
+        "drop table signups",
+        "alter table signups_new rename to signups",
+        "create index signups_event_id on signups (event_id)",
+
+        "create index strikes_user_id_is_active on strikes (user_id, is_active)",
+        "create index referrals_user_joined_id on referrals (user_joined_id)",
+        "create index referrals_inviter_id on referrals (inviter_id)",
+        "create index user_leaves_user_id_guild_id on user_leaves (user_id, guild_id)",
+    ]),
+
+    # Covers the strike scheduler's startup query, so it doesn't have to read every full strike row
+    (3, "strikes expiry index", [
+        "create index strikes_expiry_date on strikes (expiry_date, is_active)",
+    ]),
+
+    # The username Mojang last returned for each minecraft ID and when (unix time), so the username tracker only
+    # looks up players that haven't been checked recently
+    (4, "mojang names", [
+        '''create table mojang_names (
+        minecraft_id text primary key not null,
+        minecraft_username text,
+        checked_at real)''',
+        "create index mojang_names_checked_at on mojang_names (checked_at)",
+    ]),
+]
+
+
+def get_schema_version(connection):
+    connection.execute(
+        '''create table if not exists schema_version (
+        version integer primary key,
+        description text,
+        applied_at text)''')
+    return connection.execute("select max(version) from schema_version").fetchone()[0] or 0
+
+
+def get_rejects_tables(connection):
+    rows = connection.execute("select name from sqlite_master where type = 'table'")
+    return {name for name, in rows if name.endswith("_migration_rejects")}
+
+
+def report_rejects(connection, version, tables):
+    """Warns about the rows a migration couldn't copy, and drops the rejects tables that are empty"""
+    for table in sorted(tables):
+        count = connection.execute(f"select count(*) from {table}").fetchone()[0]
+        if count:
+            warning(f"[DATABASE] Migration {version} couldn't copy {count} rows, they were saved in {table}")
+        else:
+            connection.execute(f"drop table {table}")
+
+
+def migrate(connection):
+    current_version = get_schema_version(connection)
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        connection.execute("begin")
+        try:
+            rejects_tables = get_rejects_tables(connection)
+            for statement in statements:
+                connection.execute(statement)
+            report_rejects(connection, version, get_rejects_tables(connection) - rejects_tables)
+            connection.execute("insert into schema_version values (?, ?, ?)",
+                               (version, description, datetime.now().isoformat()))
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+        info(f"[DATABASE] Applied migration {version}: {description}")
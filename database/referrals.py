@@ -1,35 +1,62 @@
-from database.database import conn
+from database.database import conn, c, get_connection, fetch_where_in, MAX_QUERY_PARAMETERS
 from datetime import datetime
 from pytz import timezone
 from utils.config import *
 from logging import info
+from threading import Lock
 
-conn.execute(
-    '''
-    create table if not exists referrals (
-        referral_id integer primary key autoincrement,
-        code text,
-        user_joined_id integer,
-        inviter_id integer,
-        joined_at blob,
-        has_user_played bool,
-        reward_given bool
-    )
-    '''
-)
-
-conn.execute(
-    '''
-    create table if not exists user_leaves (
-        user_id integer,
-        guild_id integer,
-        date blob
-    )
-    '''
-)
+# has_played -> ([(inviter_id, referral count)] sorted by count, {inviter_id: position}). Worked out by
+# get_referral_standings and thrown away by every write that could change the counts. _standings_version makes sure a
+# result that was being worked out while a write happened isn't cached
+_referral_standings = {}
+_standings_version = 0
+_standings_lock = Lock()
+
+
+def invalidate_referral_standings():
+    global _standings_version
+    with _standings_lock:
+        _standings_version += 1
+        _referral_standings.clear()
+
+
+def load_referral_standings(has_played):
+    with _standings_lock:
+        cached = _referral_standings.get(has_played)
+        version = _standings_version
+    if cached is not None:
+        return cached
+    c.execute("SELECT inviter_id, COUNT(*) AS total FROM referrals WHERE has_user_played = ? "
+              "GROUP BY inviter_id ORDER BY total DESC, inviter_id", (int(has_played),))
+    standings = c.fetchall()
+    cached = standings, {inviter_id: position for position, (inviter_id, _) in enumerate(standings, start=1)}
+    with _standings_lock:
+        if version == _standings_version:
+            _referral_standings[has_played] = cached
+    return cached
+
+
+def get_referral_standings(has_played=False):
+    """
+    Returns [(inviter_id, referral count)], most referrals first. Like the referrals leaderboard, has_played picks
+    between referrals where the user has played and those where they haven't
+    """
+    return load_referral_standings(has_played)[0]
+
+
+def get_top_referrers(has_played=False, count=10, page=0):
+    """Returns (position, inviter_id, referral count) for page number `page` (starting from 0) of the standings"""
+    start = page * count
+    return [(position, inviter_id, total) for position, (inviter_id, total)
+            in enumerate(get_referral_standings(has_played)[start:start + count], start=start + 1)]
+
+
+def get_referrer_rank(inviter_id, has_played=False):
+    """Returns (position, referral count) of an inviter in the standings, or None if they have no referrals"""
+    standings, positions = load_referral_standings(has_played)
+    position = positions.get(inviter_id)
+    return (position, standings[position - 1][1]) if position else None
 
-conn.commit()
-c = conn.cursor()
 
 def log_referral(code, user_joined_id, inviter_id):
     if is_user_referred(user_joined_id):
@@ -55,11 +82,39 @@ def log_referral(code, user_joined_id, inviter_id):
         )
     )
     conn.commit()
+    invalidate_referral_standings()
     return True
 
 def update_referral(referral_id, column_name, value):
     c.execute(f"UPDATE referrals SET {column_name} = ? WHERE referral_id = ?", (value, referral_id))
     conn.commit()
+    invalidate_referral_standings()
+
+def mark_referrals_played(user_joined_ids):
+    """
+    Marks the unplayed referrals of the given users as played and returns those referrals. Doesn't commit, so it can
+    be part of a bigger transaction
+    """
+    user_joined_ids = list(user_joined_ids)
+    referrals = fetch_where_in("SELECT * FROM referrals WHERE has_user_played = 0 AND user_joined_id IN ({})",
+                               user_joined_ids)
+    for index in range(0, len(user_joined_ids), MAX_QUERY_PARAMETERS):
+        chunk = user_joined_ids[index:index + MAX_QUERY_PARAMETERS]
+        c.execute("UPDATE referrals SET has_user_played = 1 WHERE has_user_played = 0 AND user_joined_id IN ({})"
+                  .format(", ".join("?" * len(chunk))), chunk)
+    return referrals
+
+def close_signups_and_update_referrals(event_id, signed_user_ids):
+    """
+    Closes an event's signups and marks the referrals of everyone signed up as played, in one transaction.
+    Returns the referrals that were marked
+    """
+    with get_connection():
+        c.execute("UPDATE events SET is_signup_active = 0 WHERE event_id = ?", (event_id,))
+        referrals = mark_referrals_played(signed_user_ids) if signed_user_ids else []
+    if referrals:
+        invalidate_referral_standings()
+    return referrals
 
 def get_all_referrals():
     c.execute("SELECT * FROM referrals")
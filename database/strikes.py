@@ -1,21 +1,51 @@
-from database.database import conn
-
-conn.execute(
-    '''
-    create table if not exists strikes (
-        strike_id integer primary key autoincrement,
-        user_id integer,
-        striked_by integer,
-        striked_at blob,
-        expiry_date blob,
-        strike_reason text,
-        is_active bool
-    )
-    '''
-)
-
-conn.commit()
-c = conn.cursor()
+from collections import Counter
+from threading import RLock
+from database.database import conn, c
+
+# Called with the strike ID whenever a strike is added, removed or has its active status changed
+strike_listeners = []
+
+# User ID -> number of active strikes. Loaded on first use and kept up to date by the functions below, so checking
+# whether someone is striked doesn't need a query. Writes to the strikes table hold the lock until their count change
+# is applied, and a load holds it from the query to the swap, so a load never misses or double counts a change
+_active_strike_counts = None
+_active_strike_lock = RLock()
+
+
+def notify_strike_listeners(strike_id):
+    for listener in strike_listeners:
+        listener(strike_id)
+
+
+def load_active_strikes():
+    global _active_strike_counts
+    with _active_strike_lock:
+        c.execute("SELECT user_id, COUNT(*) FROM strikes WHERE is_active = 1 GROUP BY user_id")
+        _active_strike_counts = Counter(dict(c.fetchall()))
+
+
+def change_active_strike_count(user_id, amount):
+    with _active_strike_lock:
+        if _active_strike_counts is None:
+            return
+        _active_strike_counts[user_id] += amount
+        if _active_strike_counts[user_id] <= 0:
+            del _active_strike_counts[user_id]
+
+
+def is_striked(user_id):
+    if _active_strike_counts is None:
+        load_active_strikes()
+    return user_id in _active_strike_counts
+
+
+def partition_striked(signups):
+    """Splits signups into (striked signups, signups that aren't striked), keeping their order"""
+    striked, not_striked = [], []
+    for signup in signups:
+        (striked if is_striked(signup.user_id) else not_striked).append(signup)
+    return striked, not_striked
+
 
 def get_active_user_strikes(user_id):
     c.execute("SELECT * FROM strikes WHERE user_id = ? AND is_active = 1", (user_id,))
@@ -41,43 +71,63 @@ def get_all_inactive_strikes():
     c.execute("SELECT * FROM strikes WHERE is_active = 0")
     return c.fetchall()
 
+def get_strike_deadlines():
+    """Returns (strike_id, expiry_date, is_active) for every strike, from the strikes_expiry_date index"""
+    c.execute("SELECT strike_id, expiry_date, is_active FROM strikes ORDER BY expiry_date")
+    return c.fetchall()
+
 def get_strike(id):
     c.execute("SELECT * FROM strikes WHERE strike_id = ?", (id,))
     return c.fetchone()
 
 def change_active_status(id, status):
-    c.execute("UPDATE strikes SET is_active = ? WHERE strike_id = ?", (status, id))
-    conn.commit()
+    with _active_strike_lock:
+        strike = get_strike(id)
+        c.execute("UPDATE strikes SET is_active = ? WHERE strike_id = ?", (status, id))
+        conn.commit()
+        if strike and bool(strike[6]) != bool(status):
+            change_active_strike_count(strike[1], 1 if status else -1)
+    notify_strike_listeners(id)
 
 def add_strike(user_id, striked_by, striked_at, expiry_date, strike_reason):
-    c.execute(
-        '''
-        INSERT INTO strikes (
-            user_id,
-            striked_by,
-            striked_at,
-            expiry_date,
-            strike_reason,
-            is_active
-        ) 
-        VALUES (?,?,?,?,?,?)
-        ''',
-        (
-            user_id, striked_by, striked_at, expiry_date, strike_reason, True
-        )
-    )
-    conn.commit()
-    return True
-
-def remove_strike(strike_id):
-    if get_strike(strike_id):
+    with _active_strike_lock:
         c.execute(
             '''
-            DELETE FROM strikes WHERE strike_id = ?
+            INSERT INTO strikes (
+                user_id,
+                striked_by,
+                striked_at,
+                expiry_date,
+                strike_reason,
+                is_active
+            ) 
+            VALUES (?,?,?,?,?,?)
             ''',
-            (strike_id,)
+            (
+                user_id, striked_by, striked_at, expiry_date, strike_reason, True
+            )
         )
         conn.commit()
+        strike_id = c.lastrowid
+        change_active_strike_count(user_id, 1)
+    notify_strike_listeners(strike_id)
+    return True
+
+def remove_strike(strike_id):
+    with _active_strike_lock:
+        strike = get_strike(strike_id)
+        if strike:
+            c.execute(
+                '''
+                DELETE FROM strikes WHERE strike_id = ?
+                ''',
+                (strike_id,)
+            )
+            conn.commit()
+            if strike[6]:
+                change_active_strike_count(strike[1], -1)
+    if strike:
+        notify_strike_listeners(strike_id)
         return True
     else:
         return False
@@ -1,3 +1,6 @@
-from bot import bot, bot_token
+# Chart rendering uses spawned processes, which import the main module again - only load and start the bot in the
+# real one
+if __name__ == "__main__":
+    from bot import bot, bot_token
 
-bot.run(bot_token)
+    bot.run(bot_token)
@@ -0,0 +1,13 @@
+from os import chdir, path
+import sys
+
+"""
+The tests import the bot's modules the same way init.py does: from the repository root, where utils/config.py
+reads utils/app_credentials.json.
+"""
+
+ROOT_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+
+chdir(ROOT_DIRECTORY)
+if ROOT_DIRECTORY not in sys.path:
+    sys.path.insert(0, ROOT_DIRECTORY)
@@ -0,0 +1,47 @@
+from os import path
+from utils.CTFGame import CTFGame, parse_number
+
+"""
+Checks the stat table parser against a saved game page. The expected values are what the pandas.read_html version
+returned for the same page: thousands separators ignored, empty cells never counted and rows without any damage
+dealt left out.
+"""
+
+PAGES_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), "pages")
+
+
+def load_game():
+    with open(path.join(PAGES_DIRECTORY, "ctf_game.html")) as file:
+        return CTFGame(1, file.read())
+
+
+def test_parse_number():
+    assert parse_number("12,345") == 12345
+    assert parse_number("1.5") == 1.5
+    assert parse_number("") != parse_number("")  # NaN
+
+
+def test_page_details():
+    game = load_game()
+    assert game.map_name == "Mesa"
+    assert game.mvp == "Bob"
+
+
+def test_stats():
+    game = load_game()
+    assert game.get_stats("damage_dealt") == [("Bob", 12345)]
+    assert game.get_stats("damage_dealt", 2) == [("Bob", 12345), ("Alice", 4321), ("Erin", 4321)]
+    assert game.get_stats("playtime", 3) == [("Alice", 1512), ("Erin", 1505), ("Bob", 1498)]
+    assert game.get_stats("hp_restored", 2) == [("Carol", 2750), ("Alice", 1020)]
+    assert "Dave" not in [name for name, _ in game.get_stats("kills", 5)]
+
+
+def test_kit_stats():
+    game = load_game()
+    assert game.get_kit_stats("damage_dealt", "medic") == [("Alice", 1221)]
+    assert game.get_kit_stats("damage_dealt", "archer") == [("Erin", 4321)]
+    assert game.get_kit_stats("hp_restored", "archer", 2) == [("Erin", 310), ("Alice", 20)]
+
+
+def test_player_stats():
+    assert load_game().get_player_stats("damage_dealt", "Bob") == [("Bob", 12345)]
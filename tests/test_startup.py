@@ -0,0 +1,25 @@
+import pytest
+from utils.startup_profiler import get_eager_imports, measure_imports
+
+"""
+Checks that the heavy optional dependencies in LAZY_MODULES stay off the startup path. Each module is imported in a
+new interpreter, so modules other tests imported don't count.
+"""
+
+COMMAND_MODULES = ["commands.BaseCommands", "commands.RegistrationCommands", "commands.CTFCommands",
+                   "commands.EventCommands", "commands.HelpCommand", "commands.GameCommands",
+                   "commands.StrikeCommands", "commands.ReferralCommands"]
+
+
+@pytest.mark.parametrize("module", COMMAND_MODULES)
+def test_command_modules_import_lazily(module):
+    assert get_eager_imports(measure_imports(module)) == []
+
+
+def test_bot_imports_lazily():
+    # bot.py imports the webserver, which needs a quart that works with the installed jinja2
+    try:
+        import quart
+    except ImportError as e:
+        pytest.skip(f"quart can't be imported: {e}")
+    assert get_eager_imports(measure_imports("bot")) == []
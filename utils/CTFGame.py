@@ -1,7 +1,11 @@
-from requests import get
+from asyncio import gather, get_running_loop
+from html.parser import HTMLParser
+from math import nan
+from os import makedirs, replace
+from pickle import dump, load, UnpicklingError
 from re import search, split
-from pandas.io.html import read_html
-from pandas import DataFrame
+from utils.cache_util import TTLCache, SingleFlight, MISSING
+from utils.config import CTF_GAME_CACHE_DIRECTORY, CTF_GAME_CACHE_SIZE
 
 
 # Stat table column names:
@@ -13,34 +17,163 @@ from pandas import DataFrame
 # ARCHER | ASSASSIN | CHEMIST | DWARF | ELF | ENGINEER | HEAVY | MAGE | MEDIC | NECRO | NINJA | PYRO | SCOUT
 # SOLDIER | FASHIONISTA
 
+CTF_STATS_URL = 'https://www.brawl.com/MPS/MPSStatsCTF.php'
+# Bump when CTFGame's attributes change, so games pickled by an older version aren't loaded
+GAME_CACHE_VERSION = 3
+# Stat table columns that aren't used by anything, left out of the parsed rows
+DROPPED_COLUMNS = {'players_teleported', 'mobs_spawned', 'fire_axes'}
+# Columns kept as text, every other column is converted to a number
+TEXT_COLUMNS = {'name', 'kit_type', 'ip'}
 
-def get_server_games(server_ip):
-    ctf_html = get('https://www.brawl.com/MPS/MPSStatsCTF.php').text
-    table_loc = split('(<table width=\"100%\" border=\"1\">)|(</table>)', ctf_html)
-    games_html = table_loc[1] + table_loc[3] + table_loc[5]
-    games_table = read_html(games_html)[0]
-    games = games_table.loc[games_table['ip'] == server_ip]
-    return games['game_id'].to_list()
+
+class StatTablesParser(HTMLParser):
+    """
+    Collects the cells of every <table width="100%" border="1"> on a brawl.com stats page (the tables the stats are
+    in) as lists of rows of cell text. Only the cell text is kept, no document tree is built.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self.in_table = False
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            attrs = dict(attrs)
+            if attrs.get('width') == '100%' and attrs.get('border') == '1':
+                self.tables.append([])
+                self.in_table = True
+        elif not self.in_table:
+            return
+        elif tag == 'tr':
+            self.end_row()
+            self.row = []
+        elif tag in ('td', 'th'):
+            self.end_cell()
+            if self.row is not None:
+                self.cell = []
+
+    def handle_endtag(self, tag):
+        if not self.in_table:
+            return
+        if tag in ('td', 'th'):
+            self.end_cell()
+        elif tag == 'tr':
+            self.end_row()
+        elif tag == 'table':
+            self.end_row()
+            self.in_table = False
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def end_cell(self):
+        if self.cell is not None:
+            self.row.append(''.join(self.cell).strip())
+            self.cell = None
+
+    def end_row(self):
+        self.end_cell()
+        if self.row:
+            self.tables[-1].append(self.row)
+        self.row = None
+
+
+def parse_tables(html):
+    parser = StatTablesParser()
+    parser.feed(html)
+    parser.close()
+    return parser.tables
+
+
+def parse_number(text):
+    """
+    Converts a stat cell the way pandas.read_html did: thousands separators are ignored and an empty cell is NaN,
+    which compares false with everything so those rows are never among the largest
+    """
+    text = text.replace(',', '')
+    if not text:
+        return nan
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def to_rows(table):
+    """
+    Turns a parsed table into (column names, rows). The first row is the header, the rows are tuples with the numbers
+    converted and the dropped columns left out
+    """
+    if not table:
+        return (), []
+    header = table[0]
+    kept = [index for index, column in enumerate(header) if column not in DROPPED_COLUMNS]
+    converters = [str if header[index] in TEXT_COLUMNS else parse_number for index in kept]
+    rows = [tuple(convert(row[index]) for index, convert in zip(kept, converters))
+            for row in table[1:] if len(row) == len(header)]
+    return tuple(header[index] for index in kept), rows
+
+
+def largest(rows, index, n):
+    """
+    Returns the rows with the n largest values in the column at index, largest first, plus any rows tied with the
+    last of them (like pandas' nlargest with keep='all')
+    """
+    # NaN (an empty cell) is left out, like nlargest does
+    rows = [row for row in rows if row[index] == row[index]]
+    if n <= 0 or not rows:
+        return []
+    ranked = sorted(rows, key=lambda row: row[index], reverse=True)
+    cutoff = ranked[min(n, len(ranked)) - 1][index]
+    return ranked[:n] + [row for row in ranked[n:] if row[index] == cutoff]
+
+
+def parse_server_games(ctf_html, server_ips):
+    """Returns {server_ip: [game_id, ...]} for the games in the recent games table, oldest first"""
+    columns, rows = to_rows(parse_tables(ctf_html)[0])
+    game_id_index, ip_index = columns.index('game_id'), columns.index('ip')
+    return {server_ip: [row[game_id_index] for row in rows if row[ip_index] == server_ip] for server_ip in server_ips}
+
+
+async def fetch_text(session, url):
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.text()
+
+
+async def get_server_games(session, server_ips):
+    """Fetches the recent games table once and returns the game IDs played on each of the servers"""
+    ctf_html = await fetch_text(session, CTF_STATS_URL)
+    return await get_running_loop().run_in_executor(None, parse_server_games, ctf_html, server_ips)
 
 
 class CTFGame:
-    def __init__(self, game_id):
+    def __init__(self, game_id, game_html):
         self.game_id = game_id
-        self.stat_table = DataFrame()
-        self.kit_table = DataFrame()
+        self.columns = ()
+        self.stat_rows = []
+        self.kit_rows = []
         self.map_name = ''
         self.mvp = ''
 
-        game_html = get(f'https://www.brawl.com/MPS/MPSStatsCTF.php?game={self.game_id}').text
-        table_loc = split('(<table width=\"100%\" border=\"1\">)|(</table>)', game_html)
-        stat_table_html = table_loc[1] + table_loc[3] + table_loc[5]
-        kit_table_html = table_loc[7] + table_loc[9] + table_loc[11]
-        stat_table = read_html(stat_table_html)[0]
-        stat_table = stat_table.drop(['players_teleported', 'mobs_spawned', 'fire_axes'], axis=1)
-        self.stat_table = stat_table[stat_table['damage_dealt'] > 0]
-        kit_table = read_html(kit_table_html)[0].sort_values(by=['name', 'kit_type'])
-        kit_table = kit_table.drop(['players_teleported', 'mobs_spawned', 'fire_axes'], axis=1)
-        self.kit_table = kit_table[kit_table['damage_dealt'] > 0]
+        tables = parse_tables(game_html)
+        self.columns, stat_rows = to_rows(tables[0])
+        kit_columns, kit_rows = to_rows(tables[1])
+        if kit_columns and kit_columns != self.columns:
+            raise ValueError(f"Game {game_id} has different stat and kit table columns")
+        if self.columns:
+            damage_dealt = self.column('damage_dealt')
+            name, kit_type = self.column('name'), self.column('kit_type')
+            self.stat_rows = [row for row in stat_rows if row[damage_dealt] > 0]
+            self.kit_rows = sorted((row for row in kit_rows if row[damage_dealt] > 0),
+                                   key=lambda row: (row[name], row[kit_type]))
 
         map_loc = search('Map: [^<]*</h1>', game_html)
         if map_loc:
@@ -52,38 +185,85 @@ class CTFGame:
         if len(mvp_loc) > 3:
             self.mvp = mvp_loc[3]
 
+    def column(self, column_name):
+        try:
+            return self.columns.index(column_name)
+        except ValueError:
+            raise KeyError(column_name)
+
     def get_stats(self, stat_name, n=1):
-        if not self.stat_table.empty:
-            lower_stat_name = stat_name.lower()
-            stats = self.stat_table.nlargest(n, lower_stat_name, 'all')  # Get largest n stats
-            records = stats[['name', lower_stat_name]].to_records(index=False)  # Get IGN and stat from data frame
-            list_records = list(records)  # Convert dataframe to list of tuples
-            ret_val = []
-            for player in list_records:
-                ret_val.append((player[0], player[1]))
-            return ret_val
+        if self.stat_rows:
+            name, stat = self.column('name'), self.column(stat_name.lower())
+            return [(row[name], row[stat]) for row in largest(self.stat_rows, stat, n)]
         else:
             return []
 
     def get_kit_stats(self, stat_name, kit_name, n=1):
-        if not self.kit_table.empty:
-            lower_stat_name = stat_name.lower()
-            upper_kit_name = kit_name.upper()
-            kit_stats = self.kit_table.loc[self.kit_table['kit_type'] == upper_kit_name]  # Get kit_name stats
-            stats = kit_stats.nlargest(n, lower_stat_name, 'all')  # Get largest n stats
-            records = stats[['name', lower_stat_name]].to_records(index=False)  # Get IGN and stat from data frame
-            list_records = list(records)  # Convert dataframe to list of tuples
-            ret_val = []
-            for player in list_records:
-                ret_val.append((player[0], player[1]))
-            return ret_val
+        if self.kit_rows:
+            name, stat, kit_type = self.column('name'), self.column(stat_name.lower()), self.column('kit_type')
+            kit_rows = [row for row in self.kit_rows if row[kit_type] == kit_name.upper()]
+            return [(row[name], row[stat]) for row in largest(kit_rows, stat, n)]
         else:
             return []
 
     def get_player_stats(self, stat_name, player_name):
-        if not self.kit_table.empty:
-            lower_stat_name = stat_name.lower()
-            return self.stat_table.loc[self.stat_table['name'] == player_name, ['name', lower_stat_name]].to_records(
-                index=False)
+        if self.kit_rows:
+            name, stat = self.column('name'), self.column(stat_name.lower())
+            return [(row[name], row[stat]) for row in self.stat_rows if row[name] == player_name]
         else:
             return []
+
+
+class GameCache:
+    """
+    Parsed games by game ID, pickled to disk with the most recently used ones also kept in memory. The stats page
+    only lists finished games, whose stats never change, so entries never expire and each game is only downloaded
+    and parsed once.
+    """
+
+    def __init__(self, directory=CTF_GAME_CACHE_DIRECTORY):
+        self.directory = directory
+        self.games = TTLCache(CTF_GAME_CACHE_SIZE, float("inf"))
+        self.single_flight = SingleFlight()
+
+    def get_filename(self, game_id):
+        return f"{self.directory}/{game_id}.v{GAME_CACHE_VERSION}.pickle"
+
+    def load(self, game_id):
+        """Returns the game from disk, or None if it hasn't been saved"""
+        try:
+            with open(self.get_filename(game_id), "rb") as file:
+                return load(file)
+        except (OSError, EOFError, UnpicklingError):
+            return None
+
+    def save(self, game):
+        makedirs(self.directory, exist_ok=True)
+        filename = self.get_filename(game.game_id)
+        # Written to a temporary file first so a half written pickle is never loaded
+        with open(f"{filename}.tmp", "wb") as file:
+            dump(game, file)
+        replace(f"{filename}.tmp", filename)
+
+    async def get_game(self, session, game_id):
+        game = self.games.get(game_id)
+        if game is not MISSING:
+            return game
+        return await self.single_flight.do(game_id, lambda: self.fetch_game(session, game_id))
+
+    async def fetch_game(self, session, game_id):
+        loop = get_running_loop()
+        game = await loop.run_in_executor(None, self.load, game_id)
+        if not game:
+            game_html = await fetch_text(session, f"{CTF_STATS_URL}?game={game_id}")
+            game = await loop.run_in_executor(None, CTFGame, game_id, game_html)
+            await loop.run_in_executor(None, self.save, game)
+        self.games.set(game_id, game)
+        return game
+
+    async def get_games(self, session, game_ids):
+        """Returns the games in the same order as game_ids, downloading the ones that aren't cached concurrently"""
+        return await gather(*(self.get_game(session, game_id) for game_id in game_ids))
+
+
+game_cache = GameCache()
@@ -0,0 +1,69 @@
+from asyncio import get_running_loop, shield
+from collections import OrderedDict
+from time import monotonic
+
+"""
+Small caching helpers for results fetched from other services.
+"""
+
+# Returned by TTLCache.get when there's no fresh entry, since None is a valid cached value (a negative result)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    A least recently used cache whose entries also expire. None values are negative results ("doesn't exist") and
+    can be given a shorter lifetime than positive ones, so something that gets created is noticed sooner.
+    """
+
+    def __init__(self, max_size, ttl, negative_ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.entries = OrderedDict()  # Key -> (expiry time, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the cached value, or MISSING if there isn't one or it has expired"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self.entries[key] = (monotonic() + (self.ttl if value is not None else self.negative_ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class SingleFlight:
+    """Lets concurrent calls for the same key share one request instead of each making their own"""
+
+    def __init__(self):
+        self.in_flight = {}  # Key -> future of the request being made for it
+
+    async def do(self, key, fetch):
+        """Returns `await fetch()`, or the result of the fetch already running for key"""
+        future = self.in_flight.get(key)
+        if future is None:
+            future = get_running_loop().create_task(fetch())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shielded so one caller being cancelled doesn't cancel the request for everyone else waiting on it
+        return await shield(future)
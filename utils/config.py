@@ -12,16 +12,33 @@ PROSPECT_ROLE = "Prospect"
 BOT_OUTPUT_CHANNEL = 816004363544690738
 PUBLIC_BOT_CHANNEL = 816004363544690738
 IGN_TRACKER_INTERVAL_HOURS = 12
-SIGNUPS_TRACKER_INTERVAL_SECONDS = 10
+MOJANG_CONCURRENCY = 4  # Most Mojang API requests in flight at once
+MOJANG_REQUESTS_PER_SECOND = 5
+MOJANG_RETRIES = 3  # Retries for rate limited (429) / failed requests, with exponential backoff
+MOJANG_BACKOFF_SECONDS = 2  # Wait before the first retry, doubled for each one after it
+MOJANG_BATCH_SIZE = 50  # Usernames the tracker looks up concurrently before starting the next batch
+MOJANG_CACHE_SIZE = 1024  # Most name / UUID lookups kept in memory
+MOJANG_CACHE_TTL_SECONDS = 600
+MOJANG_NEGATIVE_CACHE_TTL_SECONDS = 60  # "Doesn't exist" results expire sooner, the name may get taken
+SCHEDULER_RETRY_SECONDS = 60  # When a scheduled strike / event update fails, how long until it is tried again
+SIGNUPS_DEBOUNCE_SECONDS = 2  # How long to wait for more reactions before updating an event's signups
 SLASH_COMMANDS_GUILDS = [753663184228974643]
 REGISTER_REQUESTS_CHANNEL = 816389979160313867
 FORUM_THREADS_INTERVAL_HOURS = 6
+STATS_CACHE_SIZE = 512  # Most players whose stats API lookups are kept in memory
+STATS_CACHE_TTL_SECONDS = 600
+STATS_PLAYER_ID_TTL_SECONDS = 3600
+STATS_LOAD_POLL_SECONDS = 1  # First wait while the stats API loads a new player, doubled each poll
+STATS_LOAD_TIMEOUT_SECONDS = 30
+SCHEDULE_REFRESH_MINUTES = 5  # How often /ss's copy of the match schedule spreadsheet is reloaded
+SCHEDULE_ROLLOVER_ON_SS = True  # Let /ss move the sheet's dates forward (clearing its slots) once today drops off it
 SIGNED_ROLE_NAME = "Signed"
 SPECTATOR_ROLE_NAME = "Spectator"
 GENERAL_CHAT = 753663185093132309
 TIMEZONE = "US/Eastern"
 PUG_INVITE_LINK = "https://discord.gg/Gqpv5yUhAd"
 TEAMS_ROLES = ["Team 1 [Red]", "Team 2 [Blue]"]
+ROLE_CHANGE_CONCURRENCY = 5  # Role changes made at the same time by /setroles, /removeroles etc.
 PPM_ROLES = ["Red Team", "Blue Team", "Green Team", "Yellow Team", "Signed", "Spectator"]
 STRIKE_REASONS = [
     "Late",
@@ -44,6 +61,7 @@ UPDATE_NICKNAMES = True
 PRIORITY_DEFAULT = True
 SIGNUP_DEADLINE_DEFAULT = 30
 SEND_JOIN_MESSAGE = True
+INVITE_REFETCH_DEBOUNCE_SECONDS = 1  # Joins within this long of each other share one fetch of the guild's invites
 
 WEB_SERVER_HOSTNAME = "localhost"
 WEB_SERVER_PORT = 8080
@@ -51,6 +69,19 @@ WEB_URL = "http://localhost:8080"
 
 BOT_OWNER_ID = 175964671520669696
 
+STARTUP_IMPORT_BUDGET_SECONDS = 0.3  # About 1.7x the 174ms measured, checked by `python -m utils.startup_profiler`
+
+DATABASE_PATH = "database/database.db"
+DATABASE_READ_CONNECTIONS = 4
+BACKUP_DIRECTORY = "backups"
+BACKUP_INTERVAL_HOURS = 24
+BACKUP_RETENTION_COUNT = 14  # Number of automatic backups to keep, manual backups are never pruned
+BACKUP_PAGES_PER_STEP = 256
+CTF_GAME_CACHE_DIRECTORY = "cache/ctf_games"
+CTF_GAME_CACHE_SIZE = 500  # Most parsed games kept in memory, older ones are loaded from disk again when needed
+CHART_RENDER_PROCESSES = 2
+CHART_CACHE_MAX_BYTES = 8 * 1024 * 1024  # Total size of the rendered chart PNGs kept in memory
+
 
 debug = False
 
@@ -8,8 +8,9 @@ from utils.config import TIMEZONE, WEB_URL
 import os
 
 
-from database.Player import Player, PlayerDoesNotExistError
+from database.Player import Player
 from database.Signup import Signup
+from database.database import apply_signup_changes
 from utils.utils import error_embed
 from random import shuffle, seed
 from dateutil import parser
@@ -21,7 +22,8 @@ def generate_signups_embed(bot, signups, event):
     embed = Embed(title=f"Signups - {event.title}", colour=Colour.dark_purple())
     playing_signups = []
     sub_signups = []
-    unregistered_signups = [signup for signup in signups if not Player.exists_discord_id(signup.user_id)]
+    players = Player.from_discord_ids(signup.user_id for signup in signups)
+    unregistered_signups = [signup for signup in signups if signup.user_id not in players]
     for signup in signups:
         if signup.can_play:
             playing_signups.append(signup)
@@ -32,7 +34,7 @@ def generate_signups_embed(bot, signups, event):
     if len(playing_signups) > 0:
         for signup in playing_signups:
             user = bot.get_user(signup.user_id)
-            player = Player.exists_discord_id(signup.user_id)
+            player = players.get(signup.user_id)
             signups_tag_str += f"@{user} ({player.minecraft_username if player else 'Unregistered'})\n"
     else:
         signups_tag_str = "Nobody :("
@@ -135,10 +137,11 @@ def priority_rng_signups(playing_signups_list, size):
     seed()
     players = []
     unregistered_signups = []
+    registered_players = Player.from_discord_ids(signup.user_id for signup in playing_signups_list)
     for signup in playing_signups_list:
-        try:
-            players.append(Player.from_discord_id(signup.user_id))
-        except PlayerDoesNotExistError:
+        if signup.user_id in registered_players:
+            players.append(registered_players[signup.user_id])
+        else:
             unregistered_signups.append(signup)
     shuffle(players)
     players = sorted(players, key=lambda item: item.priority, reverse=True)
@@ -161,12 +164,18 @@ async def check_if_cancel(ctx, response):
 
 
 def save_signups(db_signups, signups):
-    [signup.update_db() for signup in signups]
-    # [signup.delete() for signup in db_signups if signup not in signups]
-    for signup in db_signups:
-        if signup not in signups:
-            signup.delete()
-            info(f"Deleting signup {signup.user_id} from event {signup.event_id}")
+    """
+    Saves the new signups for an event, given the signups currently stored in the database.
+    Only signups that were added, changed or removed are written, all in one transaction.
+    """
+    old_rows = {(signup.user_id, signup.event_id): signup.to_row() for signup in db_signups}
+    new_rows = {(signup.user_id, signup.event_id): signup.to_row() for signup in signups}
+    upserts = [row for key, row in new_rows.items() if old_rows.get(key) != row]
+    deletes = [key for key in old_rows if key not in new_rows]
+    if upserts or deletes:
+        apply_signup_changes(upserts, deletes)
+    for user_id, event_id in deletes:
+        info(f"Deleting signup {user_id} from event {event_id}")
 
 
 def reaction_changes(signups, can_play, is_muted, can_sub, event_id):
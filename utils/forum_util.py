@@ -0,0 +1,110 @@
+from hashlib import sha1
+from re import split
+
+"""
+Reads the team threads from the brawl.com forums and works out how the rosters changed.
+"""
+
+FORUM_TEAMS_URL = 'https://www.brawl.com/forums/299/'
+
+
+def has_class(class_name):
+    """XPath condition for an element having class_name among its classes"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+def parse_team_threads(html):
+    """Returns {team title: {"link", "members", "author", "image"}} for the threads on the teams forum page"""
+    from lxml.html import fromstring  # Only loaded once the forum is first read
+    page = fromstring(html)
+    teams_threads = {}
+    for thread in page.xpath(f"//ol[{has_class('discussionListItems')}]//li"):
+        team_titles = thread.xpath(f".//div[{has_class('titleText')}]")
+        if not team_titles:
+            continue
+        info = team_titles[0].xpath(f".//a[{has_class('PreviewTooltip')}]")[0]
+        author = team_titles[0].xpath(f".//a[{has_class('username')}]")[0]
+        image_source = thread.xpath(".//img/@src")[0]
+        if "cravatar" in image_source:
+            author_avatar = f"https:{image_source}"
+        else:
+            author_avatar = f"https://www.brawl.com/{image_source}"
+        title = info.text_content()
+        team_title = split(r"((\[|\()\d{1,3}/\d{1,3}(\]|\))?)", title, 1)
+        team_size = split(r"(\d{1,3}/\d{1,3})", title, 1)
+        teams_threads[team_title[0].rstrip()] = {
+            "link": f"https://www.brawl.com/{info.get('href')}",
+            # Not all teams have their member count in the title
+            "members": team_size[1] if len(team_size) > 1 else "NaN",
+            "author": author.text_content(),
+            "image": author_avatar
+        }
+    return teams_threads
+
+
+def diff_rosters(old_threads, new_threads):
+    """
+    Returns a line for every team that disbanded, became official, was renamed or changed size. Threads are matched by
+    their link, so a team that renames its thread isn't reported as disbanding and becoming official.
+    """
+    old_links = {thread["link"]: title for title, thread in old_threads.items()}
+    new_links = {thread["link"]: title for title, thread in new_threads.items()}
+    changes = []
+    for link, title in old_links.items():
+        if link not in new_links:
+            changes.append(f"🔴 **{title}** has disbanded.")
+    for link, title in new_links.items():
+        if link not in old_links:
+            changes.append(f"🟢 **{title}** is now official.")
+            continue
+        old_title = old_links[link]
+        if title != old_title:
+            changes.append(f"✏️ **{old_title}** is now called **{title}**.")
+        old_members, new_members = old_threads[old_title]["members"], new_threads[title]["members"]
+        if old_members == new_members:
+            continue
+        try:
+            difference = int(new_members.split("/")[0]) - int(old_members.split("/")[0])
+        except ValueError:
+            changes.append(f"⚪ **{title}:** {old_members} -> {new_members}")
+            continue
+        if difference > 0:
+            changes.append(f"🟢 **{title}:** {old_members} -> {new_members} (**+{difference}**)")
+        elif difference < 0:
+            changes.append(f"🔴 **{title}:** {old_members} -> {new_members} (**{difference}**)")
+    return changes
+
+
+class ConditionalPage:
+    """
+    Fetches a page with If-None-Match / If-Modified-Since, and remembers a hash of the body for servers that don't
+    support them. fetch() returns None whenever the page is the same as the last one committed, otherwise
+    (body, validators). The validators are only remembered once they're passed to commit(), so a page that couldn't
+    be handled is fetched and handled again next time.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+
+    async def fetch(self, session):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        async with session.get(self.url, headers=headers) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            body = await response.read()
+            etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        digest = sha1(body).digest()
+        if digest == self.digest:
+            return None
+        return body, (etag, last_modified, digest)
+
+    def commit(self, validators):
+        self.etag, self.last_modified, self.digest = validators
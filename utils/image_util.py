@@ -1,10 +1,10 @@
 from pathlib import Path
-from PIL import Image
 
 
 # https://github.com/carzam87/python-bulk-image-optimizer/blob/master/bulk-image-optimizer.py
-def compress(location: str, quality: int = 30) -> Image:
+def compress(location: str, quality: int = 30) -> "Image":
     """Compress an image on the disk"""
+    from PIL import Image  # Only loaded when an image is first compressed
     opt = Image.open(location) # dont handle error
     # Convert .pgn to .jpg
     if opt.format.lower() == "png":
@@ -0,0 +1,118 @@
+from asyncio import sleep, get_running_loop
+from logging import info
+from utils.config import INVITE_REFETCH_DEBOUNCE_SECONDS
+
+"""
+Works out which invite a member joined with.
+
+Discord doesn't say which invite was used, so the invite uses are compared before and after the join. Joins that
+arrive close together share one fetch of the guild's invites, and the invites are otherwise kept up to date from the
+invite create / delete events rather than fetched again.
+"""
+
+# How many more fetches a join waits for if its invite use didn't show up in the first one
+JOIN_RETRIES = 1
+
+
+class InviteTracker:
+    def __init__(self):
+        self.invites = {}  # Guild ID -> {code: Invite}
+        # Guild ID -> {code: Invite} deleted since the last fetch. An invite that reaches its max uses is deleted,
+        # usually before the fetch for the join that used it up, so they're kept until that fetch has compared them
+        self.deleted_invites = {}
+        self.pending_joins = {}  # Guild ID -> [(member, future, retries left)]
+        self.refetch_tasks = {}  # Guild ID -> task that will fetch the invites for the pending joins
+
+    async def load(self, guild):
+        self.invites[guild.id] = {invite.code: invite for invite in await guild.invites()}
+        self.deleted_invites.pop(guild.id, None)
+
+    def add_invite(self, invite):
+        # A guild that hasn't been loaded yet gets all its invites, this one included, when it is
+        if invite.guild.id in self.invites:
+            self.invites[invite.guild.id][invite.code] = invite
+
+    def remove_invite(self, invite):
+        removed = self.invites.get(invite.guild.id, {}).pop(invite.code, None)
+        if removed:
+            self.deleted_invites.setdefault(invite.guild.id, {})[invite.code] = removed
+
+    async def find_invite(self, member):
+        """Returns the invite the member joined with, or None if it couldn't be worked out"""
+        future = get_running_loop().create_future()
+        self.queue_join(member.guild, member, future, JOIN_RETRIES)
+        return await future
+
+    def queue_join(self, guild, member, future, retries):
+        self.pending_joins.setdefault(guild.id, []).append((member, future, retries))
+        if guild.id not in self.refetch_tasks:
+            task = get_running_loop().create_task(self.refetch(guild))
+            task.add_done_callback(lambda _: self.abandon_joins(guild, task))
+            self.refetch_tasks[guild.id] = task
+
+    def abandon_joins(self, guild, task):
+        """Answers None to the joins a fetch left waiting because it was cancelled or failed before taking them"""
+        if self.refetch_tasks.get(guild.id) is task:
+            del self.refetch_tasks[guild.id]
+            for member, future, retries in self.pending_joins.pop(guild.id, []):
+                if not future.done():
+                    future.set_result(None)
+
+    async def refetch(self, guild):
+        joins, retry_joins = [], []
+        try:
+            await sleep(INVITE_REFETCH_DEBOUNCE_SECONDS)
+            try:
+                invites = {invite.code: invite for invite in await guild.invites()}
+            except Exception as e:
+                # Not just HTTPException, connection errors and timeouts end up here too
+                info(f"[REFERRALS] Could not fetch invites for {guild}: {e!r}")
+                invites = None
+            # Taken out before the invites are handed out, so a join that needs another try starts a new fetch
+            del self.refetch_tasks[guild.id]
+            joins = self.pending_joins.pop(guild.id, [])
+            if invites is not None:
+                retry_joins = self.hand_out_invites(guild, invites, joins)
+        finally:
+            # Whatever went wrong, every join that was taken gets an answer rather than waiting forever
+            for join in joins:
+                if not join[1].done() and join not in retry_joins:
+                    join[1].set_result(None)
+        for member, future, retries in retry_joins:
+            self.queue_join(guild, member, future, retries - 1)
+
+    def hand_out_invites(self, guild, invites, joins):
+        """Gives each join the invite it used, and returns the joins whose use didn't show up and have retries left"""
+        if guild.id not in self.invites:
+            # Nothing to compare against, so every existing use would look new. These invites are the baseline
+            info(f"[REFERRALS] Invites for {guild} weren't loaded yet, can't tell which invites {len(joins)} joins used")
+            self.invites[guild.id] = invites
+            self.deleted_invites.pop(guild.id, None)
+            for member, future, retries in joins:
+                future.set_result(None)
+            return []
+        before = {**self.invites[guild.id], **self.deleted_invites.pop(guild.id, {})}
+        self.invites[guild.id] = invites
+        used = []
+        for code, invite in invites.items():
+            if code in before:
+                used += [invite] * max(invite.uses - before[code].uses, 0)
+            elif invite.uses <= len(joins):
+                # An invite missed while disconnected. Its uses can only be this batch's if there aren't more of them
+                # than joins, otherwise some of them are older and it can't be told which
+                used += [invite] * invite.uses
+        for code, invite in before.items():
+            # Invites are deleted when they reach their max uses
+            if code not in invites and invite.max_uses and invite.uses + 1 >= invite.max_uses:
+                used.append(invite)
+
+        # When several members joined at once the uses can't be told apart, so they're handed out in join order
+        retry_joins = []
+        for index, (member, future, retries) in enumerate(joins):
+            if index < len(used):
+                future.set_result(used[index])
+            elif retries:
+                retry_joins.append((member, future, retries))
+            else:
+                future.set_result(None)
+        return retry_joins
@@ -0,0 +1,99 @@
+from asyncio import Lock, Semaphore, sleep, TimeoutError
+from time import monotonic
+from aiohttp import ClientSession, ClientError, ClientTimeout
+from logging import info
+from utils.cache_util import TTLCache, SingleFlight, MISSING
+from utils.config import MOJANG_CONCURRENCY, MOJANG_REQUESTS_PER_SECOND, MOJANG_RETRIES, MOJANG_BACKOFF_SECONDS, \
+    MOJANG_CACHE_SIZE, MOJANG_CACHE_TTL_SECONDS, MOJANG_NEGATIVE_CACHE_TTL_SECONDS
+
+"""
+Awaitable Mojang API lookups, so checking names never blocks the event loop.
+
+Requests are spaced out to MOJANG_REQUESTS_PER_SECOND with at most MOJANG_CONCURRENCY in flight. Rate limited (429)
+and server error responses are retried with exponential backoff.
+
+Results (including "doesn't exist") are cached for a while, and lookups of the same name / UUID that overlap share
+one request, so a burst of /register commands for one name only reaches Mojang once.
+"""
+
+MOJANG_PROFILE_URL = "https://sessionserver.mojang.com/session/minecraft/profile/{}"
+MOJANG_UUID_URL = "https://api.mojang.com/users/profiles/minecraft/{}"
+
+
+class MojangUnavailableError(Exception):
+    """Exception raised when the Mojang API couldn't be reached, as opposed to the name / UUID not existing"""
+
+    def __init__(self, message="Could not reach the Mojang API"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class MojangResolver:
+    def __init__(self):
+        self.session = None
+        self.semaphore = Semaphore(MOJANG_CONCURRENCY)
+        self.governor_lock = Lock()
+        self.next_request_time = 0
+        self.cache = TTLCache(MOJANG_CACHE_SIZE, MOJANG_CACHE_TTL_SECONDS, MOJANG_NEGATIVE_CACHE_TTL_SECONDS)
+        self.single_flight = SingleFlight()
+
+    async def wait_for_turn(self):
+        """Spaces requests out so they never go faster than MOJANG_REQUESTS_PER_SECOND"""
+        async with self.governor_lock:
+            now = monotonic()
+            delay = self.next_request_time - now
+            self.next_request_time = max(now, self.next_request_time) + 1 / MOJANG_REQUESTS_PER_SECOND
+        if delay > 0:
+            await sleep(delay)
+
+    async def request_json(self, url):
+        """Returns the JSON response, or None if Mojang says there's nothing there"""
+        if not self.session or self.session.closed:
+            self.session = ClientSession(timeout=ClientTimeout(total=10))
+        for attempt in range(MOJANG_RETRIES + 1):
+            if attempt:
+                await sleep(MOJANG_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            await self.wait_for_turn()
+            async with self.semaphore:
+                try:
+                    async with self.session.get(url) as response:
+                        if response.status == 200:
+                            return await response.json()
+                        elif response.status in (204, 400, 404):
+                            return None
+                        info(f"[MOJANG] {url} returned {response.status} (attempt {attempt + 1})")
+                except (ClientError, TimeoutError) as e:
+                    info(f"[MOJANG] {url} failed: {e!r} (attempt {attempt + 1})")
+        raise MojangUnavailableError()
+
+    async def lookup(self, key, url, field):
+        """Returns field of the JSON at url, cached under key. Failed requests aren't cached"""
+        value = self.cache.get(key)
+        if value is not MISSING:
+            return value
+
+        async def fetch():
+            data = await self.request_json(url)
+            result = data[field] if data else None
+            self.cache.set(key, result)
+            return result
+
+        return await self.single_flight.do(key, fetch)
+
+    async def get_username(self, minecraft_id):
+        """Returns the current username of a UUID, or None if the UUID doesn't exist"""
+        return await self.lookup(("username", minecraft_id), MOJANG_PROFILE_URL.format(minecraft_id), "name")
+
+    async def get_uuid(self, minecraft_username):
+        """Returns the UUID of a username, or None if nobody has that username"""
+        # Usernames aren't case sensitive
+        key = ("uuid", minecraft_username.lower())
+        return await self.lookup(key, MOJANG_UUID_URL.format(minecraft_username), "id")
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+mojang = MojangResolver()
@@ -1,25 +1,102 @@
-import matplotlib.pyplot as plt
+from asyncio import get_running_loop
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
 from io import BytesIO
+from json import dumps
+from multiprocessing import get_context
 from discord import File
+from utils.cache_util import SingleFlight
+from utils.config import CHART_RENDER_PROCESSES, CHART_CACHE_MAX_BYTES
 
-plt.style.use('dark_background')
+"""
+Renders charts in a separate process pool, so matplotlib never holds up the event loop.
+
+The rendered PNGs are cached by a hash of everything that goes into the chart, so the same chart is only drawn once.
+"""
+
+
+def init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
 
 
 def my_autopct(pct):
     return ('%.2f' % pct) if pct > 10 else ''
 
 
-def pie_chart(labels, sizes, explode, title):
+def render_pie_chart(labels, sizes, explode, title):
+    """Runs in a chart process, returns the PNG bytes"""
+    import matplotlib.pyplot as plt
     data_stream = BytesIO()
-    # Pie chart, where the slices will be ordered and plotted counter-clockwise:
-    fig1, ax1 = plt.subplots()
-    plt.rcParams['font.size'] = 18
-    ax1.pie(sizes, labels=labels, startangle=90)
-    ax1.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-    plt.suptitle(title)
-    plt.savefig(data_stream, format='png', bbox_inches="tight", dpi=65, transparent=True)
-    plt.close()
-    return data_stream
+    with plt.style.context('dark_background'), plt.rc_context({'font.size': 18}):
+        # Pie chart, where the slices will be ordered and plotted counter-clockwise:
+        fig1, ax1 = plt.subplots()
+        ax1.pie(sizes, labels=labels, startangle=90)
+        ax1.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+        fig1.suptitle(title)
+        fig1.savefig(data_stream, format='png', bbox_inches="tight", dpi=65, transparent=True)
+        plt.close(fig1)
+    return data_stream.getvalue()
+
+
+class ChartRenderer:
+    """
+    Renders charts in a pool of spawned processes using the Agg backend, and keeps the most recently used PNGs up to
+    CHART_CACHE_MAX_BYTES in total
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.cache = OrderedDict()  # Hash of the chart inputs -> PNG bytes, least recently used first
+        self.cache_size = 0
+        self.single_flight = SingleFlight()
+
+    def get_executor(self):
+        if not self.executor:
+            self.executor = ProcessPoolExecutor(max_workers=CHART_RENDER_PROCESSES, mp_context=get_context("spawn"),
+                                                initializer=init_worker)
+        return self.executor
+
+    def cache_png(self, key, png):
+        self.cache[key] = png
+        self.cache_size += len(png)
+        while self.cache_size > CHART_CACHE_MAX_BYTES and len(self.cache) > 1:
+            self.cache_size -= len(self.cache.popitem(last=False)[1])
+
+    async def render(self, function, *args):
+        """Returns the PNG bytes of function(*args), rendering it in the pool unless it's cached"""
+        # default=str covers numpy numbers and the like, which json can't encode
+        key = sha256(dumps([function.__name__, args], default=str).encode()).hexdigest()
+        png = self.cache.get(key)
+        if png:
+            self.cache.move_to_end(key)
+            return png
+
+        async def render_png():
+            try:
+                png = await get_running_loop().run_in_executor(self.get_executor(), function, *args)
+            except BrokenProcessPool:
+                # A chart process died, start a new pool and try once more
+                self.close()
+                png = await get_running_loop().run_in_executor(self.get_executor(), function, *args)
+            self.cache_png(key, png)
+            return png
+
+        return await self.single_flight.do(key, render_png)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+chart_renderer = ChartRenderer()
+
+
+async def pie_chart(labels, sizes, explode, title):
+    return BytesIO(await chart_renderer.render(render_pie_chart, list(labels), list(sizes), list(explode), title))
 
 
 def file_from_data_stream(data_stream):
@@ -0,0 +1,64 @@
+from asyncio import gather, Lock, Semaphore
+from discord.errors import HTTPException
+from logging import info, warning
+from utils.config import ROLE_CHANGE_CONCURRENCY
+
+"""
+Applies many role changes at once.
+
+Role changes all share discord's per-guild rate limit bucket, which discord.py already waits on, so running a few at a
+time keeps the bucket busy without piling up requests that would just sit behind its lock.
+"""
+
+
+async def apply_role_changes(changes, progress=None, reason=None):
+    """
+    Applies (member, role, add) changes, where add is True to give the role and False to take it away. Changes that
+    wouldn't do anything (the member already has / doesn't have the role) are skipped without a request.
+
+    progress(done, total) is awaited as changes complete. Updates are skipped while the previous one is still being
+    sent, but the final one always is. Returns the list of changes that failed.
+    """
+    pending = {}
+    for member, role, add in changes:
+        if (role in member.roles) != add:
+            pending[(member.id, role.id)] = (member, role, add)
+    total = len(pending)
+    done = 0
+    failed = []
+    semaphore = Semaphore(ROLE_CHANGE_CONCURRENCY)
+    progress_lock = Lock()
+
+    async def apply(member, role, add):
+        nonlocal done
+        async with semaphore:
+            try:
+                if add:
+                    await member.add_roles(role, reason=reason)
+                else:
+                    await member.remove_roles(role, reason=reason)
+                info(f"{'Added' if add else 'Removed'} role {role.name} {'to' if add else 'from'} {member}")
+            except HTTPException as e:
+                info(f"Failed to {'add' if add else 'remove'} role {role.name} for {member}: {e}")
+                failed.append((member, role, add))
+        done += 1
+        if progress and not progress_lock.locked() and done < total:
+            async with progress_lock:
+                await progress(done, total)
+
+    await gather(*(apply(*change) for change in pending.values()))
+    if progress and total:
+        async with progress_lock:
+            await progress(total, total)
+    return failed
+
+
+def format_failed_role_changes(failed):
+    """Returns a line for every (member, role, add) change that failed"""
+    return [f"{member.mention} {'+' if add else '-'}{role.mention}" for member, role, add in failed]
+
+
+def log_failed_role_changes(failed, context):
+    if failed:
+        warning(f"{context}: {len(failed)} role changes failed: " +
+                ", ".join(f"{'add' if add else 'remove'} {role.name} for {member}" for member, role, add in failed))
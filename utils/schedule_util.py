@@ -0,0 +1,239 @@
+import os
+import logging
+from asyncio import get_running_loop
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import groupby
+from threading import Lock
+from dateutil import parser
+from dateutil.tz import gettz
+from utils.cache_util import SingleFlight
+from utils.config import TIMEZONE
+
+"""
+Keeps a parsed copy of the match schedule spreadsheet, so /ss doesn't have to download and parse it every time.
+"""
+
+SCHEDULE_SPREADSHEET_KEY = "1CrQOxzaXC6iSjwZwQvu6DNIYsCDg-uQ4x5UiaWLHzxg"
+SCHEDULE_WORKSHEETS = {"1": "Upcoming Matches", "2": "Upcoming Matches (Server 2)"}  # Match server -> worksheet
+SERVICE_ACCOUNT_FILE = "utils/service_account.json"
+
+# matches is every match from the day the schedule was refreshed on, sorted by start time. outdated is the match
+# servers whose worksheet doesn't have that day on it anymore
+ScheduleSnapshot = namedtuple("ScheduleSnapshot", ["matches", "tbd_list", "refreshed_at", "outdated"])
+
+
+class Match:
+    __slots__ = ("name", "datetime", "end")
+
+    def __init__(self, name, datetime, end):
+        self.name = name
+        self.datetime = datetime
+        self.end = end
+
+    def date(self):
+        return f"{self.datetime.date()}"
+
+    def human_times(self):
+        return f"{self.start_time()} - {self.end_time()} EST"
+
+    def human_date(self):
+        if os.name == "nt":
+            return f"{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%#d')}"
+        return f"{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%-d')}"
+
+    def human_datetime(self):
+        if os.name == "nt":
+            return f"{self.name}\n{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%#d')}\n{self.start_time()} - {self.end_time()} EST\n"
+        return f"{self.name}\n{self.datetime.strftime('%A')}, {self.datetime.strftime('%B')} {self.datetime.strftime('%-d')}\n{self.start_time()} - {self.end_time()} EST\n"
+
+    def start_time(self):
+        if os.name == "nt":
+            return self.datetime.strftime("%#I:%M%p")
+        return self.datetime.strftime("%-I:%M%p")
+
+    def end_time(self):
+        if os.name == "nt":
+            return self.end.strftime("%#I:%M%p")
+        return self.end.strftime("%-I:%M%p")
+
+    def __str__(self):
+        return f"{self.name}, {self.datetime}, {self.end}"
+    
+    def __lt__(self, other):
+        return self.datetime < other.datetime
+
+
+def is_date(cell):
+    return isinstance(cell, str) and len(cell.split("/")) == 3
+
+
+def get_today(datetime_now):
+    no_pad = "-"
+    if os.name == "nt":
+        no_pad = "#"
+    return datetime_now.strftime(f"%{no_pad}m/%{no_pad}d/%Y")
+
+
+def split_rows(rows):
+    """Returns (dates, day names, slot rows) from a worksheet's cells"""
+    rows = rows[9:]
+    width = max((len(row) for row in rows), default=0)
+    rows = [row[2:] + [None] * (width - len(row)) for row in rows]  # Same as the sheet from column C, padded
+    return rows[0], rows[1], rows[2:]
+
+
+def needs_rollover(rows, datetime_now):
+    """Whether today has dropped off the worksheet, so its dates have to be moved forward"""
+    return get_today(datetime_now) not in split_rows(rows)[0]
+
+
+def roll_worksheet_forward(values, rows, datetime_now):
+    """
+    Writes to the sheet: moves the dates forward to start from today and clears every slot. Only done when someone
+    asks for the schedule (see SCHEDULE_ROLLOVER_ON_SS), never by the background refresh
+    """
+    no_pad = "-"
+    if os.name == "nt":
+        no_pad = "#"
+    dates = split_rows(rows)[0]
+    number_of_days = len([x for x in dates if is_date(x)])
+    excel_col_name = lambda n: '' if n <= 0 else excel_col_name((n - 1) // 26) + chr((n - 1) % 26 + ord('A')) #google solution TY devon
+    new_datetimes = [datetime_now + timedelta(days=day) for day in range(number_of_days)]
+    new_dates = [d.strftime(f"%{no_pad}m/%{no_pad}d/%{no_pad}Y") for d in new_datetimes] #"mm/dd/yy" no padding
+    new_days = [d.strftime("%A") for d in new_datetimes] #%A is date full name E.g "Sunday"
+    last_letter = excel_col_name(number_of_days+3) #+3 to account for starting at D
+    cell_list = values.range(f"D10:{last_letter}59")
+    for cell in cell_list:
+        if cell.row == 10:
+            cell.value = new_dates[cell.col -4] #this'll break if they ever remove the
+        elif cell.row == 11:
+            cell.value = new_days[cell.col -4] #hidden columns A and B
+        else:
+            cell.value = ""
+    values.update_cells(cell_list)
+    values.format(f"D12:{last_letter}59", {'backgroundColor': {"red": 1.0, "green": 1.0, "blue": 1.0} })
+
+
+def parse_worksheet(match, rows, datetime_now):
+    """
+    Returns (matches, TBD entries) for one match server's worksheet cells, starting from today. When today isn't on
+    the sheet anymore there are no matches, until roll_worksheet_forward has been run
+    """
+    tz = gettz(TIMEZONE)
+    matches = []
+    tbd_list = []
+    dates, day_names, slots = split_rows(rows)
+    times = [row[0] for row in slots]
+
+    if "TBD" in dates: # find the end index (either TBD or latest date). incase
+        end_index = dates.index("TBD") # mods decide to just add days to the ss instead of replacing dates
+        tbd_list += [f"**{row[end_index]}** *(Match {match})*" for row in slots if row[end_index]]
+    else: # no tbd section, u never know
+        end_date = [x for x in reversed(dates) if is_date(x)]
+        end_index = dates.index(end_date[0]) + 1 # maybe TBD is renamed? if deleted this breaks
+
+    today = get_today(datetime_now)
+    if today not in dates: # todays date not found, the dates need moving forward
+        return matches, tbd_list
+
+    # Every slot from today on, one day after another: ("date day time", match name). Empty slots are None and "^"
+    # continues the slot above it
+    schedule = []
+    for column in range(dates.index(today), end_index):
+        for time, row in zip(times, slots):
+            name = row[column] or None
+            schedule.append([f"{dates[column]} {day_names[column]} {time}", name])
+    for index, slot in enumerate(schedule):
+        if slot[1] == "^":
+            slot[1] = schedule[index - 1][1] if index else None
+
+    index = 0
+    for name, group in groupby(schedule, key=lambda slot: slot[1]): # group by consecutive values
+        length = len(list(group))
+        first, last = index, index + length - 1
+        index += length
+        if name is None: continue # times where there's no match
+
+        start_time = schedule[first][0].split(" - ")[0]
+        end_time = schedule[min(last + 1, len(schedule) - 1)][0].split(" - ")[0] # case for the last day, last time on SS
+
+        start = parser.parse(start_time, tzinfos={"EST": tz})
+        end = parser.parse(end_time, tzinfos={"EST": tz})
+
+        matches.append(Match(f"**{name}** *(Match {match})*", start, end))
+    return matches, tbd_list
+
+
+class ScheduleService:
+    """
+    Holds the latest ScheduleSnapshot. refresh() downloads and parses the worksheets on a worker thread, and
+    overlapping refreshes share one download. Refreshing only reads the sheet, roll_forward() is the only thing that
+    writes to it.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.client_lock = Lock()
+        self.snapshot = None
+        self.single_flight = SingleFlight()
+
+    def get_client(self):
+        # Authenticated once, gspread refreshes the token itself when it expires
+        with self.client_lock:
+            if not self.client:
+                import gspread  # Only loaded once the schedule is first needed
+                self.client = gspread.service_account(filename=SERVICE_ACCOUNT_FILE)
+            return self.client
+
+    def is_configured(self):
+        """The spreadsheet commands are optional, they only work once the service account file has been added"""
+        return os.path.exists(SERVICE_ACCOUNT_FILE)
+
+    def load(self):
+        spreadsheet = self.get_client().open_by_key(SCHEDULE_SPREADSHEET_KEY)
+        datetime_now = datetime.now(gettz(TIMEZONE))
+        matches = []
+        tbd_list = []
+        outdated = []
+        for match, worksheet_name in SCHEDULE_WORKSHEETS.items():
+            rows = spreadsheet.worksheet(worksheet_name).get()
+            server_matches, server_tbd_list = parse_worksheet(match, rows, datetime_now)
+            matches += server_matches
+            tbd_list += server_tbd_list
+            if needs_rollover(rows, datetime_now):
+                outdated.append(match)
+        matches.sort()
+        return ScheduleSnapshot(matches, tbd_list, datetime_now, outdated)
+
+    def roll_forward_worksheets(self):
+        spreadsheet = self.get_client().open_by_key(SCHEDULE_SPREADSHEET_KEY)
+        datetime_now = datetime.now(gettz(TIMEZONE))
+        for match, worksheet_name in SCHEDULE_WORKSHEETS.items():
+            worksheet = spreadsheet.worksheet(worksheet_name)
+            rows = worksheet.get()
+            # Checked again on the current cells, someone may have updated the sheet since the snapshot
+            if needs_rollover(rows, datetime_now):
+                roll_worksheet_forward(worksheet, rows, datetime_now)
+                logging.info(f"Moved the dates of the match {match} schedule forward to start from today")
+        return self.load()
+
+    async def run(self, key, function):
+        async def load():
+            self.snapshot = await get_running_loop().run_in_executor(None, function)
+            return self.snapshot
+        return await self.single_flight.do(key, load)
+
+    async def refresh(self):
+        return await self.run("refresh", self.load)
+
+    async def roll_forward(self):
+        """Moves the dates of the worksheets that today has dropped off forward, clearing their slots"""
+        return await self.run("roll_forward", self.roll_forward_worksheets)
+
+    async def get_snapshot(self):
+        """Returns the latest snapshot, only waiting for a refresh if there isn't one yet"""
+        return self.snapshot or await self.refresh()
+
+
+schedule_service = ScheduleService()
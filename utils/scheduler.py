@@ -0,0 +1,95 @@
+from asyncio import Event, get_running_loop, wait_for, TimeoutError
+from datetime import timedelta
+from heapq import heappush, heappop
+from itertools import count
+from logging import exception
+from threading import Lock
+from utils.config import SCHEDULER_RETRY_SECONDS
+
+"""
+Runs callbacks at the exact time something is due, instead of polling for it.
+"""
+
+
+class DeadlineQueue:
+    """
+    A min-heap of (deadline, key). run() sleeps until the earliest deadline, calls the callback for every key that is
+    due and goes back to sleep. Scheduling an earlier deadline wakes it up early.
+
+    Each key has at most one deadline - scheduling a key again replaces its old deadline. Replaced and cancelled
+    entries are left in the heap and skipped when they reach the top, so schedule() and cancel() stay O(log n).
+    schedule() and cancel() can be called from any thread.
+
+    A callback that raises is tried again after retry_delay, unless it rescheduled its key itself before failing.
+    """
+
+    def __init__(self, now, retry_delay=timedelta(seconds=SCHEDULER_RETRY_SECONDS)):
+        self.now = now
+        self.retry_delay = retry_delay
+        self.heap = []
+        self.deadlines = {}
+        self.counter = count()
+        self.lock = Lock()
+        self.wake = Event()
+        self.loop = None
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, deadline):
+        with self.lock:
+            entry = (deadline, next(self.counter), key)
+            self.deadlines[key] = entry
+            heappush(self.heap, entry)
+            is_next = self.heap[0] is entry
+        if is_next:
+            self.notify()
+
+    def cancel(self, key):
+        with self.lock:
+            self.deadlines.pop(key, None)
+
+    def notify(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+    def next_deadline(self):
+        """Returns the earliest deadline, dropping cancelled entries from the top of the heap"""
+        with self.lock:
+            while self.heap and self.deadlines.get(self.heap[0][2]) is not self.heap[0]:
+                heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self):
+        """Removes and returns the keys whose deadline has passed, earliest first"""
+        now = self.now()
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                entry = heappop(self.heap)
+                if self.deadlines.get(entry[2]) is entry:
+                    del self.deadlines[entry[2]]
+                    due.append(entry[2])
+        return due
+
+    async def run(self, callback):
+        """Calls `await callback(key)` for each key as it becomes due, forever"""
+        self.loop = get_running_loop()
+        while True:
+            self.wake.clear()
+            for key in self.pop_due():
+                try:
+                    await callback(key)
+                except Exception:
+                    exception(f"Scheduled callback for {key} failed, retrying in {self.retry_delay}")
+                    if key not in self:
+                        self.schedule(key, self.now() + self.retry_delay)
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max((deadline - self.now()).total_seconds(), 0)
+            try:
+                await wait_for(self.wake.wait(), timeout)
+            except TimeoutError:
+                pass
@@ -0,0 +1,82 @@
+from argparse import ArgumentParser
+from os import path
+import subprocess
+import sys
+from utils.config import STARTUP_IMPORT_BUDGET_SECONDS
+
+"""
+Measures how long the bot takes to import, module by module.
+
+Run from the repository root with `python -m utils.startup_profiler`. It imports the bot in a fresh interpreter with
+`-X importtime`, prints the slowest modules and exits with status 1 if importing took longer than
+STARTUP_IMPORT_BUDGET_SECONDS or if one of LAZY_MODULES was imported, so it can be used as a regression check. The time
+from startup to the bot being ready is logged by bot.py itself.
+"""
+
+ROOT_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Only imported by the commands that use them, never while the bot starts
+LAZY_MODULES = ("pandas", "matplotlib", "gspread", "lxml", "PIL")
+
+
+def measure_imports(module="bot"):
+    """
+    Imports module in a new interpreter and returns [(module name, self seconds, cumulative seconds)] in import order.
+    Raises ImportError if the import failed
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT_DIRECTORY,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise ImportError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_time) / 1e6, int(cumulative_time) / 1e6))
+    return timings
+
+
+def get_eager_imports(timings):
+    """Returns the LAZY_MODULES that were imported, according to measure_imports' timings"""
+    imported = {name.split(".")[0] for name, self_time, cumulative in timings}
+    return [module for module in LAZY_MODULES if module in imported]
+
+
+def main():
+    argument_parser = ArgumentParser(description="Reports the bot's import time per module")
+    argument_parser.add_argument("--module", default="bot", help="Module to import (default: bot)")
+    argument_parser.add_argument("--top", type=int, default=25, help="Number of modules to list (default: 25)")
+    argument_parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET_SECONDS,
+                                 help=f"Seconds the import may take (default: {STARTUP_IMPORT_BUDGET_SECONDS})")
+    arguments = argument_parser.parse_args()
+
+    try:
+        timings = measure_imports(arguments.module)
+    except ImportError as e:
+        print(e)
+        return 2
+    total = next((cumulative for name, self_time, cumulative in timings if name == arguments.module), None)
+    if total is None:
+        # -X importtime only reports modules imported after the interpreter started
+        print(f"{arguments.module} is already imported when the interpreter starts, so its import can't be timed")
+        return 2
+
+    print(f"{'cumulative':>10} {'self':>8}  module")
+    for name, self_time, cumulative in sorted(timings, key=lambda timing: timing[2], reverse=True)[:arguments.top]:
+        print(f"{cumulative * 1000:8.1f}ms {self_time * 1000:6.1f}ms  {name}")
+    print(f"\nImporting {arguments.module} took {total:.3f}s ({len(timings)} modules), budget {arguments.budget:.3f}s")
+    status = 0
+    if total > arguments.budget:
+        print(f"Import time is over budget by {total - arguments.budget:.3f}s")
+        status = 1
+    eager_imports = get_eager_imports(timings)
+    if eager_imports:
+        print(f"Imported at startup but should be imported lazily: {', '.join(eager_imports)}")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
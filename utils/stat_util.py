@@ -1,53 +1,154 @@
-from database.Player import Player
-from utils.utils import request_async_json
+from asyncio import sleep, TimeoutError
+from json import loads
+from time import monotonic
 import logging
-from aiohttp import ClientSession
-from asyncio import sleep as async_sleep
+from aiohttp import ClientSession, ClientError, ClientTimeout
+from utils.cache_util import TTLCache, SingleFlight, MISSING
+from utils.config import STATS_CACHE_SIZE, STATS_CACHE_TTL_SECONDS, STATS_PLAYER_ID_TTL_SECONDS, \
+    STATS_LOAD_POLL_SECONDS, STATS_LOAD_TIMEOUT_SECONDS
 
+"""
+Client for 915's stats API (https://www.nineonefive.xyz/stats/), shared by /playerstats and gameofstats.
 
-async def get_lifetime_stats(username):
-    get_player_id_url = "https://by48xt0cuf.execute-api.us-east-1.amazonaws.com/default/request-player?name={}"
-    stats_from_id_url = "https://by48xt0cuf.execute-api.us-east-1.amazonaws.com/default/request-player?id={}"
-    new_player_request_url = "https://qe824lieck.execute-api.us-east-1.amazonaws.com/default/new-player?id={}"
-    response = await request_async_json(get_player_id_url.format(username), 'text/plain')
-    if response:
-        json = response[1]
+Name -> ID lookups and stats are cached, and concurrent lookups for the same player share one request. When the API
+hasn't loaded a player's stats yet it is asked to, and then polled with a growing delay until they show up.
+"""
+
+GET_PLAYER_ID_URL = "https://by48xt0cuf.execute-api.us-east-1.amazonaws.com/default/request-player?name={}"
+STATS_FROM_ID_URL = "https://by48xt0cuf.execute-api.us-east-1.amazonaws.com/default/request-player?id={}"
+NEW_PLAYER_REQUEST_URL = "https://qe824lieck.execute-api.us-east-1.amazonaws.com/default/new-player?id={}"
+
+
+class StatsRequestError(Exception):
+    """Exception raised when a request to the stats API fails"""
+
+    def __init__(self, message="Request to the stats API failed"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class StatsPlayerNotFoundError(Exception):
+    """Exception raised when the stats API doesn't know a player"""
+
+    def __init__(self, message="Player could not be found in the stats API"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class StatsClient:
+    def __init__(self):
+        self.session = None
+        self.player_ids = TTLCache(STATS_CACHE_SIZE, STATS_PLAYER_ID_TTL_SECONDS)
+        self.stats = TTLCache(STATS_CACHE_SIZE, STATS_CACHE_TTL_SECONDS)
+        self.single_flight = SingleFlight()
+
+    async def request(self, url):
+        if not self.session or self.session.closed:
+            self.session = ClientSession(timeout=ClientTimeout(total=15))
+        try:
+            async with self.session.get(url) as response:
+                if response.status != 200:
+                    raise StatsRequestError(f"Stats API returned {response.status}")
+                return await response.text()
+        except (ClientError, TimeoutError) as e:
+            raise StatsRequestError(f"Request to the stats API failed: {e!r}")
+
+    async def request_json(self, url):
+        text = await self.request(url)
+        if text.startswith("No player found"):
+            return None
+        try:
+            return loads(text)
+        except ValueError:
+            raise StatsRequestError(f"Stats API returned something that isn't JSON: {text[:100]}")
+
+    async def get_player_id(self, username):
+        """Returns the stats API's ID for a username, raising StatsPlayerNotFoundError if it doesn't have one"""
+        key = username.lower()
+        player_id = self.player_ids.get(key)
+        if player_id is MISSING:
+            player_id = await self.single_flight.do(("player_id", key), lambda: self.fetch_player_id(username))
+        if player_id is None:
+            raise StatsPlayerNotFoundError(f"Could not find player with name `{username}`")
+        if player_id is False:
+            raise StatsPlayerNotFoundError(f"The following player does not have a UUID in the API `{username}`")
+        return player_id
+
+    async def fetch_player_id(self, username):
+        json = await self.request_json(GET_PLAYER_ID_URL.format(username))
         logging.info(json)
-        if str(json).startswith("No player found"):
-            return False
-        if json["uuid"]:
-            player_id = json["id"]
-        else:
-            return False
-    else:
-        return False
-    stats_response = await request_async_json(stats_from_id_url.format(player_id), 'text/plain')
-    if not stats_response:
-        logging.info("Request failed")
+        # None if the API doesn't know the player, False if it does but without a UUID
+        player_id = (json["id"] if json["uuid"] else False) if json else None
+        self.player_ids.set(username.lower(), player_id)
+        return player_id
+
+    async def get_stats(self, player_id, progress=None):
+        """
+        Returns the stats of a player ID, or None if they still weren't loaded after STATS_LOAD_TIMEOUT_SECONDS.
+        progress(message) is awaited with updates while the API loads a new player's stats. Concurrent calls for the
+        same player share one lookup, and only the first caller's progress is used.
+        """
+        data = self.stats.get(player_id)
+        if data is not MISSING:
+            return data
+        return await self.single_flight.do(("stats", player_id), lambda: self.fetch_stats(player_id, progress))
+
+    @staticmethod
+    async def report_progress(progress, message):
+        # Runs inside the shared lookup, so e.g. the caller's message having been deleted mustn't fail it for everyone
+        if not progress:
+            return
+        try:
+            await progress(message)
+        except Exception:
+            logging.exception("Failed to report stats loading progress")
+
+    async def fetch_stats(self, player_id, progress):
+        json = await self.request_json(STATS_FROM_ID_URL.format(player_id))
+        data = json["data"] if json else None
+        if not data:
+            logging.info(f"Player data for `{player_id}` is not loaded yet")
+            await self.report_progress(progress, "Your data is not loaded yet, hold tight")
+            text = await self.request(NEW_PLAYER_REQUEST_URL.format(player_id))
+            if text != "Success":
+                raise StatsRequestError(text)
+            logging.info("Successfully requested new data")
+            await self.report_progress(progress, "Your data is being loaded.")
+            data = await self.poll_stats(player_id)
+            if not data:
+                logging.info("No data was found")
+                return None
+            logging.info("Data loaded")
+        self.stats.set(player_id, data)
+        return data
+
+    async def poll_stats(self, player_id):
+        """Polls for the stats the API was asked to load, doubling the wait each time until they're there"""
+        deadline = monotonic() + STATS_LOAD_TIMEOUT_SECONDS
+        delay = STATS_LOAD_POLL_SECONDS
+        while True:
+            await sleep(min(delay, max(deadline - monotonic(), 0)))
+            json = await self.request_json(STATS_FROM_ID_URL.format(player_id))
+            if json and json["data"]:
+                return json["data"]
+            if monotonic() >= deadline:
+                return None
+            delay *= 2
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+stats_client = StatsClient()
+
+
+async def get_lifetime_stats(username):
+    """Returns the stats of a username, or False if they couldn't be found"""
+    try:
+        data = await stats_client.get_stats(await stats_client.get_player_id(username))
+    except (StatsRequestError, StatsPlayerNotFoundError) as e:
+        logging.info(e.message)
         return False
-    json_response = stats_response[1]
-    if json_response["data"]:
-        data = json_response["data"]
-    else:
-        logging.info(f"Player data for `{username}` is not loaded yet")
-        async with ClientSession() as session:
-            async with session.get(new_player_request_url.format(player_id)) as r:
-                if r.status == 200:
-                    text = await r.text()
-                    if text == "Success":
-                        await async_sleep(10)
-                        stats_response = await request_async_json(stats_from_id_url.format(player_id), 'text/plain')
-                        json_response = stats_response[1]
-                        data = json_response["data"]
-                        if not data:
-                            logging.info("No data was found")
-                            return False
-                        else:
-                            logging.info("Data loaded")
-                    else:
-                        logging.info(text)
-                        return False
-                else:
-                    logging.info("Request to load new player data failed")
-                    return False
-    return data
+    return data or False
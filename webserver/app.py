@@ -7,10 +7,11 @@ from bot import bot, slash
 from utils.config import *
 from utils.event_util import get_embed_time_string
 from datetime import datetime
-from database.database import get_sorted_elo, fetch_players_list_discord_id
+from database.database import count_players
 from database.Event import Event, EventDoesNotExistError
-from database.Player import Player
+from database.Player import Player, player_cache
 from database.Signup import Signup
+from database.async_db import run_read
 from discord import Status
 from discord.utils import get
 from markdown import markdown
@@ -85,7 +86,7 @@ async def home():
     else:
         user = False
     guilds = ', '.join([bot.get_guild(guild_id).name for guild_id in SLASH_COMMANDS_GUILDS])
-    registered_users = len(fetch_players_list_discord_id())
+    registered_users = await run_read(count_players)
     online_members = sum(member.status != Status.offline and not member.bot for member in
                          bot.get_guild(SLASH_COMMANDS_GUILDS[0]).members)
     return await render_template("home.html", discord_invite=PUG_INVITE_LINK, guilds=guilds,
@@ -97,20 +98,15 @@ async def leaderboard():
     player = None
     if await discord.authorized:
         user = await fetch_user_with_perms()
-        player = Player.exists_discord_id(user["user"].id)
+        player = await run_read(Player.exists_discord_id, user["user"].id)
     else:
         user = False
-    if player:
-        player.leaderboard_position = False
-    data = get_sorted_elo()
-    position = 1
-    for item in data:
-        data[position - 1] = (item[0], item[1], item[2], position)
-        if player:
-            if item[0] == player.minecraft_username:
-                player.leaderboard_position = position
-        position += 1
-    return await render_template("leaderboard.html", data=data, user=user, player=player)
+    # Players are shared through the player cache, so the position is passed to the template instead of set on them
+    leaderboard_position = player_cache.rank(player) if player else False
+    data = [(item.minecraft_username, item.elo, item.discord_id, position)
+            for position, item in await run_read(player_cache.leaderboard)]
+    return await render_template("leaderboard.html", data=data, user=user, player=player,
+                                 leaderboard_position=leaderboard_position)
 
 
 @app.route("/events")
@@ -119,7 +115,7 @@ async def events():
         user = await fetch_user_with_perms()
     else:
         user = False
-    all_events = Event.fetch_events_list()
+    all_events = await run_read(Event.fetch_events_list)
     for event_obj in all_events:
         event_obj.time_est = get_embed_time_string(datetime.fromisoformat(event_obj.time_est))
         event_obj.signup_deadline = get_embed_time_string(datetime.fromisoformat(event_obj.signup_deadline))
@@ -155,14 +151,15 @@ async def help_page():
 @app.route("/event/<event_id>")
 async def event(event_id: int):
     try:
-        event_from_id = Event.from_event_id(event_id)
+        event_from_id = await run_read(Event.from_event_id, event_id)
     except EventDoesNotExistError:
         return await render_template("page_not_found.html"), 404
     else:
-        signups = Signup.fetch_signups_list(event_id)
+        signups = await run_read(Signup.fetch_signups_list, event_id)
+        players = await run_read(Player.from_discord_ids, [signup.user_id for signup in signups])
         for signup in signups:
             signup.user = bot.get_user(signup.user_id)
-            signup.player = Player.exists_discord_id(signup.user_id)
+            signup.player = players.get(signup.user_id)
         event_from_id.time_est = get_embed_time_string(datetime.fromisoformat(event_from_id.time_est))
         event_from_id.signup_deadline = get_embed_time_string(datetime.fromisoformat(event_from_id.signup_deadline))
         event_from_id.description = markdown(event_from_id.description)\
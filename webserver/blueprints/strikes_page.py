@@ -6,6 +6,7 @@ from utils.event_util import get_embed_time_string
 from utils.utils import *
 from datetime import datetime
 from database.strikes import *
+from database.async_db import run_read, run_write
 from discord.utils import get
 from discord.errors import Forbidden
 from logging import info
@@ -37,8 +38,8 @@ async def strikes():
         user = await fetch_user_with_perms()
     else:
         user = False
-    active_strikes = get_all_active_strikes()
-    inactive_strikes = get_all_inactive_strikes()
+    active_strikes = await run_read(get_all_active_strikes)
+    inactive_strikes = await run_read(get_all_inactive_strikes)
 
     active_strikes = [
         get_strike_info_dict(strike)
@@ -62,12 +63,16 @@ async def remove_strike_endpoint():
     user = await fetch_user_with_perms()
     if user["is_mod"]:
         bot_channel = bot.get_channel(BOT_OUTPUT_CHANNEL)
-        strike_id = request.args.get("strike_id")
-        strike = get_strike(strike_id)
+        # Must be an int, the strike scheduler is keyed by int strike IDs
+        strike_id = request.args.get("strike_id", type=int)
+        if strike_id is None:
+            await flash(f"Invalid strike ID {request.args.get('strike_id')}")
+            return redirect(url_for("strikes.strikes"))
+        strike = await run_read(get_strike, strike_id)
         if not strike:
             await flash(f"Strike ID {strike_id} does not exist")
             return redirect(url_for("strikes.strikes"))
-        remove_strike(strike_id)
+        await run_write(remove_strike, strike_id)
         await flash(f"Strike ID {strike_id} removed")
         striked_user = bot.get_user(strike[1])
         await response_embed(
@@ -95,12 +100,16 @@ async def set_strike_inactive():
     user = await fetch_user_with_perms()
     if user["is_mod"]:
         bot_channel = bot.get_channel(BOT_OUTPUT_CHANNEL)
-        strike_id = request.args.get("strike_id")
-        strike = get_strike(strike_id)
+        # Must be an int, the strike scheduler is keyed by int strike IDs
+        strike_id = request.args.get("strike_id", type=int)
+        if strike_id is None:
+            await flash(f"Invalid strike ID {request.args.get('strike_id')}")
+            return redirect(url_for("strikes.strikes"))
+        strike = await run_read(get_strike, strike_id)
         if not strike:
             await flash(f"Strike ID {strike_id} does not exist")
             return redirect(url_for("strikes.strikes"))
-        change_active_status(strike_id, 0)
+        await run_write(change_active_status, strike_id, 0)
         await flash(f"Strike ID {strike_id} set to inactive")
         await response_embed(
             bot_channel,